@@ -203,6 +203,8 @@ class ADAPI:
             pin (bool, optional): If True, the callback will be pinned to a particular thread.
             pin_thread (int, optional): Specify which thread from the worker pool the callback
                 will be run by (0 - number of threads -1).
+            callback_priority (str, optional): Priority of the callback on the worker queue, one of
+                ``high``, ``normal`` or ``low``. Defaults to the App's ``callback_priority``, or ``normal``.
 
         Returns:
             A unique identifier that can be used to cancel the callback if required.
@@ -1332,6 +1334,15 @@ class ADAPI:
             pin (bool, optional): If ``True``, the callback will be pinned to a particular thread.
             pin_thread (int, optional): Sets which thread from the worker pool the callback will be
                 run by (0 - number of threads -1).
+            callback_priority (str, optional): Priority of the callback on the worker queue, one of
+                ``high``, ``normal`` or ``low``. Defaults to the App's ``callback_priority``, or ``normal``.
+            coalesce (bool, optional): If ``True``, a change that arrives while the callback for an
+                earlier change to the same entity is still waiting for a worker thread replaces the
+                waiting one instead of queueing another callback. The callback gets the ``old`` value it
+                was first queued with and the latest ``new`` value.
+            min_interval (float, optional): Run the callback at most once every ``min_interval``
+                seconds for each entity. Changes in between are coalesced, and the latest one is
+                delivered when the interval is up. Implies ``coalesce``.
             *kwargs (optional): Zero or more keyword arguments that will be supplied to the callback
                 when it is called.
 
@@ -1851,6 +1862,8 @@ class ADAPI:
 
             pin_thread (int, optional): Specify which thread from the worker pool the callback
                 will be run by (0 - number of threads -1).
+            callback_priority (str, optional): Priority of the callback on the worker queue, one of
+                ``high``, ``normal`` or ``low``. Defaults to the App's ``callback_priority``, or ``normal``.
 
             timeout (int, optional): If ``timeout`` is supplied as a parameter, the callback will be created as normal,
                  but after ``timeout`` seconds, the callback will be removed.
@@ -2414,6 +2427,8 @@ class ADAPI:
             pin (bool, optional): If True, the callback will be pinned to a particular thread.
             pin_thread (int, optional): Specify which thread from the worker pool the callback
                 will be run by (0 - number of threads -1).
+            callback_priority (str, optional): Priority of the callback on the worker queue, one of
+                ``high``, ``normal`` or ``low``. Defaults to the App's ``callback_priority``, or ``normal``.
             **kwargs: Arbitrary keyword parameters to be provided to the callback
                 function when it is invoked.
 
@@ -2464,6 +2479,8 @@ class ADAPI:
             pin (bool, optional): If True, the callback will be pinned to a particular thread.
             pin_thread (int, optional): Specify which thread from the worker pool the callback
                 will be run by (0 - number of threads -1).
+            callback_priority (str, optional): Priority of the callback on the worker queue, one of
+                ``high``, ``normal`` or ``low``. Defaults to the App's ``callback_priority``, or ``normal``.
             **kwargs: Arbitrary keyword parameters to be provided to the callback
                 function when it is invoked.
 
@@ -2533,6 +2550,8 @@ class ADAPI:
             pin (bool, optional): If ``True``, the callback will be pinned to a particular thread.
             pin_thread (int, optional): Specify which thread from the worker pool the callback
                 will be run by (0 - number of threads -1).
+            callback_priority (str, optional): Priority of the callback on the worker queue, one of
+                ``high``, ``normal`` or ``low``. Defaults to the App's ``callback_priority``, or ``normal``.
             **kwargs: Arbitrary keyword parameters to be provided to the callback
                 function when it is invoked.
 
@@ -2612,6 +2631,8 @@ class ADAPI:
             pin (bool, optional): If ``True``, the callback will be pinned to a particular thread.
             pin_thread (int, optional): Specify which thread from the worker pool the callback
                 will be run by (0 - number of threads -1).
+            callback_priority (str, optional): Priority of the callback on the worker queue, one of
+                ``high``, ``normal`` or ``low``. Defaults to the App's ``callback_priority``, or ``normal``.
             **kwargs: Arbitrary keyword parameters to be provided to the callback
                 function when it is invoked.
 
@@ -2690,6 +2711,8 @@ class ADAPI:
             pin (bool, optional): If ``True``, the callback will be pinned to a particular thread.
             pin_thread (int, optional): Specify which thread from the worker pool the callback
                 will be run by (0 - number of threads -1).
+            callback_priority (str, optional): Priority of the callback on the worker queue, one of
+                ``high``, ``normal`` or ``low``. Defaults to the App's ``callback_priority``, or ``normal``.
             **kwargs: Arbitrary keyword parameters to be provided to the callback
                 function when it is invoked.
 
@@ -2740,6 +2763,8 @@ class ADAPI:
             pin (bool, optional): If True, the callback will be pinned to a particular thread.
             pin_thread (int, optional): Specify which thread from the worker pool the callback
                 will be run by (0 - number of threads -1).
+            callback_priority (str, optional): Priority of the callback on the worker queue, one of
+                ``high``, ``normal`` or ``low``. Defaults to the App's ``callback_priority``, or ``normal``.
             **kwargs: Arbitrary keyword parameters to be provided to the callback
                 function when it is invoked.
 
@@ -2790,6 +2815,8 @@ class ADAPI:
             pin (bool, optional): If ``True``, the callback will be pinned to a particular thread.
             pin_thread (int, optional): Specify which thread from the worker pool the callback
                 will be run by (0 - number of threads -1).
+            callback_priority (str, optional): Priority of the callback on the worker queue, one of
+                ``high``, ``normal`` or ``low``. Defaults to the App's ``callback_priority``, or ``normal``.
 
 
         Returns:
@@ -2872,6 +2899,8 @@ class ADAPI:
             pin (bool, optional): If ``True``, the callback will be pinned to a particular thread.
             pin_thread (int, optional): Specify which thread from the worker pool the callback
                 will be run by (0 - number of threads -1).
+            callback_priority (str, optional): Priority of the callback on the worker queue, one of
+                ``high``, ``normal`` or ``low``. Defaults to the App's ``callback_priority``, or ``normal``.
 
         Returns:
             A handle that can be used to cancel the timer.
@@ -2923,6 +2952,8 @@ class ADAPI:
             pin (bool, optional): If ``True``, the callback will be pinned to a particular thread.
             pin_thread (int, optional): Specify which thread from the worker pool the callback
                 will be run by (0 - number of threads -1).
+            callback_priority (str, optional): Priority of the callback on the worker queue, one of
+                ``high``, ``normal`` or ``low``. Defaults to the App's ``callback_priority``, or ``normal``.
 
         Returns:
             A handle that can be used to cancel the timer.
@@ -14,8 +14,16 @@ class AdminLoop:
 
     async def loop(self):
         while not self.stopping:
+            await self.AD.threading.update_admin_stats()
+
             if self.AD.http.stats_update != "none" and self.AD.sched is not None:
                 await self.AD.threading.get_callback_update()
                 await self.AD.threading.get_q_update()
 
+            await self.AD.http.stream.update_admin_stats()
+
+            # Last, so everything updated above goes out in this interval's batch
+            if self.AD.http.stats_update == "batch":
+                await self.AD.http.stream.flush_admin_batch()
+
             await asyncio.sleep(self.AD.admin_delay)
@@ -10,10 +10,13 @@ import pstats
 import logging
 import asyncio
 import copy
+import time
+import hashlib
 from collections import OrderedDict
 
 import appdaemon.utils as utils
 from appdaemon.appdaemon import AppDaemon
+from appdaemon.file_watcher import FileWatcher
 
 
 class AppManagement:
@@ -30,11 +33,14 @@ class AppManagement:
         self.objects = {}
         self.check_app_updates_profile_stats = None
         self.check_updates_lock = None
+        self.watcher = FileWatcher(ad, ad.app_dir)
 
         # Initialize config file tracking
 
         self.app_config_file_modified = 0
         self.app_config_files = {}
+        self.config_file_cache = {}
+        self.app_config_paths = {}
         self.module_dirs = []
 
         self.app_config = {}
@@ -111,6 +117,7 @@ class AppManagement:
         self.logger.debug("terminate() called for app_management")
         if self.apps_initialized is True:
             await self.check_app_updates(mode="term")
+        self.watcher.stop()
 
     async def dump_objects(self):
         self.diag.info("--------------------------------------------------")
@@ -133,8 +140,14 @@ class AppManagement:
             return None
 
     async def get_app_instance(self, name, id):
-        if name in self.objects and self.objects[name]["id"] == id:
-            return self.AD.app_management.objects[name]["object"]
+        return self.get_app_instance_sync(name, id)
+
+    # Non async version of get_app_instance(), used by the worker threads. Entries in objects are replaced rather than
+    # modified when an app is reloaded so a single lookup always sees a consistent id and object.
+    def get_app_instance_sync(self, name, id):
+        entry = self.objects.get(name)
+        if entry is not None and entry["id"] == id:
+            return entry["object"]
         else:
             return None
 
@@ -156,11 +169,14 @@ class AppManagement:
         # Call its initialize function
         try:
             self.logger.info(f"Calling initialize() for {name}")
+            start = time.perf_counter()
             if asyncio.iscoroutinefunction(init):
                 await init()
             else:
                 await utils.run_in_executor(self, init)
-            await self.set_state(name, state="idle")
+            init_time = round((time.perf_counter() - start) * 1000, 3)
+            self.logger.debug("initialize() for %s took %sms", name, init_time)
+            await self.set_state(name, state="idle", init_time=init_time)
             await self.increase_active_apps(name)
 
             event_data = {"event_type": "app_initialized", "data": {"app": name}}
@@ -238,6 +254,8 @@ class AppManagement:
 
         await self.AD.sched.terminate_app(name)
 
+        self.AD.threading.forget_constraints(name)
+
         await self.set_state(name, state="terminated")
         await self.set_state(name, instancecallbacks=0)
 
@@ -396,116 +414,116 @@ class AppManagement:
 
         return True
 
-    async def read_config(self):  # noqa: C901
+    async def read_config(self, snapshot=None):  # noqa: C901
         new_config = None
-
-        for root, subdirs, files in await utils.run_in_executor(self, os.walk, self.AD.app_dir):
-            subdirs[:] = [d for d in subdirs if d not in self.AD.exclude_dirs and "." not in d]
-            if root[-11:] != "__pycache__" and root[0] != ".":
-                for file in files:
-                    if file[-5:] == self.ext and file[0] != ".":
-                        path = os.path.join(root, file)
-                        self.logger.debug("Reading %s", path)
-                        config = await utils.run_in_executor(self, self.read_config_file, path)
-                        valid_apps = {}
-                        if type(config).__name__ == "dict":
-                            for app in config:
-                                if config[app] is not None:
-                                    app_valid = True
-                                    if app == "global_modules":
-                                        self.logger.warning(
-                                            "global_modules directive has been deprecated and will be removed"
-                                            " in a future release"
-                                        )
-                                        #
-                                        # Check the parameter format for string or list
-                                        #
-                                        if isinstance(config[app], str):
-                                            valid_apps[app] = [config[app]]
-                                        elif isinstance(config[app], list):
-                                            valid_apps[app] = config[app]
-                                        else:
-                                            if self.AD.invalid_config_warnings:
-                                                self.logger.warning(
-                                                    (
-                                                        "global_modules should be a list or a string in File"
-                                                        " '%s' - ignoring"
-                                                    ),
-                                                    file,
-                                                )
-                                    elif app == "sequence":
-                                        #
-                                        # We don't care what it looks like just pass it through
-                                        #
-                                        valid_apps[app] = config[app]
-                                    elif "." in app:
-                                        #
-                                        # We ignore any app containing a dot.
-                                        #
-                                        pass
-                                    elif (
-                                        isinstance(config[app], dict)
-                                        and "class" in config[app]
-                                        and "module" in config[app]
-                                    ):
-                                        valid_apps[app] = config[app]
-                                        valid_apps[app]["config_path"] = path
-                                    elif (
-                                        isinstance(config[app], dict)
-                                        and "module" in config[app]
-                                        and "global" in config[app]
-                                        and config[app]["global"] is True
-                                    ):
-                                        valid_apps[app] = config[app]
-                                        valid_apps[app]["config_path"] = path
-                                    else:
-                                        app_valid = False
-                                        if self.AD.invalid_config_warnings:
-                                            self.logger.warning(
-                                                "App '%s' missing 'class' or 'module' entry - ignoring",
-                                                app,
-                                            )
-
-                                    if app_valid is True:
-                                        # now add app to the path
-                                        if path not in self.app_config_files:
-                                            self.app_config_files[path] = []
-
-                                        self.app_config_files[path].append(app)
-                        else:
-                            if self.AD.invalid_config_warnings:
-                                self.logger.warning(
-                                    "File '%s' invalid structure - ignoring",
-                                    os.path.join(root, file),
-                                )
-
-                        if new_config is None:
-                            new_config = {}
-                        for app in valid_apps:
+        changed_files = set()
+
+        if snapshot is None:
+            snapshot = await self.watcher.get_files()
+
+        # Forget about any files that have gone
+        for path in list(self.config_file_cache):
+            if path not in snapshot["files"]:
+                del self.config_file_cache[path]
+
+        for path in sorted(snapshot["files"]):
+            file = os.path.basename(path)
+            if file[-5:] == self.ext:
+                config, changed = await utils.run_in_executor(self, self.read_cached_config_file, path)
+                if changed is True:
+                    changed_files.add(path)
+                valid_apps = {}
+                if type(config).__name__ == "dict":
+                    for app in config:
+                        if config[app] is not None:
+                            app_valid = True
                             if app == "global_modules":
-                                if app in new_config:
-                                    new_config[app].extend(valid_apps[app])
-                                    continue
-                            if app == "sequence":
-                                if app in new_config:
-                                    new_config[app] = {
-                                        **new_config[app],
-                                        **valid_apps[app],
-                                    }
-                                    continue
-
-                            if app in new_config:
                                 self.logger.warning(
-                                    "File '%s' duplicate app: %s - ignoring",
-                                    os.path.join(root, file),
-                                    app,
+                                    "global_modules directive has been deprecated and will be removed"
+                                    " in a future release"
                                 )
+                                #
+                                # Check the parameter format for string or list
+                                #
+                                if isinstance(config[app], str):
+                                    valid_apps[app] = [config[app]]
+                                elif isinstance(config[app], list):
+                                    valid_apps[app] = config[app]
+                                else:
+                                    if self.AD.invalid_config_warnings:
+                                        self.logger.warning(
+                                            ("global_modules should be a list or a string in File" " '%s' - ignoring"),
+                                            file,
+                                        )
+                            elif app == "sequence":
+                                #
+                                # We don't care what it looks like just pass it through
+                                #
+                                valid_apps[app] = config[app]
+                            elif "." in app:
+                                #
+                                # We ignore any app containing a dot.
+                                #
+                                pass
+                            elif isinstance(config[app], dict) and "class" in config[app] and "module" in config[app]:
+                                valid_apps[app] = config[app]
+                                valid_apps[app]["config_path"] = path
+                            elif (
+                                isinstance(config[app], dict)
+                                and "module" in config[app]
+                                and "global" in config[app]
+                                and config[app]["global"] is True
+                            ):
+                                valid_apps[app] = config[app]
+                                valid_apps[app]["config_path"] = path
                             else:
-                                new_config[app] = valid_apps[app]
+                                app_valid = False
+                                if self.AD.invalid_config_warnings:
+                                    self.logger.warning(
+                                        "App '%s' missing 'class' or 'module' entry - ignoring",
+                                        app,
+                                    )
+
+                            if app_valid is True:
+                                # now add app to the path
+                                if path not in self.app_config_files:
+                                    self.app_config_files[path] = []
+
+                                self.app_config_files[path].append(app)
+                else:
+                    if self.AD.invalid_config_warnings:
+                        self.logger.warning(
+                            "File '%s' invalid structure - ignoring",
+                            path,
+                        )
+
+                if new_config is None:
+                    new_config = {}
+                for app in valid_apps:
+                    if app == "global_modules":
+                        if app in new_config:
+                            new_config[app].extend(valid_apps[app])
+                            continue
+                    if app == "sequence":
+                        if app in new_config:
+                            new_config[app] = {
+                                **new_config[app],
+                                **valid_apps[app],
+                            }
+                            continue
+
+                    if app in new_config:
+                        self.logger.warning(
+                            "File '%s' duplicate app: %s - ignoring",
+                            path,
+                            app,
+                        )
+                    else:
+                        new_config[app] = valid_apps[app]
 
         await self.check_sequence_update(new_config.get("sequence", {}))
 
-        return new_config
+        return new_config, changed_files
 
     async def check_sequence_update(self, sequence_config):
         if self.app_config.get("sequences", {}) != sequence_config:
@@ -535,25 +553,19 @@ class AppManagement:
             if modified_sequences != {}:
                 await self.AD.sequences.add_sequences(modified_sequences)
 
-    # Run in executor
-    def check_later_app_configs(self, last_latest):
+    def check_later_app_configs(self, last_latest, snapshot):
         later_files = {}
         app_config_files = []
         later_files["files"] = []
         later_files["latest"] = last_latest
         later_files["deleted"] = []
-        for root, subdirs, files in os.walk(self.AD.app_dir):
-            subdirs[:] = [d for d in subdirs if d not in self.AD.exclude_dirs and "." not in d]
-            if root[-11:] != "__pycache__" and root[0] != ".":
-                for file in files:
-                    if file[-5:] == self.ext and file[0] != ".":
-                        path = os.path.join(root, file)
-                        app_config_files.append(path)
-                        ts = os.path.getmtime(path)
-                        if ts > last_latest:
-                            later_files["files"].append(path)
-                        if ts > later_files["latest"]:
-                            later_files["latest"] = ts
+        for path, ts in snapshot["files"].items():
+            if path[-5:] == self.ext:
+                app_config_files.append(path)
+                if ts > last_latest:
+                    later_files["files"].append(path)
+                if ts > later_files["latest"]:
+                    later_files["latest"] = ts
 
         for file in self.app_config_files:
             if file not in app_config_files:
@@ -572,6 +584,69 @@ class AppManagement:
 
         return later_files
 
+    # Run in executor
+    def get_config_file_depends(self, path, config):
+        # The modification times of the other files the parsed config depends on
+        if self.use_toml is False:
+            # Includes the global secrets file from appdaemon.yaml when there is no secrets.yaml next to the config
+            secrets_file = utils.get_yaml_secrets_file(path, config)
+        elif isinstance(config, dict) and "secrets" in config:
+            secrets_file = config["secrets"]
+        else:
+            secrets_file = os.path.join(os.path.dirname(path), "secrets" + self.ext)
+
+        try:
+            return {secrets_file: os.path.getmtime(secrets_file)}
+        except OSError:
+            return {secrets_file: None}
+
+    # Run in executor
+    def read_cached_config_file(self, path):
+        # Returns a copy of the parsed config, and whether it had to be parsed again
+        entry = self.config_file_cache.get(path)
+        stat = os.stat(path)
+
+        if (
+            entry is not None
+            and entry["include"] is False
+            and entry["mtime"] == stat.st_mtime
+            and entry["size"] == stat.st_size
+            and self.get_config_file_depends(path, entry["config"]) == entry["depends"]
+        ):
+            return copy.deepcopy(entry["config"]), False
+
+        with open(path, "rb") as f:
+            contents = f.read()
+        digest = hashlib.sha256(contents).hexdigest()
+
+        if (
+            entry is not None
+            and entry["include"] is False
+            and entry["hash"] == digest
+            and self.get_config_file_depends(path, entry["config"]) == entry["depends"]
+        ):
+            # Touched but not changed
+            entry["mtime"] = stat.st_mtime
+            entry["size"] = stat.st_size
+            return copy.deepcopy(entry["config"]), False
+
+        self.logger.debug("Reading %s", path)
+        config = self.read_config_file(path)
+        if config is None:
+            self.config_file_cache.pop(path, None)
+            return None, True
+
+        self.config_file_cache[path] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "hash": digest,
+            # We can't tell when included files change, so always read these
+            "include": b"!include" in contents,
+            "depends": self.get_config_file_depends(path, config),
+            "config": config,
+        }
+        return copy.deepcopy(config), True
+
     # Run in executor
     def read_config_file(self, file):
         try:
@@ -584,19 +659,21 @@ class AppManagement:
             self.logger.warning("-" * 60)
 
     # noinspection PyBroadException
-    async def check_config(self, silent=False, add_threads=True):  # noqa: C901
+    async def check_config(self, silent=False, add_threads=True, snapshot=None):  # noqa: C901
         terminate_apps = {}
         initialize_apps = {}
         total_apps = len(self.app_config)
 
         try:
-            latest = await utils.run_in_executor(self, self.check_later_app_configs, self.app_config_file_modified)
+            if snapshot is None:
+                snapshot = await self.watcher.get_files()
+            latest = self.check_later_app_configs(self.app_config_file_modified, snapshot)
             self.app_config_file_modified = latest["latest"]
 
             if latest["files"] or latest["deleted"]:
                 if silent is False:
                     self.logger.info("Reading config")
-                new_config = await self.read_config()
+                new_config, changed_files = await self.read_config(snapshot)
                 if new_config is None:
                     if silent is False:
                         self.logger.warning("New config not applied")
@@ -620,6 +697,11 @@ class AppManagement:
                         # first we need to remove thhe config path if it exists
                         config_path = new_config[name].pop("config_path", None)
 
+                        if config_path not in changed_files and config_path == self.app_config_paths.get(name):
+                            # It came from a file that hasn't changed, so neither has the app
+                            continue
+                        self.app_config_paths[name] = config_path
+
                         if self.app_config[name] != new_config[name]:
                             # Something changed, clear and reload
 
@@ -644,6 +726,7 @@ class AppManagement:
                         #
                         await self.terminate_app(name, delete=True)
                         await self.remove_entity(name)
+                        self.app_config_paths.pop(name, None)
 
                 for name in new_config:
                     if name in self.non_apps:
@@ -656,8 +739,9 @@ class AppManagement:
 
                         if "class" in new_config[name] and "module" in new_config[name]:
                             # first we need to remove thhe config path if it exists
+                            self.app_config_paths[name] = new_config[name].pop("config_path")
                             config_path = await utils.run_in_executor(
-                                self, os.path.abspath, new_config[name].pop("config_path")
+                                self, os.path.abspath, self.app_config_paths[name]
                             )
 
                             self.logger.info("App '%s' added", name)
@@ -807,48 +891,39 @@ class AppManagement:
         return None
 
     # Run in executor
-    def process_filters(self):
+    def process_filters(self, snapshot):
         if "filters" in self.AD.config:
             for filter in self.AD.config["filters"]:
-                for root, subdirs, files in os.walk(self.AD.app_dir, topdown=True):
-                    # print(root, subdirs, files)
-                    #
-                    # Prune dir list
-                    #
-                    subdirs[:] = [d for d in subdirs if d not in self.AD.exclude_dirs and "." not in d]
-
-                    ext = filter["input_ext"]
-                    extlen = len(ext) * -1
-
-                    for file in files:
-                        run = False
-                        if file[extlen:] == ext:
-                            infile = os.path.join(root, file)
-                            modified = os.path.getmtime(infile)
-                            if infile in self.filter_files:
-                                if self.filter_files[infile] < modified:
-                                    run = True
-                            else:
-                                self.logger.info("Found new filter file %s", infile)
+                ext = filter["input_ext"]
+                extlen = len(ext) * -1
+
+                for infile, modified in snapshot["files"].items():
+                    run = False
+                    if infile[extlen:] == ext:
+                        if infile in self.filter_files:
+                            if self.filter_files[infile] < modified:
                                 run = True
-
-                            if run is True:
-                                self.logger.info("Running filter on %s", infile)
-                                self.filter_files[infile] = modified
-
-                                # Run the filter
-
-                                outfile = utils.rreplace(infile, ext, filter["output_ext"], 1)
-                                command_line = filter["command_line"].replace("$1", infile)
-                                command_line = command_line.replace("$2", outfile)
-                                try:
-                                    subprocess.Popen(command_line, shell=True)
-                                except Exception:
-                                    self.logger.warning("-" * 60)
-                                    self.logger.warning("Unexpected running filter on: %s:", infile)
-                                    self.logger.warning("-" * 60)
-                                    self.logger.warning(traceback.format_exc())
-                                    self.logger.warning("-" * 60)
+                        else:
+                            self.logger.info("Found new filter file %s", infile)
+                            run = True
+
+                        if run is True:
+                            self.logger.info("Running filter on %s", infile)
+                            self.filter_files[infile] = modified
+
+                            # Run the filter
+
+                            outfile = utils.rreplace(infile, ext, filter["output_ext"], 1)
+                            command_line = filter["command_line"].replace("$1", infile)
+                            command_line = command_line.replace("$2", outfile)
+                            try:
+                                subprocess.Popen(command_line, shell=True)
+                            except Exception:
+                                self.logger.warning("-" * 60)
+                                self.logger.warning("Unexpected running filter on: %s:", infile)
+                                self.logger.warning("-" * 60)
+                                self.logger.warning(traceback.format_exc())
+                                self.logger.warning("-" * 60)
 
     @staticmethod
     def file_in_modules(file, modules):
@@ -874,49 +949,44 @@ class AppManagement:
                 pr = cProfile.Profile()
                 pr.enable()
 
+            # Get the state of the app directory, this is cached until something in it changes
+
+            snapshot = await self.watcher.get_files()
+
             # Process filters
 
-            await utils.run_in_executor(self, self.process_filters)
+            if "filters" in self.AD.config:
+                await utils.run_in_executor(self, self.process_filters, snapshot)
 
             # Get list of apps we need to terminate and/or initialize
 
-            apps = await self.check_config()
+            apps = await self.check_config(snapshot=snapshot)
 
-            found_files = []
+            for root in snapshot["dirs"]:
+                if root not in self.module_dirs:
+                    self.logger.info("Adding %s to module import path", root)
+                    sys.path.insert(0, root)
+                    self.module_dirs.append(root)
+
+            found_files = set()
             modules = []
-            for root, subdirs, files in await utils.run_in_executor(self, os.walk, self.AD.app_dir, topdown=True):
-                # print(root, subdirs, files)
-                #
-                # Prune dir list
-                #
-                subdirs[:] = [d for d in subdirs if d not in self.AD.exclude_dirs and "." not in d]
-
-                if root[-11:] != "__pycache__" and root[0] != ".":
-                    if root not in self.module_dirs:
-                        self.logger.info("Adding %s to module import path", root)
-                        sys.path.insert(0, root)
-                        self.module_dirs.append(root)
-
-                for file in files:
-                    if file[-3:] == ".py" and file[0] != ".":
-                        found_files.append(os.path.join(root, file))
-
-            for file in found_files:
-                if file == os.path.join(self.AD.app_dir, "__init__.py"):
+            for file, modified in snapshot["files"].items():
+                if file[-3:] != ".py" or file == os.path.join(self.AD.app_dir, "__init__.py"):
+                    continue
+                found_files.add(file)
+                if file in self.monitored_files and self.monitored_files[file] >= modified:
+                    # Unchanged, no need to look at it again
                     continue
                 try:
                     # check we can actually open the file
                     await utils.run_in_executor(self, self.check_file, file)
 
-                    modified = await utils.run_in_executor(self, os.path.getmtime, file)
                     if file in self.monitored_files:
-                        if self.monitored_files[file] < modified:
-                            modules.append({"name": file, "reload": True})
-                            self.monitored_files[file] = modified
+                        modules.append({"name": file, "reload": True})
                     else:
                         self.logger.debug("Found module %s", file)
                         modules.append({"name": file, "reload": False})
-                        self.monitored_files[file] = modified
+                    self.monitored_files[file] = modified
                 except IOError as err:
                     self.logger.warning("Unable to read app %s: %s - skipping", file, err)
 
@@ -1054,6 +1124,7 @@ class AppManagement:
 
                 # Call initialize() for apps
 
+                init_apps = []
                 for app in sorted(prio_apps, key=prio_apps.get):
                     if "disable" in self.app_config[app] and self.app_config[app]["disable"] is True:
                         pass
@@ -1061,11 +1132,17 @@ class AppManagement:
                         pass
                     else:
                         if apps_terminated.get(app, True) is True:  # the app terminated properly
-                            await self.initialize_app(app)
+                            init_apps.append(app)
 
                         else:
                             self.logger.debug("Cannot initialize app %s, as it didn't terminate properly", app)
 
+                if self.AD.app_init_concurrency > 1:
+                    await self.initialize_apps_parallel(init_apps)
+                else:
+                    for app in init_apps:
+                        await self.initialize_app(app)
+
             if self.AD.check_app_updates_profile is True:
                 pr.disable()
 
@@ -1077,6 +1154,35 @@ class AppManagement:
 
             self.apps_initialized = True
 
+    async def initialize_apps_parallel(self, apps):
+        # Work out how deep each app is in the dependency graph - apps only wait for the apps they depend on
+        levels = {}
+
+        def get_level(app):
+            if app not in levels:
+                levels[app] = 0
+                for dep in self.get_app_dependencies(app):
+                    if dep in apps:
+                        levels[app] = max(levels[app], get_level(dep) + 1)
+            return levels[app]
+
+        groups = {}
+        for app in apps:
+            priority = float(self.app_config[app].get("priority", 50))
+            groups.setdefault((get_level(app), priority), []).append(app)
+
+        semaphore = asyncio.Semaphore(self.AD.app_init_concurrency)
+
+        async def initialize(app):
+            async with semaphore:
+                await self.initialize_app(app)
+
+        # Apps in the same level with the same priority are initialized together, everything else waits its turn
+        for level, priority in sorted(groups):
+            group = groups[(level, priority)]
+            self.logger.debug("Initializing level %s priority %s: %s", level, priority, group)
+            await asyncio.gather(*[initialize(app) for app in group])
+
     def get_path_from_app(self, app):
         module = self.app_config[app]["module"]
         return self.get_file_from_module(module)
@@ -160,6 +160,15 @@ class AppDaemon:
         self.use_stream = False
         utils.process_arg(self, "use_stream", kwargs)
 
+        self.use_inotify = True
+        utils.process_arg(self, "use_inotify", kwargs)
+
+        self.app_init_concurrency = 1
+        utils.process_arg(self, "app_init_concurrency", kwargs, int=True)
+
+        self.state_change_log = 1000
+        utils.process_arg(self, "state_change_log", kwargs, int=True)
+
         self.namespaces = {}
         utils.process_arg(self, "namespaces", kwargs)
 
@@ -97,6 +97,27 @@ var Stream = function(transport, protocol, domain, port, client_name, on_connect
                         }
                     }
                 }
+                else if (data.response_type === "admin_batch")
+                {
+                    // Several admin changes at once, pass each one on as if it had been sent by itself
+                    id = data.response_id;
+                    if (id in self.outstanding_requests) {
+                        callback = self.outstanding_requests[id].callback;
+                        if (callback !== undefined) {
+                            data.data.states.forEach(function(change) {
+                                callback({
+                                    response_type: "state_changed",
+                                    response_id: id,
+                                    data: {
+                                        event_type: "state_changed",
+                                        namespace: data.data.namespace,
+                                        data: change
+                                    }
+                                })
+                            })
+                        }
+                    }
+                }
                 else if (data.response_type === "hello")
                 {
                     id = data.response_id;
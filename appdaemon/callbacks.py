@@ -10,6 +10,24 @@ class Callbacks:
 
         self.callbacks = {}
         self.callbacks_lock = asyncio.Lock()
+
+        #
+        # Index of state callbacks so state changes only visit listeners that can match them.
+        # namespace -> {"entities": {entity_id: {handle: callback}}, "domains": {domain: {handle: callback}},
+        # "all": {handle: callback}} - listeners for the "global" namespace live under "global".
+        # Must only be modified while holding callbacks_lock.
+        #
+        self.state_index = {}
+
+        #
+        # Index of event callbacks by event type, listeners for all events (event=None) are under None.
+        # Log callbacks are kept separately, along with a count per app of callbacks that would see log events
+        # so has_log_callback() doesn't have to look at every callback.
+        #
+        self.event_index = {}
+        self.log_index = {}
+        self.log_callback_apps = {}
+
         self.logger = ad.logging.get_child("_callbacks")
         self.diag = ad.logging.get_diag()
 
@@ -73,9 +91,121 @@ class Callbacks:
             if name in self.callbacks:
                 for cid in self.callbacks[name]:
                     if self.callbacks[name][cid]["type"] == "event":
+                        self.unindex_event_callback(cid, self.callbacks[name][cid])
                         await self.AD.state.remove_entity("admin", "event_callback.{}".format(cid))
                     if self.callbacks[name][cid]["type"] == "state":
+                        self.unindex_state_callback(cid, self.callbacks[name][cid])
+                        self.AD.threading.forget_coalesced(cid)
                         await self.AD.state.remove_entity("admin", "state_callback.{}".format(cid))
                     if self.callbacks[name][cid]["type"] == "log":
+                        self.unindex_log_callback(cid, self.callbacks[name][cid])
                         await self.AD.state.remove_entity("admin", "log_callback.{}".format(cid))
                 del self.callbacks[name]
+
+    #
+    # State callback index
+    #
+
+    @staticmethod
+    def _state_bucket_key(entity):
+        if entity is None:
+            return "all", None
+        elif "." not in entity:
+            return "domains", entity
+        else:
+            return "entities", entity
+
+    def index_state_callback(self, handle, callback):
+        kind, key = self._state_bucket_key(callback["entity"])
+        buckets = self.state_index.setdefault(callback["namespace"], {"entities": {}, "domains": {}, "all": {}})
+        if kind == "all":
+            buckets["all"][handle] = callback
+        else:
+            buckets[kind].setdefault(key, {})[handle] = callback
+
+    def unindex_state_callback(self, handle, callback):
+        buckets = self.state_index.get(callback["namespace"])
+        if buckets is None:
+            return
+
+        kind, key = self._state_bucket_key(callback["entity"])
+        if kind == "all":
+            buckets["all"].pop(handle, None)
+        elif key in buckets[kind]:
+            buckets[kind][key].pop(handle, None)
+            if buckets[kind][key] == {}:
+                del buckets[kind][key]
+
+        if buckets["all"] == {} and buckets["entities"] == {} and buckets["domains"] == {}:
+            del self.state_index[callback["namespace"]]
+
+    def get_state_callbacks(self, namespace, entity_id):
+        """Return a list of (handle, callback) for the state callbacks that may match a change to entity_id"""
+        if namespace == "global":
+            # A change in the global namespace is seen by listeners in every namespace
+            namespaces = list(self.state_index.keys())
+        else:
+            namespaces = [namespace, "global"]
+
+        domain = entity_id.split(".", 1)[0]
+        matches = []
+        for ns in namespaces:
+            buckets = self.state_index.get(ns)
+            if buckets is None:
+                continue
+            matches.extend(buckets["all"].items())
+            if domain in buckets["domains"]:
+                matches.extend(buckets["domains"][domain].items())
+            if entity_id in buckets["entities"]:
+                matches.extend(buckets["entities"][entity_id].items())
+
+        return matches
+
+    #
+    # Event and log callback index
+    #
+
+    def _count_log_callback(self, name, delta):
+        count = self.log_callback_apps.get(name, 0) + delta
+        if count > 0:
+            self.log_callback_apps[name] = count
+        else:
+            self.log_callback_apps.pop(name, None)
+
+    def index_event_callback(self, handle, callback):
+        self.event_index.setdefault(callback["event"], {})[handle] = callback
+        if callback["event"] == "__AD_LOG_EVENT":
+            self._count_log_callback(callback["name"], 1)
+
+    def unindex_event_callback(self, handle, callback):
+        bucket = self.event_index.get(callback["event"])
+        if bucket is not None and handle in bucket:
+            del bucket[handle]
+            if bucket == {}:
+                del self.event_index[callback["event"]]
+            if callback["event"] == "__AD_LOG_EVENT":
+                self._count_log_callback(callback["name"], -1)
+
+    def get_event_callbacks(self, event_type):
+        """Return a list of (handle, callback) for the event callbacks that may match event_type"""
+        matches = list(self.event_index.get(event_type, {}).items())
+        # Listeners for all events never see system events
+        if event_type[:2] != "__" and None in self.event_index:
+            matches.extend(self.event_index[None].items())
+
+        return matches
+
+    def index_log_callback(self, handle, callback):
+        self.log_index[handle] = callback
+        self._count_log_callback(callback["name"], 1)
+
+    def unindex_log_callback(self, handle, callback):
+        if self.log_index.pop(handle, None) is not None:
+            self._count_log_callback(callback["name"], -1)
+
+    def get_log_callbacks(self):
+        """Return a list of (handle, callback) for all log callbacks"""
+        return list(self.log_index.items())
+
+    def has_log_callback(self, name):
+        return name in self.log_callback_apps
@@ -67,6 +67,7 @@ class Events:
                     "pin_thread": pin_thread,
                     "kwargs": kwargs,
                 }
+                self.AD.callbacks.index_event_callback(handle, self.AD.callbacks.callbacks[name][handle])
 
             if "timeout" in kwargs:
                 timeout = kwargs.pop("timeout")
@@ -116,7 +117,9 @@ class Events:
 
         async with self.AD.callbacks.callbacks_lock:
             if name in self.AD.callbacks.callbacks and handle in self.AD.callbacks.callbacks[name]:
-                del self.AD.callbacks.callbacks[name][handle]
+                callback = self.AD.callbacks.callbacks[name].pop(handle)
+                self.AD.callbacks.unindex_event_callback(handle, callback)
+                self.AD.threading.forget_constraints(name, handle)
                 await self.AD.state.remove_entity("admin", "event_callback.{}".format(handle))
                 executed = True
 
@@ -210,6 +213,10 @@ class Events:
 
                     entity_id = data["data"]["entity_id"]
 
+                    # Freeze the states so the store, callbacks and the stream can all share them without copying
+                    data["data"]["new_state"] = utils.freeze(data["data"]["new_state"])
+                    data["data"]["old_state"] = utils.freeze(data["data"].get("old_state"))
+
                     self.AD.state.set_state_simple(namespace, entity_id, data["data"]["new_state"])
 
                     if self.AD.apps is True and namespace != "admin":
@@ -241,6 +248,7 @@ class Events:
                         return
 
                 # take a copy without TS if present as it breaks deepcopy and jason
+                # (entity states are frozen so only the event wrapper itself is actually copied)
                 if "ts" in data["data"]:
                     ts = data["data"].pop("ts")
                     mydata = deepcopy(data)
@@ -268,18 +276,10 @@ class Events:
 
         """
 
-        has_log_callback = False
         if name == "AppDaemon._stream":
             has_log_callback = True
         else:
-            async with self.AD.callbacks.callbacks_lock:
-                for callback in self.AD.callbacks.callbacks:
-                    for _uuid in self.AD.callbacks.callbacks[callback]:
-                        cb = self.AD.callbacks.callbacks[callback][_uuid]
-                        if cb["name"] == name and cb["type"] == "event" and cb["event"] == "__AD_LOG_EVENT":
-                            has_log_callback = True
-                        elif cb["name"] == name and cb["type"] == "log":
-                            has_log_callback = True
+            has_log_callback = self.AD.callbacks.has_log_callback(name)
 
         return has_log_callback
 
@@ -302,69 +302,57 @@ class Events:
 
         removes = []
         async with self.AD.callbacks.callbacks_lock:
-            for name in self.AD.callbacks.callbacks.keys():
-                for uuid_ in self.AD.callbacks.callbacks[name]:
-                    callback = self.AD.callbacks.callbacks[name][uuid_]
-                    if callback["namespace"] == namespace or callback["namespace"] == "global" or namespace == "global":
-                        #
-                        # Check for either a blank event (for all events)
-                        # Or the event is a match
-                        # But don't allow a global listen for any system events (events that start with __)
-                        #
-                        if "event" in callback and (
-                            (callback["event"] is None and data["event_type"][:2] != "__")
-                            or data["event_type"] == callback["event"]
-                        ):
-                            # Check any filters
-
-                            _run = True
-                            for key in callback["kwargs"]:
-                                if key in data["data"]:
-                                    event_val = data["data"][key]
-                                    match_val = callback["kwargs"][key]
-
-                                    if callable(match_val):
-                                        if match_val(event_val) is not True:
-                                            _run = False
-                                    elif match_val != event_val:
-                                        _run = False
-
-                            if data["event_type"] == "__AD_LOG_EVENT":
-                                if (
-                                    "log" in callback["kwargs"]
-                                    and callback["kwargs"]["log"] != data["data"]["log_type"]
-                                ):
+            for uuid_, callback in self.AD.callbacks.get_event_callbacks(data["event_type"]):
+                name = callback["name"]
+                # The index has already matched the event type, or a listen for all non system events
+                if callback["namespace"] == namespace or callback["namespace"] == "global" or namespace == "global":
+                    # Check any filters
+
+                    _run = True
+                    for key in callback["kwargs"]:
+                        if key in data["data"]:
+                            event_val = data["data"][key]
+                            match_val = callback["kwargs"][key]
+
+                            if callable(match_val):
+                                if match_val(event_val) is not True:
                                     _run = False
-
-                            if _run:
-                                if name in self.AD.app_management.objects:
-                                    executed = await self.AD.threading.dispatch_worker(
-                                        name,
-                                        {
-                                            "id": uuid_,
-                                            "name": name,
-                                            "objectid": self.AD.app_management.objects[name]["id"],
-                                            "type": "event",
-                                            "event": data["event_type"],
-                                            "function": callback["function"],
-                                            "data": data["data"],
-                                            "pin_app": callback["pin_app"],
-                                            "pin_thread": callback["pin_thread"],
-                                            "kwargs": callback["kwargs"],
-                                        },
-                                    )
-
-                                    # Remove the callback if appropriate
-                                    if executed is True:
-                                        remove = callback["kwargs"].get("oneshot", False)
-                                        if remove is True:
-                                            removes.append({"name": name, "uuid": uuid_})
-
-                                        # remove timer if appropriate
-                                        timeout = callback["kwargs"].get("__timeout")
-                                        if timeout is not None and self.AD.sched.timer_running(name, timeout):
-                                            # means its still running so got to cancel it
-                                            await self.AD.sched.cancel_timer(name, timeout, False)
+                            elif match_val != event_val:
+                                _run = False
+
+                    if data["event_type"] == "__AD_LOG_EVENT":
+                        if "log" in callback["kwargs"] and callback["kwargs"]["log"] != data["data"]["log_type"]:
+                            _run = False
+
+                    if _run:
+                        if name in self.AD.app_management.objects:
+                            executed = await self.AD.threading.dispatch_worker(
+                                name,
+                                {
+                                    "id": uuid_,
+                                    "name": name,
+                                    "objectid": self.AD.app_management.objects[name]["id"],
+                                    "type": "event",
+                                    "event": data["event_type"],
+                                    "function": callback["function"],
+                                    "data": data["data"],
+                                    "pin_app": callback["pin_app"],
+                                    "pin_thread": callback["pin_thread"],
+                                    "kwargs": callback["kwargs"],
+                                },
+                            )
+
+                            # Remove the callback if appropriate
+                            if executed is True:
+                                remove = callback["kwargs"].get("oneshot", False)
+                                if remove is True:
+                                    removes.append({"name": name, "uuid": uuid_})
+
+                                # remove timer if appropriate
+                                timeout = callback["kwargs"].get("__timeout")
+                                if timeout is not None and self.AD.sched.timer_running(name, timeout):
+                                    # means its still running so got to cancel it
+                                    await self.AD.sched.cancel_timer(name, timeout, False)
 
         for remove in removes:
             await self.cancel_event_callback(remove["name"], remove["uuid"])
@@ -380,4 +368,4 @@ class Events:
     @staticmethod
     def sanitize_event_kwargs(app, kwargs):
         kwargs_copy = kwargs.copy()
-        return utils._sanitize_kwargs(kwargs_copy, ["__silent"])
+        return utils._sanitize_kwargs(kwargs_copy, ["__silent", "callback_priority"])
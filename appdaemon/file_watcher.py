@@ -0,0 +1,153 @@
+"""Watch the app directory for changes to app modules and config files."""
+
+import os
+import sys
+import ctypes
+import ctypes.util
+
+import appdaemon.utils as utils
+from appdaemon.appdaemon import AppDaemon
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+
+
+class FileWatcher:
+    """Keeps a snapshot of every file under the app directory along with its modification time.
+
+    The snapshot is built with a single ``os.scandir()`` sweep of the tree in one executor call. On Linux, inotify is
+    used to find out when anything in the tree has changed, so the sweep is only repeated after a change and an idle
+    tree costs nothing to check. Elsewhere, or if inotify can't be set up, the tree is swept on every check.
+    """
+
+    def __init__(self, ad: AppDaemon, path):
+        self.AD = ad
+        self.path = path
+        self.logger = ad.logging.get_child("_file_watcher")
+
+        self.snapshot = None
+        self.dirty = True
+
+        self.use_inotify = self.AD.use_inotify and sys.platform.startswith("linux")
+        self.libc = None
+        self.fd = None
+        self.watches = {}
+        self.watch_failed = False
+
+    def start_inotify(self):
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+            self.fd = fd
+            self.AD.loop.add_reader(self.fd, self.read_events)
+            self.logger.debug("Using inotify to watch %s", self.path)
+        except Exception as e:
+            self.logger.info("Unable to use inotify to watch %s (%s), polling instead", self.path, e)
+            self.stop()
+
+    def stop(self):
+        self.use_inotify = False
+        if self.fd is not None:
+            self.AD.loop.remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = None
+        self.watches = {}
+
+    def read_events(self):
+        # We don't care what changed, the next sweep will work that out
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        self.dirty = True
+
+    # Run in executor
+    def watch(self, path):
+        if path in self.watches or self.watch_failed is True:
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            self.logger.info("Unable to watch %s (%s), polling instead", path, os.strerror(err))
+            self.watch_failed = True
+        else:
+            self.watches[path] = wd
+
+    # Run in executor
+    def sweep(self):
+        dirs = []
+        files = {}
+        pending = [self.path]
+        while pending:
+            root = pending.pop()
+            if self.fd is not None:
+                # Watch before listing so nothing created in between is missed
+                self.watch(root)
+            dirs.append(root)
+            try:
+                with os.scandir(root) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.name not in self.AD.exclude_dirs and "." not in entry.name:
+                                    pending.append(entry.path)
+                            elif entry.is_dir():
+                                # Links to directories aren't followed, as with os.walk(), so a loop can't trap us
+                                pass
+                            elif entry.name[0] != ".":
+                                files[entry.path] = entry.stat().st_mtime
+                        except OSError:
+                            # Deleted while we were looking at it
+                            pass
+            except OSError:
+                pass
+
+        if self.fd is not None:
+            for path in [path for path in self.watches if path not in dirs]:
+                self.libc.inotify_rm_watch(self.fd, self.watches.pop(path))
+
+        return {"dirs": sorted(dirs), "files": files}
+
+    async def get_files(self):
+        """Returns the current snapshot of the app directory.
+
+        The snapshot is a dictionary with ``dirs``, a list of the directories in the tree that aren't excluded, and
+        ``files``, a dictionary of the files in those directories mapped to their modification times.
+        """
+
+        if self.use_inotify is True and self.fd is None:
+            self.start_inotify()
+
+        if self.dirty is True or self.fd is None:
+            # Clear first so a change made while we are sweeping gets picked up next time
+            self.dirty = False
+            self.snapshot = await utils.run_in_executor(self, self.sweep)
+
+            if self.watch_failed is True:
+                self.stop()
+
+        return self.snapshot
@@ -1,4 +1,5 @@
 import asyncio
+import hashlib
 import json
 import os
 import re
@@ -131,6 +132,10 @@ class HTTP:
         self.ssl_certificate = None
         self.ssl_key = None
         self.transport = "ws"
+        self.stream_queue_size = 1000
+        self.stream_queue_bytes = 16777216
+        self.stream_max_lag = 30
+        self.api_batch_limit = 500
 
         self.config_dir = None
         self._process_arg("config_dir", dashboard)
@@ -360,6 +365,12 @@ class HTTP:
         self._process_arg("transport", http)
         self.logger.info("Using '%s' for event stream", self.transport)
 
+        self._process_arg("stream_queue_size", http)
+        self._process_arg("stream_queue_bytes", http)
+        self._process_arg("stream_max_lag", http)
+
+        self._process_arg("api_batch_limit", http)
+
         self._process_arg("static_dirs", http)
 
     async def start_server(self):
@@ -496,11 +507,17 @@ class HTTP:
             namespace = request.match_info.get("namespace")
 
             self.logger.debug("get_state() called, ns=%s, entity=%s", namespace, entity_id)
+
+            # The entity can't have changed if its namespace hasn't
+            etag = self.AD.state.get_version(namespace)
+            if self.not_modified(request, etag):
+                return self.not_modified_response(etag)
+
             state = self.AD.state.get_entity(namespace, entity_id)
 
             self.logger.debug("result = %s", state)
 
-            return web.json_response({"state": state}, dumps=utils.convert_json)
+            return self.etag_response(web.json_response({"state": state}, dumps=utils.convert_json), etag)
         except Exception:
             self.logger.warning("-" * 60)
             self.logger.warning("Unexpected error in get_entity()")
@@ -517,22 +534,78 @@ class HTTP:
             namespace = request.match_info.get("namespace")
 
             self.logger.debug("get_namespace() called, ns=%s", namespace)
+
+            version = self.AD.state.get_version(namespace)
+            if version is None:
+                return self.get_response(request, 404, "Namespace Not Found")
+
+            if "since" in request.query:
+                try:
+                    since = int(request.query["since"])
+                except ValueError:
+                    return self.get_response(request, 400, "Bad Request")
+                changes = self.AD.state.get_changes(namespace, since)
+                return self.etag_response(web.json_response(changes, dumps=utils.convert_json), version)
+
+            if self.not_modified(request, version):
+                return self.not_modified_response(version)
+
             state = self.AD.state.get_entity(namespace)
 
             self.logger.debug("result = %s", state)
 
-            if state is None:
+            return self.etag_response(
+                web.json_response({"state": state, "version": version}, dumps=utils.convert_json), version
+            )
+        except Exception:
+            self.logger.warning("-" * 60)
+            self.logger.warning("Unexpected error in get_namespace()")
+            self.logger.warning("Namespace: %s", namespace)
+            self.logger.warning("-" * 60)
+            self.logger.warning(traceback.format_exc())
+            self.logger.warning("-" * 60)
+            return self.get_response(request, 500, "Unexpected error in get_namespace()")
+
+    @securedata
+    async def get_state_batch(self, request):
+        namespace = None
+        try:
+            try:
+                data = await request.json()
+            except json.decoder.JSONDecodeError:
+                return self.get_response(request, 400, "JSON Decode Error")
+
+            namespace = request.match_info.get("namespace")
+            entities = data.get("entities") if isinstance(data, dict) else None
+            attributes = data.get("attributes") if isinstance(data, dict) else None
+
+            self.logger.debug("get_state_batch() called, ns=%s, entities=%s", namespace, entities)
+
+            if not isinstance(entities, list) or not all(isinstance(entity_id, str) for entity_id in entities):
+                return self.get_response(request, 400, "Bad Request")
+
+            if attributes is not None and (
+                not isinstance(attributes, list) or not all(isinstance(attribute, str) for attribute in attributes)
+            ):
+                return self.get_response(request, 400, "Bad Request")
+
+            if self.api_batch_limit and len(entities) > self.api_batch_limit:
+                return self.get_response(request, 413, "Too Many Entities")
+
+            if not await self.AD.state.namespace_exists(namespace):
                 return self.get_response(request, 404, "Namespace Not Found")
 
+            state = self.AD.state.get_entities(namespace, entities, attributes)
+
             return web.json_response({"state": state}, dumps=utils.convert_json)
         except Exception:
             self.logger.warning("-" * 60)
-            self.logger.warning("Unexpected error in get_namespace()")
+            self.logger.warning("Unexpected error in get_state_batch()")
             self.logger.warning("Namespace: %s", namespace)
             self.logger.warning("-" * 60)
             self.logger.warning(traceback.format_exc())
             self.logger.warning("-" * 60)
-            return self.get_response(request, 500, "Unexpected error in get_namespace()")
+            return self.get_response(request, 500, "Unexpected error in get_state_batch()")
 
     @securedata
     async def get_namespace_entities(self, request):
@@ -594,6 +667,12 @@ class HTTP:
     async def get_state(self, request):
         try:
             self.logger.debug("get_state() called")
+
+            versions = {namespace: self.AD.state.get_version(namespace) for namespace in self.AD.state.state}
+            etag = hashlib.sha1(utils.convert_json(versions, sort_keys=True).encode()).hexdigest()[:16]
+            if self.not_modified(request, etag):
+                return self.not_modified_response(etag)
+
             state = self.AD.state.get_entity()
 
             if state is None:
@@ -601,7 +680,7 @@ class HTTP:
 
             self.logger.debug("result = %s", state)
 
-            return web.json_response({"state": state}, dumps=utils.convert_json)
+            return self.etag_response(web.json_response({"state": state}, dumps=utils.convert_json), etag)
         except Exception:
             self.logger.warning("-" * 60)
             self.logger.warning("Unexpected error in get_state()")
@@ -678,6 +757,60 @@ class HTTP:
             self.logger.warning("-" * 60)
             return web.Response(status=500)
 
+    @securedata
+    async def call_service_batch(self, request):
+        try:
+            try:
+                data = await request.json()
+            except json.decoder.JSONDecodeError:
+                return self.get_response(request, 400, "JSON Decode Error")
+
+            calls = data.get("calls") if isinstance(data, dict) else None
+            if not isinstance(calls, list):
+                return self.get_response(request, 400, "Bad Request")
+
+            if self.api_batch_limit and len(calls) > self.api_batch_limit:
+                return self.get_response(request, 413, "Too Many Calls")
+
+            self.logger.debug("call_service_batch() %s calls", len(calls))
+
+            # The calls are made at the same time, and each gets its own result in the same order
+            results = await asyncio.gather(*[self._batch_call(call) for call in calls])
+            return web.json_response({"results": results}, status=200, dumps=utils.convert_json)
+
+        except Exception:
+            self.logger.warning("-" * 60)
+            self.logger.warning("Unexpected error in call_service_batch()")
+            self.logger.warning("-" * 60)
+            self.logger.warning(traceback.format_exc())
+            self.logger.warning("-" * 60)
+            return web.Response(status=500)
+
+    async def _batch_call(self, call):
+        if not isinstance(call, dict) or not all(
+            isinstance(call.get(key), str) for key in ("namespace", "domain", "service")
+        ):
+            return {"success": False, "error": "namespace, domain and service are required"}
+
+        args = call.get("data", {})
+        if not isinstance(args, dict):
+            return {"success": False, "error": "data must be an object"}
+
+        # Wait for each call to finish unless told otherwise, so there is a result to return
+        args = dict(args)
+        args.setdefault("return_result", True)
+
+        try:
+            res = await self.AD.services.call_service(
+                call["namespace"], call["domain"], call["service"], args, raise_errors=True
+            )
+            return {"success": True, "response": res}
+        except Exception as e:
+            self.logger.warning(
+                "Error in batch call to %s/%s/%s: %s", call["namespace"], call["domain"], call["service"], e
+            )
+            return {"success": False, "error": str(e)}
+
     @securedata
     async def fire_event(self, request):
         try:
@@ -722,14 +855,23 @@ class HTTP:
     async def stream_update(self, namespace, data):
         # self.logger.debug("stream_update() %s:%s", namespace, data)
         data["namespace"] = namespace
+        if namespace == "admin" and self.stats_update == "batch":
+            # Admin changes are collected and sent together by the admin loop
+            if data["event_type"] == "state_changed":
+                self.stream.batch_admin_update(data)
+                return
+            if data["event_type"] == "__AD_ENTITY_REMOVED":
+                self.stream.discard_admin_update(data["data"]["entity_id"])
         self.AD.thread_async.call_async_no_wait(self.stream.process_event, data)
 
     # Routes, Status and Templates
 
     def setup_api_routes(self):
+        self.app.router.add_post("/api/appdaemon/service/batch", self.call_service_batch)
         self.app.router.add_post("/api/appdaemon/service/{namespace}/{domain}/{service}", self.call_service)
         self.app.router.add_post("/api/appdaemon/event/{namespace}/{event}", self.fire_event)
         self.app.router.add_get("/api/appdaemon/service/", self.get_services)
+        self.app.router.add_post("/api/appdaemon/state/{namespace}/batch", self.get_state_batch)
         self.app.router.add_get("/api/appdaemon/state/{namespace}/{entity}", self.get_entity)
         self.app.router.add_get("/api/appdaemon/state/{namespace}", self.get_namespace)
         self.app.router.add_get("/api/appdaemon/state/{namespace}/", self.get_namespace_entities)
@@ -836,6 +978,22 @@ class HTTP:
         if name in self.app_routes:
             del self.app_routes[name]
 
+    @staticmethod
+    def not_modified(request, etag):
+        """Returns ``True`` if the request's If-None-Match header shows the client already has this version"""
+        if etag is None or not request.if_none_match:
+            return False
+        return any(tag.value in (str(etag), "*") for tag in request.if_none_match)
+
+    def not_modified_response(self, etag):
+        return self.etag_response(web.Response(status=304), etag)
+
+    @staticmethod
+    def etag_response(response, etag):
+        if etag is not None:
+            response.etag = str(etag)
+        return response
+
     def get_response(self, request, code, error):
         res = "<html><head><title>{} {}</title></head><body><h1>{} {}</h1>Error in API Call</body></html>".format(
             code, error, code, error
@@ -511,6 +511,7 @@ class Logging:
                             "pin_thread": pin_thread,
                             "kwargs": cb_kwargs,
                         }
+                        self.AD.callbacks.index_log_callback(handle, self.AD.callbacks.callbacks[name][handle])
 
                         handles.append(handle)
 
@@ -560,42 +561,39 @@ class Logging:
 
         removes = []
         async with self.AD.callbacks.callbacks_lock:
-            for name in self.AD.callbacks.callbacks.keys():
-                for uuid_ in self.AD.callbacks.callbacks[name]:
-                    callback = self.AD.callbacks.callbacks[name][uuid_]
-                    if callback["type"] == "log" and (
-                        callback["namespace"] == namespace or callback["namespace"] == "global" or namespace == "global"
-                    ):
-                        # Check any filters
-                        _run = True
-                        if "log" in callback["kwargs"] and callback["kwargs"]["log"] != data["log_type"]:
-                            _run = False
-
-                        if "level" in callback["kwargs"] and callback["kwargs"]["level"] != data["level"]:
-                            _run = False
-
-                        if _run:
-                            if name in self.AD.app_management.objects:
-                                executed = await self.AD.threading.dispatch_worker(
-                                    name,
-                                    {
-                                        "id": uuid_,
-                                        "name": name,
-                                        "objectid": self.AD.app_management.objects[name]["id"],
-                                        "type": "log",
-                                        "function": callback["function"],
-                                        "data": data,
-                                        "pin_app": callback["pin_app"],
-                                        "pin_thread": callback["pin_thread"],
-                                        "kwargs": callback["kwargs"],
-                                    },
-                                )
-
-                                # Remove the callback if appropriate
-                                if executed is True:
-                                    remove = callback["kwargs"].get("oneshot", False)
-                                    if remove is True:
-                                        removes.append({"name": callback["name"], "uuid": uuid_})
+            for uuid_, callback in self.AD.callbacks.get_log_callbacks():
+                name = callback["name"]
+                if callback["namespace"] == namespace or callback["namespace"] == "global" or namespace == "global":
+                    # Check any filters
+                    _run = True
+                    if "log" in callback["kwargs"] and callback["kwargs"]["log"] != data["log_type"]:
+                        _run = False
+
+                    if "level" in callback["kwargs"] and callback["kwargs"]["level"] != data["level"]:
+                        _run = False
+
+                    if _run:
+                        if name in self.AD.app_management.objects:
+                            executed = await self.AD.threading.dispatch_worker(
+                                name,
+                                {
+                                    "id": uuid_,
+                                    "name": name,
+                                    "objectid": self.AD.app_management.objects[name]["id"],
+                                    "type": "log",
+                                    "function": callback["function"],
+                                    "data": data,
+                                    "pin_app": callback["pin_app"],
+                                    "pin_thread": callback["pin_thread"],
+                                    "kwargs": callback["kwargs"],
+                                },
+                            )
+
+                            # Remove the callback if appropriate
+                            if executed is True:
+                                remove = callback["kwargs"].get("oneshot", False)
+                                if remove is True:
+                                    removes.append({"name": callback["name"], "uuid": uuid_})
 
         for remove in removes:
             await self.cancel_log_callback(remove["name"], remove["uuid"])
@@ -620,7 +618,9 @@ class Logging:
         async with self.AD.callbacks.callbacks_lock:
             for handle in handles:
                 if name in self.AD.callbacks.callbacks and handle in self.AD.callbacks.callbacks[name]:
-                    del self.AD.callbacks.callbacks[name][handle]
+                    callback = self.AD.callbacks.callbacks[name].pop(handle)
+                    self.AD.callbacks.unindex_log_callback(handle, callback)
+                    self.AD.threading.forget_constraints(name, handle)
                     await self.AD.state.remove_entity("admin", "log_callback.{}".format(handle))
                     executed = True
                 if name in self.AD.callbacks.callbacks and self.AD.callbacks.callbacks[name] == {}:
@@ -636,4 +636,4 @@ class Logging:
     @staticmethod
     def sanitize_log_kwargs(app, kwargs):
         kwargs_copy = kwargs.copy()
-        return utils._sanitize_kwargs(kwargs_copy, ["__silent", "level"])
+        return utils._sanitize_kwargs(kwargs_copy, ["__silent", "level", "callback_priority"])
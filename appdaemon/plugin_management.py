@@ -105,6 +105,9 @@ class Plugins:
                     if "refresh_timeout" not in self.plugins[name]:
                         self.plugins[name]["refresh_timeout"] = 30
 
+                    if "refresh_mode" not in self.plugins[name]:
+                        self.plugins[name]["refresh_mode"] = "full"
+
                     if "use_dictionary_unpacking" not in self.plugins[name]:
                         self.plugins[name]["use_dictionary_unpacking"] = True
 
@@ -373,7 +376,19 @@ class Plugins:
                             else:
                                 namespace = plugin
 
-                            self.AD.state.update_namespace_state(namespace, state)
+                            if self.plugins[name]["refresh_mode"] == "incremental":
+                                counts = await self.AD.state.refresh_namespace_state(namespace, state)
+                                self.logger.debug("Refreshed %s state: %s", name, counts)
+                                await self.AD.state.set_state(
+                                    "plugin",
+                                    "admin",
+                                    f"plugin.{name}",
+                                    refresh_entities=counts["entities"],
+                                    refresh_changed=counts["changed"],
+                                    refresh_added=counts["added"],
+                                )
+                            else:
+                                self.AD.state.update_namespace_state(namespace, state)
 
                     except asyncio.TimeoutError:
                         self.logger.warning(
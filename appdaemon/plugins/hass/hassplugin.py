@@ -10,7 +10,6 @@ from urllib.parse import quote, urlencode
 
 import aiohttp
 import pytz
-import websocket
 from deepdiff import DeepDiff
 
 import appdaemon.utils as utils
@@ -65,12 +64,16 @@ class HassPlugin(PluginBase):
         self.namespace = args.get("namespace", "default")
         self.plugin_startup_conditions = args.get("plugin_startup_conditions", {})
         self.retry_secs = int(args.get("retry_secs", 5))
-        self.timeout = args.get("timeout")
+        self.timeout = float(args.get("timeout", 60))
         self.token = args.get("token")
 
         # Connections to HA
         self._session = None  # http connection pool for general use
         self.ws = None  # websocket dedicated for event loop
+        self.ws_reader = None  # task reading messages from the websocket
+        self.ws_events = None  # events read from the websocket waiting to be processed
+        self.ws_id = 0  # last message id used on the websocket
+        self.ws_futures = {}  # message id -> future waiting for the result of a command
 
         # Cached state from HA
         self.metadata = None
@@ -92,7 +95,7 @@ class HassPlugin(PluginBase):
         self.logger.debug("stop() called for %s", self.name)
         self.stopping = True
         if self.ws is not None:
-            self.ws.close()
+            self.AD.loop.create_task(self.ws.close())
 
     #
     # Placeholder for constraints
@@ -106,10 +109,14 @@ class HassPlugin(PluginBase):
     @property
     def session(self):
         if not self._session:
-            # ssl None means to use default behavior which check certs for https
-            ssl_context = None if self.cert_verify else False
-            if self.cert_verify and self.cert_path:
-                ssl_context = ssl.create_default_context(capath=self.cert_path)
+            # ssl None means to use default behavior which check certs for https,
+            # the websocket shares this connector so only an explicit False turns checking off
+            ssl_context = False if self.cert_verify is False else None
+            if ssl_context is None and self.cert_path:
+                if os.path.isdir(self.cert_path):
+                    ssl_context = ssl.create_default_context(capath=self.cert_path)
+                else:
+                    ssl_context = ssl.create_default_context(cafile=self.cert_path)
             conn = aiohttp.TCPConnector(ssl=ssl_context)
 
             # configure auth
@@ -137,17 +144,11 @@ class HassPlugin(PluginBase):
         elif url.startswith("http://"):
             url = url.replace("http", "ws", 1)
 
-        # ssl options
-        sslopt = {}
-        if self.cert_verify is False:
-            sslopt = {"cert_reqs": ssl.CERT_NONE}
-        if self.cert_path:
-            sslopt["ca_certs"] = self.cert_path
-        ws = websocket.create_connection("{}/api/websocket".format(url), sslopt=sslopt)
+        # ssl options come from the session's connector, HA messages have no practical size limit
+        ws = await self.session.ws_connect("{}/api/websocket".format(url), max_msg_size=0)
 
         # wait for successful connection
-        res = await utils.run_in_executor(self, ws.recv)
-        result = json.loads(res)
+        result = json.loads(await self.ws_receive(ws))
         self.logger.info("Connected to Home Assistant %s", result["ha_version"])
 
         # Check if auth required, if so send password
@@ -159,14 +160,82 @@ class HassPlugin(PluginBase):
             else:
                 raise ValueError("HASS requires authentication and none provided in plugin config")
 
-            await utils.run_in_executor(self, ws.send, auth)
-            result = json.loads(ws.recv())
+            await ws.send_str(auth)
+            result = json.loads(await self.ws_receive(ws))
             if result["type"] != "auth_ok":
                 self.logger.warning("Error in authentication")
+                await ws.close()
                 raise ValueError("Error in authentication")
 
         return ws
 
+    #
+    # Read the next text message from a WebSocket, anything else means the connection has gone
+    #
+    async def ws_receive(self, ws):
+        msg = await ws.receive()
+        if msg.type == aiohttp.WSMsgType.TEXT:
+            return msg.data
+        elif msg.type == aiohttp.WSMsgType.ERROR:
+            raise ConnectionError("Error reading from Home Assistant: {}".format(ws.exception()))
+        else:
+            raise ConnectionError("Connection to Home Assistant closed ({})".format(msg.type.name))
+
+    #
+    # Read messages from the websocket until it closes, handing results to the commands waiting for them and
+    # everything else to get_updates()
+    #
+    async def read_websocket(self, ws, events, futures):
+        try:
+            while True:
+                ret = await self.ws_receive(ws)
+                result = json.loads(ret)
+                if result.get("type") == "result":
+                    # Anything not waited on is a late reply to a command that timed out
+                    self.update_perf(bytes_recv=len(ret))
+                    future = futures.pop(result.get("id"), None)
+                    if future is not None and not future.done():
+                        future.set_result(result)
+                else:
+                    self.update_perf(bytes_recv=len(ret), updates_recv=1)
+                    events.put_nowait((ret, result))
+        except Exception as ex:
+            events.put_nowait((None, ex))
+        finally:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection to Home Assistant lost"))
+            futures.clear()
+
+    def stream_ready(self):
+        return self.AD.use_stream is True and self.ws_reader is not None and not self.ws_reader.done()
+
+    #
+    # Send a command over the websocket and wait for its result
+    #
+    async def ws_command(self, command):
+        if self.ws_reader is None or self.ws_reader.done():
+            raise ConnectionError("Not connected to Home Assistant")
+
+        self.ws_id += 1
+        command["id"] = self.ws_id
+        future = self.AD.loop.create_future()
+        self.ws_futures[self.ws_id] = future
+
+        msg = utils.convert_json(command)
+        try:
+            await self.ws.send_str(msg)
+        except Exception:
+            self.ws_futures.pop(command["id"], None)
+            raise
+        self.update_perf(bytes_sent=len(msg), requests_sent=1)
+
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.ws_futures.pop(command["id"], None)
+            raise
+
     #
     # Get initial state
     #
@@ -330,13 +399,22 @@ class HassPlugin(PluginBase):
                 # Subscribe to event stream
                 #
                 sub = json.dumps({"id": _id, "type": "subscribe_events"})
-                await utils.run_in_executor(self, self.ws.send, sub)
-                result = json.loads(self.ws.recv())
+                await self.ws.send_str(sub)
+                result = json.loads(await self.ws_receive(self.ws))
                 if not (result["id"] == _id and result["type"] == "result" and result["success"] is True):
                     self.logger.warning("Unable to subscribe to HA events, id = %s", _id)
                     self.logger.warning(result)
                     raise ValueError("Error subscribing to HA Events")
 
+                #
+                # From here on messages are read by a separate task so commands can be sent over the websocket
+                # while events are being processed
+                #
+                self.ws_id = _id
+                self.ws_events = asyncio.Queue()
+                self.ws_futures = {}
+                self.ws_reader = asyncio.create_task(self.read_websocket(self.ws, self.ws_events, self.ws_futures))
+
                 #
                 # Grab Metadata
                 #
@@ -377,10 +455,9 @@ class HassPlugin(PluginBase):
                 # Loop forever consuming events
                 #
                 while not self.stopping:
-                    ret = await utils.run_in_executor(self, self.ws.recv)
-                    result = json.loads(ret)
-
-                    self.update_perf(bytes_recv=len(ret), updates_recv=1)
+                    ret, result = await self.ws_events.get()
+                    if ret is None:
+                        raise result
 
                     if not (result["id"] == _id and result["type"] == "event"):
                         self.logger.warning("Unexpected result from Home Assistant, id = %s", _id)
@@ -415,6 +492,11 @@ class HassPlugin(PluginBase):
             except Exception:
                 self.reading_messages = False
                 self.hass_booting = True
+                if self.ws_reader is not None:
+                    self.ws_reader.cancel()
+                    self.ws_reader = None
+                if self.ws is not None:
+                    await self.ws.close()
                 # remove callback from getting local events
                 await self.AD.callbacks.clear_callbacks(self.name)
 
@@ -456,15 +538,14 @@ class HassPlugin(PluginBase):
 
     @hass_check
     async def set_plugin_state(self, namespace, entity_id, **kwargs):
-        # if self.AD.use_stream is True:
-        if False is True:
+        if self.stream_ready():
             return await self.set_plugin_state_stream(namespace, entity_id, **kwargs)
         else:
             return await self.set_plugin_state_rest(namespace, entity_id, **kwargs)
 
     async def set_plugin_state_stream(self, namespace, entity_id, **kwargs):
-        self.logger.warning("set_plugin_state_stream() called - not yet implemented]")
-        return None
+        # HA has no websocket command to set a state
+        return await self.set_plugin_state_rest(namespace, entity_id, **kwargs)
 
     async def set_plugin_state_rest(self, namespace, entity_id, **kwargs):
         self.logger.debug("set_plugin_state() %s %s %s", namespace, entity_id, kwargs)
@@ -506,15 +587,70 @@ class HassPlugin(PluginBase):
 
     @hass_check  # noqa: C901
     async def call_plugin_service(self, namespace, domain, service, data):
-        # if self.AD.use_stream is True:
-        if False is True:
+        if self.stream_ready():
             return await self.call_plugin_service_stream(namespace, domain, service, data)
         else:
             return await self.call_plugin_service_rest(namespace, domain, service, data)
 
     async def call_plugin_service_stream(self, namespace, domain, service, data):
-        self.logger.warning("all_plugin_service_stream() called - not yet implemented]")
-        return None
+        self.logger.debug(
+            "call_plugin_service() namespace=%s domain=%s service=%s data=%s",
+            namespace,
+            domain,
+            service,
+            data,
+        )
+
+        # if we get a request for not our namespace something has gone very wrong
+        assert namespace == self.namespace
+
+        #
+        # If data is a string just assume it's an entity_id
+        #
+        if isinstance(data, str):
+            data = {"entity_id": data}
+
+        if domain == "template" and service == "render":
+            # Template rendering is a subscription over the websocket, a single render is simpler over REST
+            return await self.call_plugin_service_rest(namespace, domain, service, data)
+
+        elif domain == "database":
+            return await self.get_history(**data)
+
+        try:
+            result = await self.ws_command(
+                {"type": "call_service", "domain": domain, "service": service, "service_data": data}
+            )
+            if result["success"] is True:
+                return result["result"]
+            else:
+                self.logger.warning(
+                    "Error calling Home Assistant service %s/%s/%s (data=%s)",
+                    namespace,
+                    domain,
+                    service,
+                    data,
+                )
+                self.logger.warning("Error: %s", result.get("error"))
+                return None
+        except asyncio.TimeoutError:
+            self.logger.warning(
+                "Timeout in call_service(%s/%s/%s, %s)",
+                namespace,
+                domain,
+                service,
+                data,
+            )
+        except ConnectionError:
+            self.logger.warning("HASS Disconnected unexpectedly during call_service()")
+        except Exception:
+            self.logger.error("-" * 60)
+            self.logger.error("Unexpected error during call_plugin_service()")
+            self.logger.error("Service: %s.%s.%s Arguments: %s", namespace, domain, service, data)
+            self.logger.error("-" * 60)
+            self.logger.error(traceback.format_exc())
+            self.logger.error("-" * 60)
+            return None
 
     async def call_plugin_service_rest(self, namespace, domain, service, data):
         self.logger.debug(
@@ -585,14 +721,69 @@ class HassPlugin(PluginBase):
             return None
 
     async def get_history(self, **kwargs):
-        # if self.AD.use_stream is True:
-        if False is True:
+        if self.stream_ready():
             return await self.get_history_stream(**kwargs)
         else:
             return await self.get_history_rest(**kwargs)
 
     async def get_history_stream(self, **kwargs):
-        self.logger.warning("get_history_stream() called - not yet implemented]")
+        """Used to get HA's History over the websocket, results are returned in the same format as the REST API"""
+
+        try:
+            entity_id, start_time, end_time = await self.get_history_period(**kwargs)
+            if not entity_id:
+                # The websocket command needs a list of entities
+                return await self.get_history_rest(**kwargs)
+
+            if start_time is None:
+                start_time = end_time - datetime.timedelta(days=1)
+
+            result = await self.ws_command(
+                {
+                    "type": "history/history_during_period",
+                    "start_time": utils.dt_to_str(start_time, self.AD.tz),
+                    "end_time": utils.dt_to_str(end_time, self.AD.tz),
+                    "entity_ids": [entity.strip() for entity in entity_id.split(",")],
+                    "minimal_response": False,
+                    "no_attributes": False,
+                }
+            )
+            if result["success"] is not True:
+                self.logger.warning("Error calling Home Assistant to get_history")
+                self.logger.warning("Error: %s", result.get("error"))
+                return None
+
+            history = []
+            for entity, states in result["result"].items():
+                entity_history = []
+                for state in states:
+                    last_updated = datetime.datetime.fromtimestamp(state["lu"], pytz.utc).isoformat()
+                    if "lc" in state:
+                        last_changed = datetime.datetime.fromtimestamp(state["lc"], pytz.utc).isoformat()
+                    else:
+                        last_changed = last_updated
+                    entity_history.append(
+                        {
+                            "entity_id": entity,
+                            "state": state["s"],
+                            "attributes": state.get("a", {}),
+                            "last_changed": last_changed,
+                            "last_updated": last_updated,
+                        }
+                    )
+                history.append(entity_history)
+            return history
+
+        except ConnectionError:
+            self.logger.warning("HASS Disconnected unexpectedly during get_history()")
+
+        except Exception:
+            self.logger.error("-" * 60)
+            self.logger.error("Unexpected error during get_history")
+            self.logger.error("-" * 60)
+            self.logger.error(traceback.format_exc())
+            self.logger.error("-" * 60)
+
         return None
 
     async def get_history_rest(self, **kwargs):
@@ -629,8 +820,7 @@ class HassPlugin(PluginBase):
 
         return None
 
-    async def get_history_api(self, **kwargs):
-        query = {}
+    async def get_history_period(self, **kwargs):
         entity_id = None
         days = None
         start_time = None
@@ -671,6 +861,12 @@ class HassPlugin(PluginBase):
             start_time = now - datetime.timedelta(days=days)
             end_time = now
 
+        return entity_id, start_time, end_time
+
+    async def get_history_api(self, **kwargs):
+        query = {}
+        entity_id, start_time, end_time = await self.get_history_period(**kwargs)
+
         # Build the url
         # /api/history/period/<start_time>?filter_entity_id=<entity_id>&end_time=<end_time>
         apiurl = f"{self.ha_url}/api/history/period"
@@ -688,15 +884,23 @@ class HassPlugin(PluginBase):
         return apiurl
 
     async def get_hass_state(self, entity_id=None):
-        # if self.AD.use_stream is True:
-        if False is True:
+        if self.stream_ready():
             return await self.get_hass_state_stream(entity_id)
         else:
             return await self.get_hass_state_rest(entity_id)
 
     async def get_hass_state_stream(self, entity_id):
-        self.logger.warning("get_hass_state_stream() called - not yet implemented]")
-        return None
+        if entity_id is not None:
+            # The websocket only returns all states at once, a single entity is cheaper over REST
+            return await self.get_hass_state_rest(entity_id)
+
+        self.logger.debug("get_ha_state: using websocket")
+        result = await self.ws_command({"type": "get_states"})
+        if result["success"] is not True:
+            self.logger.warning("Error getting Home Assistant state for %s", entity_id)
+            self.logger.warning("Error: %s", result.get("error"))
+            return None
+        return result["result"]
 
     async def get_hass_state_rest(self, entity_id):
         if entity_id is None:
@@ -897,15 +1101,34 @@ class HassPlugin(PluginBase):
 
     @hass_check
     async def fire_plugin_event(self, event, namespace, **kwargs):
-        # if self.AD.use_stream is True:
-        if False is True:
+        if self.stream_ready():
             return await self.fire_plugin_event_stream(event, namespace, **kwargs)
         else:
             return await self.fire_plugin_event_rest(event, namespace, **kwargs)
 
     async def fire_plugin_event_stream(self, event, namespace, **kwargs):
-        self.logger.warning("fire_plugin_event_stream() called - not yet implemented]")
-        return None
+        self.logger.debug("fire_event: %s, %s %s", event, namespace, kwargs)
+
+        # if we get a request for not our namespace something has gone very wrong
+        assert namespace == self.namespace
+
+        try:
+            result = await self.ws_command({"type": "fire_event", "event_type": event, "event_data": kwargs})
+            if result["success"] is not True:
+                self.logger.warning("Error firing Home Assistant event %s: %s", event, result.get("error"))
+                return None
+            return result["result"]
+        except asyncio.TimeoutError:
+            self.logger.warning("Timeout in fire_event(%s, %s)", event, kwargs)
+        except ConnectionError:
+            self.logger.warning("HASS Disconnected unexpectedly during fire_event()")
+        except Exception:
+            self.logger.warning("-" * 60)
+            self.logger.warning("Unexpected error fire_plugin_event()")
+            self.logger.warning("-" * 60)
+            self.logger.warning(traceback.format_exc())
+            self.logger.warning("-" * 60)
+            return None
 
     async def fire_plugin_event_rest(self, event, namespace, **kwargs):
         self.logger.debug("fire_event: %s, %s %s", event, namespace, kwargs)
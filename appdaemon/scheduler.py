@@ -1,5 +1,7 @@
 import asyncio
 import datetime
+import heapq
+import itertools
 import logging
 import random
 import re
@@ -15,6 +17,79 @@ import appdaemon.utils as utils
 from appdaemon.appdaemon import AppDaemon
 
 
+class TimerQueue:
+    """Priority queue of scheduler entries ordered by timestamp.
+
+    Entries are stored in a heap as (timestamp, sequence, name, handle) tuples. Removing or moving a timer
+    doesn't touch the heap, instead the old heap entry is invalidated by recording a new sequence number for the
+    handle, and stale entries are discarded when they reach the top of the heap.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.live = {}
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.live)
+
+    def push(self, name, handle, timestamp):
+        """Add a timer, or move it if it is already queued"""
+        seq = next(self.counter)
+        self.live[handle] = seq
+        heapq.heappush(self.heap, (timestamp, seq, name, handle))
+
+    def remove(self, handle):
+        """Remove a timer, compacting the heap if it has become mostly stale entries"""
+        self.live.pop(handle, None)
+        if len(self.heap) > 64 and len(self.heap) > 2 * len(self.live):
+            self.heap = [entry for entry in self.heap if self._is_live(entry)]
+            heapq.heapify(self.heap)
+
+    def _is_live(self, entry):
+        return self.live.get(entry[3]) == entry[1]
+
+    def _prune(self):
+        while self.heap and not self._is_live(self.heap[0]):
+            heapq.heappop(self.heap)
+
+    def next_timestamp(self):
+        self._prune()
+        if self.heap:
+            return self.heap[0][0]
+        return None
+
+    def next_entries(self):
+        """Return the timers sharing the earliest timestamp, leaving them queued"""
+        next_exec = self.next_timestamp()
+        if next_exec is None:
+            return []
+
+        popped = []
+        while self.heap and self.heap[0][0] == next_exec:
+            entry = heapq.heappop(self.heap)
+            if self._is_live(entry):
+                popped.append(entry)
+        for entry in popped:
+            heapq.heappush(self.heap, entry)
+
+        return [{"name": name, "uuid": handle, "timestamp": ts} for ts, _, name, handle in popped]
+
+    def pop_due(self, now):
+        """Remove and return every timer due at or before now, in timestamp order.
+
+        A returned timer is no longer queued - it must be pushed again if it is going to repeat.
+        """
+        due_entries = []
+        while self.heap and self.heap[0][0] <= now:
+            ts, seq, name, handle = heapq.heappop(self.heap)
+            if self.live.get(handle) == seq:
+                del self.live[handle]
+                due_entries.append({"name": name, "uuid": handle, "timestamp": ts})
+
+        return due_entries
+
+
 class Scheduler:
     def __init__(self, ad: AppDaemon):
         self.AD = ad
@@ -28,6 +103,8 @@ class Scheduler:
         self.timer_resetted = False
         self.location = None
         self.schedule = {}
+        # Index of self.schedule ordered by timestamp
+        self.timers = TimerQueue()
 
         self.now = pytz.utc.localize(datetime.datetime.utcnow())
 
@@ -141,6 +218,7 @@ class Scheduler:
             "pin_thread": pin_thread,
             "kwargs": kwargs,
         }
+        self.timers.push(name, handle, ts)
 
         if callback is None:
             function_name = "cancel_callback"
@@ -175,6 +253,8 @@ class Scheduler:
         self.logger.debug("Canceling timer for %s", name)
         if self.timer_running(name, handle):
             del self.schedule[name][handle]
+            self.timers.remove(handle)
+            self.AD.threading.forget_constraints(name, handle)
             await self.AD.state.remove_entity("admin", f"scheduler_callback.{handle}")
             executed = True
 
@@ -206,6 +286,8 @@ class Scheduler:
                 args["basetime"] += timedelta(seconds=args["interval"])
                 args["timestamp"] = args["basetime"] + timedelta(seconds=self.get_offset(args))
 
+        self.timers.push(args["name"], uuid_, args["timestamp"])
+
         # Update entity
 
         await self.AD.state.set_state(
@@ -352,6 +434,7 @@ class Scheduler:
                 await self.AD.state.remove_entity("admin", "scheduler_callback.{}".format(uuid_))
 
                 del self.schedule[name][uuid_]
+                self.timers.remove(uuid_)
 
         except Exception:
             error_logger = logging.getLogger("Error.{}".format(name))
@@ -367,6 +450,7 @@ class Scheduler:
             error_logger.warning("-" * 60)
             await self.AD.state.remove_entity("admin", "scheduler_callback.{}".format(uuid_))
             del self.schedule[name][uuid_]
+            self.timers.remove(uuid_)
 
     def init_sun(self):
         latitude = self.AD.latitude
@@ -455,6 +539,7 @@ class Scheduler:
     async def terminate_app(self, name):
         if name in self.schedule:
             for id in self.schedule[name]:
+                self.timers.remove(id)
                 await self.AD.state.remove_entity("admin", "scheduler_callback.{}".format(id))
             del self.schedule[name]
 
@@ -466,22 +551,7 @@ class Scheduler:
     #
 
     def get_next_entries(self):
-        next_exec = datetime.datetime.now(pytz.utc).replace(year=datetime.MAXYEAR, month=12, day=31)
-        for name in self.schedule.keys():
-            for entry in self.schedule[name].keys():
-                if self.schedule[name][entry]["timestamp"] < next_exec:
-                    next_exec = self.schedule[name][entry]["timestamp"]
-
-        next_entries = []
-
-        for name in self.schedule.keys():
-            for entry in self.schedule[name].keys():
-                if self.schedule[name][entry]["timestamp"] == next_exec:
-                    next_entries.append(
-                        {"name": name, "uuid": entry, "timestamp": self.schedule[name][entry]["timestamp"]}
-                    )
-
-        return next_entries
+        return self.timers.next_entries()
 
     def get_next_dst_offset(self, base, limit):
         #
@@ -521,7 +591,7 @@ class Scheduler:
         else:
             self.logger.info("Scheduler running in realtime")
 
-        next_entries = []
+        next_timestamp = None
         result = False
         idle_time = 1
         delay = 0
@@ -544,7 +614,7 @@ class Scheduler:
                         delta = (now - self.last_fired).total_seconds() * self.AD.timewarp
 
                     else:
-                        if len(next_entries) > 0:
+                        if next_timestamp is not None:
                             # Time is progressing infinitely fast and it's already time for our next callback
                             delta = delay
                         else:
@@ -569,41 +639,31 @@ class Scheduler:
                     #
                     # DST began or ended, lets prove we noticed
                     self.logger.info("Daylight Savings Time transition detected")
-                    #
-                    # Re calculate next entries
-                    #
-                    next_entries = self.get_next_entries()
 
-                elif self.timer_resetted is True:
-                    # a timer was resetted, so need to recalculate next entries
-                    next_entries = self.get_next_entries()
-                    self.timer_resetted = False
+                # The timer heap is always up to date, so a reset timer needs no extra work here
+                self.timer_resetted = False
 
                 old_dst_offset = dst_offset
                 #
                 # OK, lets fire the entries
                 #
-                for entry in next_entries:
-                    # Check timestamps as we might have been interrupted to add a callback
-                    if entry["timestamp"] <= self.now:
-                        name = entry["name"]
-                        uuid_ = entry["uuid"]
-                        # Things may have changed since we last woke up
-                        # so check our callbacks are still valid before we execute them
-                        if name in self.schedule and uuid_ in self.schedule[name]:
-                            args = self.schedule[name][uuid_]
-                            self.logger.debug("Executing: %s", args)
-                            await self.exec_schedule(name, args, uuid_)
-                    else:
-                        break
+                for entry in self.timers.pop_due(self.now):
+                    name = entry["name"]
+                    uuid_ = entry["uuid"]
+                    # Things may have changed since the entry was taken off the heap
+                    # so check our callbacks are still valid before we execute them
+                    if name in self.schedule and uuid_ in self.schedule[name]:
+                        args = self.schedule[name][uuid_]
+                        self.logger.debug("Executing: %s", args)
+                        await self.exec_schedule(name, args, uuid_)
                 for k, v in list(self.schedule.items()):
                     if v == {}:
                         del self.schedule[k]
 
-                next_entries = self.get_next_entries()
-                self.logger.debug("Next entries: %s", next_entries)
-                if len(next_entries) > 0:
-                    delay = (next_entries[0]["timestamp"] - self.now).total_seconds()
+                next_timestamp = self.timers.next_timestamp()
+                self.logger.debug("Next event timestamp: %s", next_timestamp)
+                if next_timestamp is not None:
+                    delay = (next_timestamp - self.now).total_seconds()
                 else:
                     # Nothing to do, lets wait for a while, we will get woken up if anything new comes along
                     delay = idle_time
@@ -770,16 +830,35 @@ class Scheduler:
         return self.make_naive(await self.get_now())
 
     async def now_is_between(self, start_time_str, end_time_str, name=None, now=None):
-        start_time = (await self._parse_time(start_time_str, name, today=True, days_offset=0))["datetime"]
-        end_time = (await self._parse_time(end_time_str, name, today=True, days_offset=0))["datetime"]
+        window = await self.get_time_window(start_time_str, end_time_str, name)
         if now is not None:
             now = (await self._parse_time(now, name))["datetime"]
         else:
             now = (await self.get_now()).astimezone(self.AD.tz)
 
-        # self.logger.info(
-        #    "\n" + "-" * 80 + f"\nInitial\nstart = {start_time}\nnow   = {now}\nend   = {end_time}\n" + "-" * 80
-        # )
+        return self.in_time_window(window, now)
+
+    async def get_time_window(self, start_time_str, end_time_str, name=None):
+        """Parse the boundaries needed to decide if a time is between start and end today.
+
+        The result only depends on the current date (and the sun times for it) so callers can hold on to it for
+        the rest of the day rather than parsing the time strings again.
+        """
+        start_time = (await self._parse_time(start_time_str, name, today=True, days_offset=0))["datetime"]
+        end_time = (await self._parse_time(end_time_str, name, today=True, days_offset=0))["datetime"]
+        window = {"start": start_time, "end": end_time}
+        if end_time < start_time:
+            # Start and end time backwards - spans midnight, so we also need tomorrow's end and yesterday's start
+            window["next_end"] = (await self._parse_time(end_time_str, name, today=True, days_offset=1))["datetime"]
+            window["prev_start"] = (await self._parse_time(start_time_str, name, today=True, days_offset=-1))[
+                "datetime"
+            ]
+        return window
+
+    @staticmethod
+    def in_time_window(window, now):
+        start_time = window["start"]
+        end_time = window["end"]
 
         # Comparisons
         if end_time < start_time:
@@ -787,21 +866,15 @@ class Scheduler:
             # Spans midnight
             # Lets start by assuming end_time is wrong and should be tomorrow
             # This will be true if we are currently after start_time
-            end_time = (await self._parse_time(end_time_str, name, today=True, days_offset=1))["datetime"]
-            # self.logger.info(
-            #    f"\nMidnight transition detected\nstart = {start_time}\nnow   = {now}\nend   = {end_time}\n" + "-" * 80
-            # )
+            end_time = window["next_end"]
             if now < start_time and now < end_time:
                 # Well, it's complicated -
                 # We crossed into a new day and things changed.
                 # Now all times have shifted relative to the new day, so we need to look at it differently
                 # If both times are now in the future, we now actually want to set start time back a day and keep end_time as today
-                start_time = (await self._parse_time(start_time_str, name, today=True, days_offset=-1))["datetime"]
-                end_time = (await self._parse_time(end_time_str, name, today=True, days_offset=0))["datetime"]
-                # self.logger.info(f"\nReverse\nstart = {start_time}\nnow   = {now}\nend   = {end_time}\n" + "=" * 80)
+                start_time = window["prev_start"]
+                end_time = window["end"]
 
-        # self.logger.info(f"\nFinal\nstart = {start_time}\nnow   = {now}\nend   = {end_time}\n" + "-" * 80)
-        # self.logger.info(f"Final decision: {start_time <= now <= end_time}\n" + "=" * 80)
         return start_time <= now <= end_time
 
     async def sunset(self, aware, today=False, days_offset=0):
@@ -989,7 +1062,15 @@ class Scheduler:
         kwargs_copy = kwargs.copy()
         return utils._sanitize_kwargs(
             kwargs_copy,
-            ["interval", "constrain_days", "constrain_input_boolean", "_pin_app", "_pin_thread", "__silent"]
+            [
+                "interval",
+                "constrain_days",
+                "constrain_input_boolean",
+                "_pin_app",
+                "_pin_thread",
+                "__silent",
+                "callback_priority",
+            ]
             + app.list_constraints(),
         )
 
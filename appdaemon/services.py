@@ -148,7 +148,10 @@ class Services:
 
         return result
 
-    async def call_service(self, namespace: str, domain: str, service: str, data: dict) -> Any:
+    async def call_service(
+        self, namespace: str, domain: str, service: str, data: dict, raise_errors: bool = False
+    ) -> Any:
+        """Used to call a service, with raise_errors a failed service raises rather than returning None"""
         self.logger.debug(
             "call_service: namespace=%s domain=%s service=%s data=%s",
             namespace,
@@ -224,16 +227,19 @@ class Services:
                 else:
                     coro = utils.run_in_executor(self, funcref, ns, domain, service, data)
 
-            if return_result is True:
-                return await self.run_service(coro)
+        # The lookup is done, so don't hold the lock while the service runs
+        if return_result is True:
+            if raise_errors is True:
+                return await coro
+            return await self.run_service(coro)
 
-            elif callback is not None and name is not None:
-                # results expected and it must belong to an app
-                app_object = await self.AD.app_management.get_app(name)
-                app_object.create_task(self.run_service(coro), callback=callback)
+        elif callback is not None and name is not None:
+            # results expected and it must belong to an app
+            app_object = await self.AD.app_management.get_app(name)
+            app_object.create_task(self.run_service(coro), callback=callback)
 
-            else:
-                asyncio.create_task(self.run_service(coro))
+        else:
+            asyncio.create_task(self.run_service(coro))
 
     async def run_service(self, coro: Awaitable) -> Any:
         """Used to process a service call"""
@@ -1,6 +1,8 @@
 import uuid
 import traceback
 import os
+import time
+from collections import deque
 from copy import copy, deepcopy
 import datetime
 
@@ -16,6 +18,15 @@ class State:
         self.logger = ad.logging.get_child("_state")
         self.app_added_namespaces = []
 
+        #
+        # Each namespace has a sequence number that goes up by one for every change to it, and a log of the most
+        # recent changes as (sequence, entity_id) so a client that knows an earlier sequence can be sent just what has
+        # changed since. Sequences start from the time the namespace was first used, in microseconds, so numbers from
+        # before a restart aren't handed out again.
+        #
+        self.versions = {}
+        self.change_log = {}
+
         # Initialize User Defined Namespaces
 
         nspath = os.path.join(self.AD.config_dir, "namespaces")
@@ -54,6 +65,51 @@ class State:
 
         return nspath_file
 
+    def _changed(self, namespace, entity_id=None):
+        # Without an entity_id the whole namespace may have changed, so the log can't be used to catch up from before
+        if namespace not in self.versions:
+            self.versions[namespace] = time.time_ns() // 1000
+            self.change_log[namespace] = deque(maxlen=self.AD.state_change_log)
+        self.versions[namespace] += 1
+        if entity_id is None:
+            self.change_log[namespace].clear()
+        else:
+            self.change_log[namespace].append((self.versions[namespace], entity_id))
+
+    def get_version(self, namespace):
+        """Returns the current sequence number of a namespace, or ``None`` if there is no such namespace."""
+        if namespace not in self.state:
+            return None
+        if namespace not in self.versions:
+            self._changed(namespace)
+        return self.versions[namespace]
+
+    def get_changes(self, namespace, since):
+        """Returns the entities in a namespace that have changed since the given sequence number.
+
+        The result has the current ``version`` of the namespace and the ``state`` of each changed entity, or ``None``
+        for entities that have been removed. If the changes aren't all in the change log any more, or ``since`` didn't
+        come from this namespace, the whole namespace is returned instead with ``full`` set to ``True``. Returns
+        ``None`` if there is no such namespace.
+        """
+        version = self.get_version(namespace)
+        if version is None:
+            return None
+
+        log = self.change_log[namespace]
+        if since == version:
+            return {"version": version, "full": False, "state": {}}
+        if since > version or (log[0][0] if log else version + 1) > since + 1:
+            return {"version": version, "full": True, "state": dict(self.state[namespace])}
+
+        state = {}
+        for seq, entity_id in reversed(log):
+            if seq <= since:
+                break
+            if entity_id not in state:
+                state[entity_id] = self.state[namespace].get(entity_id)
+        return {"version": version, "full": False, "state": state}
+
     async def namespace_exists(self, namespace):
         if namespace in self.state:
             return True
@@ -66,8 +122,12 @@ class State:
         result = None
         if namespace in self.app_added_namespaces:
             result = self.state.pop(namespace)
+            if isinstance(result, utils.SQLitePersistentDict):
+                await utils.run_in_executor(self, result.close)
             nspath_file = await utils.run_in_executor(self, self.remove_persistent_namespace, namespace)
             self.app_added_namespaces.remove(namespace)
+            self.versions.pop(namespace, None)
+            self.change_log.pop(namespace, None)
 
             self.logger.warning("Namespace %s, has ben removed", namespace)
 
@@ -92,15 +152,19 @@ class State:
         """Used to add a database file for a created namespace"""
 
         try:
-            if namespace in self.state and isinstance(self.state[namespace], utils.PersistentDict):
+            if namespace in self.state and utils.is_persistent_dict(self.state[namespace]):
                 self.logger.info("Persistent Namespace '%s' already initialized", namespace)
                 return
 
             nspath = os.path.join(self.AD.config_dir, "namespaces")
             safe = bool(writeback == "safe")
-            nspath_file = os.path.join(nspath, f"{namespace}.db")
 
-            self.state[namespace] = utils.PersistentDict(nspath_file, safe)
+            if self.AD.namespaces.get(namespace, {}).get("backend", "shelve") == "sqlite":
+                nspath_file = os.path.join(nspath, f"{namespace}.sqlite")
+                self.state[namespace] = utils.SQLitePersistentDict(nspath_file, safe)
+            else:
+                nspath_file = os.path.join(nspath, f"{namespace}.db")
+                self.state[namespace] = utils.PersistentDict(nspath_file, safe)
 
             self.logger.info("Persistent Namespace '%s' initialized", namespace)
 
@@ -124,6 +188,12 @@ class State:
             if os.path.isfile(nspath_file) is True:  # if the file exists remove it
                 os.remove(nspath_file)
 
+            # SQLite database and its journal files
+            for suffix in (".sqlite", ".sqlite-wal", ".sqlite-shm"):
+                sqlite_file = os.path.join(nspath, f"{namespace}{suffix}")
+                if os.path.isfile(sqlite_file) is True:
+                    os.remove(sqlite_file)
+
         except Exception:
             self.logger.warning("-" * 60)
             self.logger.warning("Unexpected error in namespace removal")
@@ -152,6 +222,9 @@ class State:
         self.logger.debug("terminate() called for state")
         self.logger.info("Saving all namespaces")
         self.save_all_namespaces()
+        for ns in self.state:
+            if isinstance(self.state[ns], utils.SQLitePersistentDict):
+                self.state[ns].close()
 
     async def add_state_callback(self, name, namespace, entity, cb, kwargs):  # noqa: C901
         if self.AD.threading.validate_pin(name, kwargs) is True:
@@ -186,6 +259,7 @@ class State:
                     "pin_thread": pin_thread,
                     "kwargs": kwargs,
                 }
+                self.AD.callbacks.index_state_callback(handle, self.AD.callbacks.callbacks[name][handle])
 
             #
             # If we have a timeout parameter, add a scheduler entry to delete the callback later
@@ -260,21 +334,20 @@ class State:
                     if __duration >= 1:  # it only stores it when needed
                         kwargs["__duration"] = __scheduler_handle
 
-            await self.AD.state.add_entity(
-                "admin",
-                "state_callback.{}".format(handle),
-                "active",
-                {
-                    "app": name,
-                    "listened_entity": entity,
-                    "function": cb.__name__,
-                    "pinned": pin_app,
-                    "pinned_thread": pin_thread,
-                    "fired": 0,
-                    "executed": 0,
-                    "kwargs": kwargs,
-                },
-            )
+            attributes = {
+                "app": name,
+                "listened_entity": entity,
+                "function": cb.__name__,
+                "pinned": pin_app,
+                "pinned_thread": pin_thread,
+                "fired": 0,
+                "executed": 0,
+                "kwargs": kwargs,
+            }
+            if kwargs.get("coalesce") is True or "min_interval" in kwargs:
+                attributes["superseded"] = 0
+
+            await self.AD.state.add_entity("admin", "state_callback.{}".format(handle), "active", attributes)
 
             return handle
         else:
@@ -284,7 +357,10 @@ class State:
         executed = False
         async with self.AD.callbacks.callbacks_lock:
             if name in self.AD.callbacks.callbacks and handle in self.AD.callbacks.callbacks[name]:
-                del self.AD.callbacks.callbacks[name][handle]
+                callback = self.AD.callbacks.callbacks[name].pop(handle)
+                self.AD.callbacks.unindex_state_callback(handle, callback)
+                self.AD.threading.forget_coalesced(handle)
+                self.AD.threading.forget_constraints(name, handle)
                 await self.AD.state.remove_entity("admin", "state_callback.{}".format(handle))
                 executed = True
 
@@ -315,88 +391,41 @@ class State:
         data = state["data"]
         entity_id = data["entity_id"]
         self.logger.debug(data)
-        device, entity = entity_id.split(".")
 
-        # Process state callbacks
+        # Process state callbacks - the index only hands back listeners for this namespace and entity
 
         removes = []
         async with self.AD.callbacks.callbacks_lock:
-            for name in self.AD.callbacks.callbacks.keys():
-                for uuid_ in self.AD.callbacks.callbacks[name]:
-                    callback = self.AD.callbacks.callbacks[name][uuid_]
-                    if callback["type"] == "state" and (
-                        callback["namespace"] == namespace or callback["namespace"] == "global" or namespace == "global"
-                    ):
-                        cdevice = None
-                        centity = None
-                        if callback["entity"] is not None:
-                            if "." not in callback["entity"]:
-                                cdevice = callback["entity"]
-                                centity = None
-                            else:
-                                cdevice, centity = callback["entity"].split(".")
-                        if callback["kwargs"].get("attribute") is None:
-                            cattribute = "state"
-                        else:
-                            cattribute = callback["kwargs"].get("attribute")
-
-                        cold = callback["kwargs"].get("old")
-                        cnew = callback["kwargs"].get("new")
-
-                        executed = False
-                        if cdevice is None:
-                            executed = await self.AD.threading.check_and_dispatch_state(
-                                name,
-                                callback["function"],
-                                entity_id,
-                                cattribute,
-                                data["new_state"],
-                                data["old_state"],
-                                cold,
-                                cnew,
-                                callback["kwargs"],
-                                uuid_,
-                                callback["pin_app"],
-                                callback["pin_thread"],
-                            )
-                        elif centity is None:
-                            if device == cdevice:
-                                executed = await self.AD.threading.check_and_dispatch_state(
-                                    name,
-                                    callback["function"],
-                                    entity_id,
-                                    cattribute,
-                                    data["new_state"],
-                                    data["old_state"],
-                                    cold,
-                                    cnew,
-                                    callback["kwargs"],
-                                    uuid_,
-                                    callback["pin_app"],
-                                    callback["pin_thread"],
-                                )
-
-                        elif device == cdevice and entity == centity:
-                            executed = await self.AD.threading.check_and_dispatch_state(
-                                name,
-                                callback["function"],
-                                entity_id,
-                                cattribute,
-                                data["new_state"],
-                                data["old_state"],
-                                cold,
-                                cnew,
-                                callback["kwargs"],
-                                uuid_,
-                                callback["pin_app"],
-                                callback["pin_thread"],
-                            )
-
-                        # Remove the callback if appropriate
-                        if executed is True:
-                            remove = callback["kwargs"].get("oneshot", False)
-                            if remove is True:
-                                removes.append({"name": callback["name"], "uuid": uuid_})
+            for uuid_, callback in self.AD.callbacks.get_state_callbacks(namespace, entity_id):
+                name = callback["name"]
+                if callback["kwargs"].get("attribute") is None:
+                    cattribute = "state"
+                else:
+                    cattribute = callback["kwargs"].get("attribute")
+
+                cold = callback["kwargs"].get("old")
+                cnew = callback["kwargs"].get("new")
+
+                executed = await self.AD.threading.check_and_dispatch_state(
+                    name,
+                    callback["function"],
+                    entity_id,
+                    cattribute,
+                    data["new_state"],
+                    data["old_state"],
+                    cold,
+                    cnew,
+                    callback["kwargs"],
+                    uuid_,
+                    callback["pin_app"],
+                    callback["pin_thread"],
+                )
+
+                # Remove the callback if appropriate
+                if executed is True:
+                    remove = callback["kwargs"].get("oneshot", False)
+                    if remove is True:
+                        removes.append({"name": callback["name"], "uuid": uuid_})
 
         for remove in removes:
             await self.cancel_state_callback(remove["uuid"], remove["name"])
@@ -428,6 +457,24 @@ class State:
             self.logger.warning("Unknown namespace: %s requested by %s", namespace, name)
             return None
 
+    def get_entities(self, namespace, entity_ids, attributes=None):
+        """Returns the states of a list of entities in a namespace.
+
+        If a list of attributes is given, only those attributes are included in each state. Entities that don't exist
+        are returned as ``None``.
+        """
+        if attributes is not None:
+            attributes = set(attributes)
+
+        states = {}
+        for entity_id in entity_ids:
+            state = self.state[namespace].get(entity_id)
+            if state is not None and attributes is not None:
+                state = dict(state)
+                state["attributes"] = {k: v for k, v in state.get("attributes", {}).items() if k in attributes}
+            states[entity_id] = state
+        return states
+
     async def remove_entity(self, namespace, entity):
         """Removes an entity.
 
@@ -458,6 +505,7 @@ class State:
 
         if entity_id in self.state[namespace]:
             self.state[namespace].pop(entity_id)
+            self._changed(namespace, entity_id)
             data = {"event_type": "__AD_ENTITY_REMOVED", "data": {"entity_id": entity_id}}
             self.AD.loop.create_task(self.AD.events.process_event(namespace, data))
 
@@ -476,7 +524,9 @@ class State:
             "attributes": attrs,
         }
 
+        state = utils.freeze(state)
         self.state[namespace][entity] = state
+        self._changed(namespace, entity)
 
         data = {
             "event_type": "__AD_ENTITY_ADDED",
@@ -497,7 +547,8 @@ class State:
     async def get_state(self, name, namespace, entity_id=None, attribute=None, default=None, copy=True):
         self.logger.debug("get_state: %s.%s %s %s", entity_id, attribute, default, copy)
 
-        maybe_copy = lambda data: deepcopy(data) if copy else data  # noqa: E731
+        # Stored state is read only, so a copy is only needed if the caller wants something it can change
+        maybe_copy = lambda data: utils.thaw(data) if copy else data  # noqa: E731
 
         if entity_id is not None and "." in entity_id:
             if not await self.entity_exists(namespace, entity_id):
@@ -529,8 +580,10 @@ class State:
     def parse_state(self, entity, namespace, **kwargs):
         self.logger.debug("parse_state: %s, %s", entity, kwargs)
 
+        # Stored state is read only - build a new state, sharing any unchanged values with the old one
         if entity in self.state[namespace]:
-            new_state = self.state[namespace][entity]
+            new_state = dict(self.state[namespace][entity])
+            new_state["attributes"] = dict(new_state.get("attributes", {}))
         else:
             # Its a new state entry
             new_state = {"attributes": {}}
@@ -569,7 +622,11 @@ class State:
         # Set state without any checks or triggering amy evernts, and only if the entity exists
         #
         if namespace in self.state and entity_id in self.state[namespace]:
-            self.state[namespace][entity_id] = state
+            state = utils.freeze(state)
+            # Local changes are stored by set_state() before their event gets here
+            if self.state[namespace][entity_id] is not state:
+                self.state[namespace][entity_id] = state
+                self._changed(namespace, entity_id)
 
     async def state_services(self, namespace, domain, service, kwargs):
         self.logger.debug("state_services: %s, %s, %s, %s", namespace, domain, service, kwargs)
@@ -616,11 +673,13 @@ class State:
     async def set_state(self, name, namespace, entity, **kwargs):
         self.logger.debug("set_state(): %s, %s", entity, kwargs)
         if entity in self.state[namespace]:
-            old_state = deepcopy(self.state[namespace][entity])
+            # No need to copy, stored state is never changed in place
+            old_state = self.state[namespace][entity]
         else:
-            old_state = {"state": None, "attributes": {}}
+            old_state = utils.freeze({"state": None, "attributes": {}})
         new_state = self.parse_state(entity, namespace, **kwargs)
         new_state["last_changed"] = utils.dt_to_str((await self.AD.sched.get_now()).replace(microsecond=0), self.AD.tz)
+        new_state = utils.freeze(new_state)
         self.logger.debug("Old state: %s", old_state)
         self.logger.debug("New state: %s", new_state)
         if not await self.AD.state.entity_exists(namespace, entity):
@@ -641,10 +700,12 @@ class State:
             if result is not None:
                 if "entity_id" in result:
                     result.pop("entity_id")
-                self.state[namespace][entity] = self.parse_state(entity, namespace, **result)
+                self.state[namespace][entity] = utils.freeze(self.parse_state(entity, namespace, **result))
+                self._changed(namespace, entity)
         else:
             # Set the state locally
             self.state[namespace][entity] = new_state
+            self._changed(namespace, entity)
             # Fire the event locally
             self.logger.debug("sending event locally")
             data = {
@@ -661,38 +722,91 @@ class State:
         return new_state
 
     def set_namespace_state(self, namespace, state, persist=False):
+        state = {entity_id: utils.freeze(entity_state) for entity_id, entity_state in state.items()}
         if persist is True:
             self.add_persistent_namespace(namespace, "safe")
             self.state[namespace].update(state)
         else:
             # first in case it had been created before, it should be deleted
+            if isinstance(self.state.get(namespace), utils.SQLitePersistentDict):
+                self.state[namespace].close()
             self.remove_persistent_namespace(namespace)
             self.state[namespace] = state
+        self._changed(namespace)
 
     def update_namespace_state(self, namespace, state):
         if isinstance(namespace, list):  # if its a list, meaning multiple namespaces to be updated
             for ns in namespace:
                 if state.get(ns) is not None:
-                    self.state[ns].update(state[ns])
+                    self.state[ns].update({entity_id: utils.freeze(s) for entity_id, s in state[ns].items()})
+                    self._changed(ns)
         else:
-            self.state[namespace].update(state)
+            self.state[namespace].update({entity_id: utils.freeze(s) for entity_id, s in state.items()})
+            self._changed(namespace)
+
+    async def refresh_namespace_state(self, namespace, state):
+        """Brings a namespace in line with a complete state snapshot, only touching entities that differ.
+
+        Each difference is processed as a ``state_changed`` event, so callbacks see changes that were missed while
+        events weren't arriving. Entities missing from the snapshot are left alone, as with a full update.
+
+        Args:
+            namespace: Namespace, or list of namespaces, the snapshot is for.
+            state (dict): Complete state from the plugin, keyed by namespace if ``namespace`` is a list.
+
+        Returns:
+            A dictionary with the number of entities checked, changed and added.
+
+        """
+        if isinstance(namespace, list):
+            snapshots = [(ns, state[ns]) for ns in namespace if state.get(ns) is not None]
+        else:
+            snapshots = [(namespace, state)]
+
+        counts = {"entities": 0, "changed": 0, "added": 0}
+        for ns, snapshot in snapshots:
+            for entity_id, new_state in snapshot.items():
+                counts["entities"] += 1
+                old_state = self.state[ns].get(entity_id)
+                if old_state == new_state:
+                    continue
+
+                if old_state is None:
+                    # set_state_simple() only updates entities that are already there
+                    new_state = utils.freeze(new_state)
+                    self.state[ns][entity_id] = new_state
+                    self._changed(ns, entity_id)
+                    counts["added"] += 1
+                else:
+                    counts["changed"] += 1
+
+                await self.AD.events.process_event(
+                    ns,
+                    {
+                        "event_type": "state_changed",
+                        "data": {"entity_id": entity_id, "new_state": new_state, "old_state": old_state},
+                    },
+                )
+
+        return counts
 
     async def save_namespace(self, namespace):
-        if isinstance(self.state[namespace], utils.PersistentDict):
-            self.state[namespace].sync()
+        if utils.is_persistent_dict(self.state[namespace]):
+            await utils.run_in_executor(self, self.state[namespace].sync)
         else:
             self.logger.warning("Namespace: %s cannot be saved", namespace)
         return None
 
     def save_all_namespaces(self):
         for ns in self.state:
-            if isinstance(self.state[ns], utils.PersistentDict):
+            if utils.is_persistent_dict(self.state[ns]):
                 self.state[ns].sync()
 
-    def save_hybrid_namespaces(self):
+    async def save_hybrid_namespaces(self):
+        # Saved in the executor so the loop isn't held up while the namespaces are written
         for ns in self.AD.namespaces:
             if self.AD.namespaces[ns].get("writeback") == "hybrid":
-                self.state[ns].sync()
+                await utils.run_in_executor(self, self.state[ns].sync)
 
     #
     # Utilities
@@ -718,6 +832,9 @@ class State:
                 "__delay",
                 "__silent",
                 "attribute",
+                "callback_priority",
+                "coalesce",
+                "min_interval",
             ]
             + app.list_constraints(),
         )
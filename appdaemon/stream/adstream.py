@@ -3,6 +3,9 @@ import bcrypt
 import uuid
 import threading
 import asyncio
+import time
+from collections import deque
+from functools import partial
 
 from appdaemon.appdaemon import AppDaemon
 import appdaemon.utils as utils
@@ -11,6 +14,190 @@ from appdaemon.stream.ws_handler import WSHandler
 from appdaemon.stream.sockjs_handler import SockJSHandler
 from appdaemon.exceptions import RequestHandlerException
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ENCODINGS = ("json", "msgpack")
+
+
+def encode(data, encoding):
+    if encoding == "msgpack":
+        return msgpack.packb(data, default=str)
+    return utils.convert_json(data)
+
+
+def make_frame(payload, response_id, response_type, delta, encoding):
+    """Wrap an already encoded event in a stream message for one subscription"""
+    if encoding == "msgpack":
+        # A msgpack map is a header giving the number of entries followed by each key and value in turn
+        parts = [
+            bytes([0x80 | (4 if delta else 3)]),
+            msgpack.packb("data"),
+            payload,
+            msgpack.packb("response_id"),
+            msgpack.packb(response_id, default=str),
+            msgpack.packb("response_type"),
+            msgpack.packb(response_type),
+        ]
+        if delta:
+            parts += [msgpack.packb("delta"), msgpack.packb(True)]
+        return b"".join(parts)
+
+    return '{{"data": {}, "response_id": {}, "response_type": "{}"{}}}'.format(
+        payload, utils.convert_json(response_id), response_type, ', "delta": true' if delta else ""
+    )
+
+
+def make_batch(namespace, entries, encoding):
+    """Build the data of an admin_batch message from entries that are already encoded"""
+    if encoding == "msgpack":
+        return b"".join(
+            [
+                bytes([0x82]),
+                msgpack.packb("namespace"),
+                msgpack.packb(namespace),
+                msgpack.packb("states"),
+                msgpack.Packer().pack_array_header(len(entries)),
+            ]
+            + entries
+        )
+
+    return '{{"namespace": {}, "states": [{}]}}'.format(utils.convert_json(namespace), ", ".join(entries))
+
+
+def state_delta(data):
+    """Return a copy of a state_changed event with only what changed between the old and new states.
+
+    ``new_state`` only has the values and attributes that are different from ``old_state``, attributes that have gone
+    are listed in ``removed_attributes``, and ``old_state`` is left out.
+    """
+    old_state = data["data"]["old_state"]
+    new_state = data["data"]["new_state"]
+
+    changed = {k: v for k, v in new_state.items() if k != "attributes" and old_state.get(k) != v}
+    old_attributes = old_state.get("attributes", {})
+    new_attributes = new_state.get("attributes", {})
+    attributes = {k: v for k, v in new_attributes.items() if k not in old_attributes or old_attributes[k] != v}
+    if attributes:
+        changed["attributes"] = attributes
+
+    delta = {k: v for k, v in data.items() if k != "data"}
+    delta["data"] = {
+        "entity_id": data["data"]["entity_id"],
+        "new_state": changed,
+        "removed_attributes": [k for k in old_attributes if k not in new_attributes],
+    }
+    return delta
+
+
+class PatternIndex:
+    """Maps patterns to values, where a pattern ending in ``*`` matches any key that starts with the rest of it.
+
+    Exact patterns are a dictionary lookup, and wildcard patterns are kept in a trie so matching a key only costs a
+    walk down its characters however many patterns there are.
+    """
+
+    def __init__(self):
+        self.exact = {}
+        # Each trie node is [children, value]
+        self.root = [{}, None]
+
+    def get(self, pattern):
+        if not pattern.endswith("*"):
+            return self.exact.get(pattern)
+
+        node = self.root
+        for char in pattern[:-1]:
+            node = node[0].get(char)
+            if node is None:
+                return None
+        return node[1]
+
+    def set(self, pattern, value):
+        if not pattern.endswith("*"):
+            self.exact[pattern] = value
+            return
+
+        node = self.root
+        for char in pattern[:-1]:
+            node = node[0].setdefault(char, [{}, None])
+        node[1] = value
+
+    def remove(self, pattern):
+        if not pattern.endswith("*"):
+            self.exact.pop(pattern, None)
+            return
+
+        path = [self.root]
+        for char in pattern[:-1]:
+            node = path[-1][0].get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1][1] = None
+
+        # Prune the branch back to the last node still in use
+        for char, node, parent in zip(reversed(pattern[:-1]), reversed(path[1:]), reversed(path[:-1])):
+            if node[0] or node[1] is not None:
+                break
+            del parent[0][char]
+
+    def match(self, key):
+        """Yield the values of every pattern that matches key"""
+        if key in self.exact:
+            yield self.exact[key]
+
+        node = self.root
+        if node[1] is not None:
+            yield node[1]
+        for char in key:
+            node = node[0].get(char)
+            if node is None:
+                return
+            if node[1] is not None:
+                yield node[1]
+
+
+class SubscriptionIndex:
+    """Stream subscriptions from every client, indexed on namespace pattern then entity or event pattern"""
+
+    def __init__(self):
+        self.namespaces = PatternIndex()
+
+    def add(self, namespace, key, sub_id, sub):
+        keys = self.namespaces.get(namespace)
+        if keys is None:
+            keys = PatternIndex()
+            self.namespaces.set(namespace, keys)
+        subs = keys.get(key)
+        if subs is None:
+            subs = {}
+            keys.set(key, subs)
+        subs[sub_id] = sub
+
+    def remove(self, namespace, key, sub_id):
+        keys = self.namespaces.get(namespace)
+        if keys is None:
+            return
+        subs = keys.get(key)
+        if subs is None:
+            return
+        subs.pop(sub_id, None)
+        if not subs:
+            keys.remove(key)
+            if not keys.exact and not keys.root[0] and keys.root[1] is None:
+                self.namespaces.remove(namespace)
+
+    def match(self, namespace, key):
+        """Return the subscriptions matching a namespace and entity or event"""
+        matches = []
+        for keys in self.namespaces.match(namespace):
+            for subs in keys.match(key):
+                matches.extend(subs.values())
+        return matches
+
 
 class ADStream:
     def __init__(self, ad: AppDaemon, app, transport):
@@ -22,6 +209,15 @@ class ADStream:
         self.handlers = {}
         self.handlers_lock = threading.RLock()
 
+        # Subscriptions from all clients. Each one is numbered as it is added so a client that has more than one
+        # matching subscription gets the event once, for the first of them, as it always has.
+        self.subscriptions = {"state": SubscriptionIndex(), "event": SubscriptionIndex()}
+        self.subscription_count = 0
+
+        # Changes to the admin namespace waiting to be sent in the next admin_batch message when stats_update is
+        # "batch", by entity, with the state the entity had before the first of them
+        self.admin_batch = {}
+
         if self.transport == "ws":
             self.stream_handler = WSHandler(self, app, "/stream", self.AD)
         elif self.transport == "socketio":
@@ -55,17 +251,183 @@ class ADStream:
 
     async def on_disconnect(self, handle):
         with self.handlers_lock:
-            del self.handlers[handle]
+            handler = self.handlers.pop(handle)
+            for type in handler.subscriptions:
+                for sub_handle in list(handler.subscriptions[type]):
+                    self.unsubscribe(handler, type, sub_handle)
+
+    async def update_admin_stats(self):
+        """Write each client's outbound queue stats to the admin namespace, and disconnect any that have stalled"""
+        with self.handlers_lock:
+            handlers = list(self.handlers.values())
+
+        for handler in handlers:
+            await handler._update_admin_stats()
+
+    def batch_admin_update(self, data):
+        entity_id = data["data"]["entity_id"]
+        if entity_id in self.admin_batch:
+            self.admin_batch[entity_id]["new_state"] = data["data"]["new_state"]
+        else:
+            self.admin_batch[entity_id] = {
+                "entity_id": entity_id,
+                "old_state": data["data"]["old_state"],
+                "new_state": data["data"]["new_state"],
+            }
+
+    def discard_admin_update(self, entity_id):
+        # The entity has gone, so sending its last change afterwards would bring it back
+        self.admin_batch.pop(entity_id, None)
+
+    async def flush_admin_batch(self):
+        """Send the admin namespace changes made since the last call to each client that is listening for them.
+
+        Each client gets one admin_batch message per subscription, with the latest state of each entity that has
+        changed. Entities that have changed back to how they were are left out.
+        """
+        if not self.admin_batch:
+            return
+
+        changes = {
+            entity_id: change
+            for entity_id, change in self.admin_batch.items()
+            if change["new_state"] != change["old_state"]
+        }
+        self.admin_batch = {}
+
+        try:
+            # The entities for each of a client's subscriptions, using the first matching subscription as for
+            # single changes
+            batches = {}
+            with self.handlers_lock:
+                for entity_id in changes:
+                    first = {}
+                    for sub in self.subscriptions["state"].match("admin", entity_id):
+                        handler = sub["handler"]
+                        if handler.authed is True and (
+                            handler.handle not in first or sub["seq"] < first[handler.handle]["seq"]
+                        ):
+                            first[handler.handle] = sub
+                    for sub in first.values():
+                        key = (sub["handler"].handle, sub["response_id"])
+                        if key not in batches:
+                            batches[key] = (sub["handler"], sub["response_id"], [])
+                        batches[key][2].append(entity_id)
+
+            # Each entity is serialized once for each encoding and form in use
+            entries = {}
+
+            def get_entry(entity_id, encoding, delta):
+                if (entity_id, encoding, delta) not in entries:
+                    change = changes[entity_id]
+                    if delta is True:
+                        entry = state_delta({"data": change})["data"]
+                        entry["delta"] = True
+                    else:
+                        entry = {"entity_id": entity_id, "new_state": change["new_state"]}
+                    entries[(entity_id, encoding, delta)] = encode(entry, encoding)
+                return entries[(entity_id, encoding, delta)]
+
+            for handler, response_id, entity_ids in batches.values():
+                batch = []
+                for entity_id in entity_ids:
+                    coalesce_key = ("admin", entity_id, response_id)
+                    delta = (
+                        handler.delta is True
+                        and coalesce_key in handler.delta_keys
+                        and bool(changes[entity_id]["old_state"])
+                        and bool(changes[entity_id]["new_state"])
+                    )
+                    handler.delta_keys.add(coalesce_key)
+                    batch.append(get_entry(entity_id, handler.encoding, delta))
+                payload = make_batch("admin", batch, handler.encoding)
+                handler._queue(make_frame(payload, response_id, "admin_batch", False, handler.encoding))
+
+        except Exception:
+            self.logger.warning("-" * 60)
+            self.logger.warning("Unexpected error during 'flush_admin_batch()'")
+            self.logger.warning("-" * 60)
+            self.logger.warning(traceback.format_exc())
+            self.logger.warning("-" * 60)
+
+    def subscribe(self, handler, type, sub_handle, namespace, key, response_id):
+        with self.handlers_lock:
+            self.subscription_count += 1
+            sub = {
+                "response_id": response_id,
+                "namespace": namespace,
+                "handler": handler,
+                "seq": self.subscription_count,
+            }
+            sub["entity_id" if type == "state" else "event"] = key
+            handler.subscriptions[type][sub_handle] = sub
+            self.subscriptions[type].add(namespace, key, (handler.handle, sub_handle), sub)
+
+    def unsubscribe(self, handler, type, sub_handle):
+        with self.handlers_lock:
+            sub = handler.subscriptions[type].pop(sub_handle)
+            key = sub["entity_id"] if type == "state" else sub["event"]
+            self.subscriptions[type].remove(sub["namespace"], key, (handler.handle, sub_handle))
 
     async def process_event(self, data):  # noqa: C901
         try:
+            if data["event_type"] == "state_changed":
+                type = "state"
+                key = data["data"]["entity_id"]
+                response_type = "state_changed"
+            else:
+                type = "event"
+                key = data["event_type"]
+                response_type = "event"
+
             with self.handlers_lock:
-                if len(self.handlers) > 0:
-                    # self.logger.debug("Sending data: %s", data)
-                    for handler in self.handlers:
-                        if self.handlers[handler].authed is True:  # if authenticated
-                            # await self.handlers[handler]._event(data)
-                            asyncio.ensure_future(self.handlers[handler]._event(data))
+                # The first matching subscription for each client
+                first = {}
+                for sub in self.subscriptions[type].match(data["namespace"], key):
+                    handler = sub["handler"]
+                    if handler.authed is True and (
+                        handler.handle not in first or sub["seq"] < first[handler.handle]["seq"]
+                    ):
+                        first[handler.handle] = sub
+
+            if not first:
+                return
+
+            # Serialize the event once for each encoding and form in use, clients only differ in the id of the
+            # subscription it is for
+            events = {False: data}
+            if type == "state" and data["data"].get("old_state") is not None and data["data"].get("new_state"):
+                events[True] = None
+            payloads = {}
+            frames = {}
+
+            def get_frame(encoding, delta, response_id):
+                if (encoding, delta, response_id) not in frames:
+                    if (encoding, delta) not in payloads:
+                        if events[delta] is None:
+                            events[delta] = state_delta(data)
+                        payloads[(encoding, delta)] = encode(events[delta], encoding)
+                    frames[(encoding, delta, response_id)] = make_frame(
+                        payloads[(encoding, delta)], response_id, response_type, delta, encoding
+                    )
+                return frames[(encoding, delta, response_id)]
+
+            for sub in first.values():
+                handler = sub["handler"]
+                response_id = sub["response_id"]
+                if type == "state":
+                    # A later change to the entity can replace this one if the client hasn't been sent it yet
+                    coalesce_key = (data["namespace"], key, response_id)
+                    # Deltas only make sense if the client has been sent the entity before
+                    delta = handler.delta is True and True in events and coalesce_key in handler.delta_keys
+                    handler.delta_keys.add(coalesce_key)
+                    handler._queue(
+                        get_frame(handler.encoding, delta, response_id),
+                        coalesce_key,
+                        partial(get_frame, handler.encoding, False, response_id),
+                    )
+                else:
+                    handler._queue(get_frame(handler.encoding, False, response_id))
 
         except Exception:
             self.logger.warning("-" * 60)
@@ -96,6 +458,26 @@ class RequestHandler:
         if self.AD.http.password is None:
             self.authed = True
 
+        #
+        # Frames waiting to be sent to the client, oldest first, as [coalesce key, frame, time queued]. Queued
+        # state_changed frames are also kept in pending_states by namespace, entity and subscription, so while the
+        # client is behind a newer change replaces the one waiting rather than queueing after it. A client that falls
+        # too far behind anyway is disconnected.
+        #
+        self.outbound = deque()
+        self.pending_states = {}
+        self.queued_bytes = 0
+        self.sender = None
+        self.closing = False
+        self.stats = {"sent": 0, "coalesced": 0, "max_queued": 0}
+        self.flushed_stats = None
+
+        # Set by hello. With delta set, state_changed messages only carry what has changed for entities the client
+        # has already been sent, which are kept in delta_keys.
+        self.encoding = "json"
+        self.delta = False
+        self.delta_keys = set()
+
         # Create a stream
         #
         self.stream = self.adstream.stream_handler.makeStream(
@@ -107,7 +489,12 @@ class RequestHandler:
         await self._request(data)
 
     async def _on_disconnect(self):
+        self.closing = True
+        self.outbound.clear()
+        self.pending_states = {}
         await self.adstream.on_disconnect(self.handle)
+        if self.flushed_stats is not None:
+            await self.AD.state.remove_entity("admin", "stream_client.{}".format(self.handle))
         self.access.info("Client disconnection from %s", self.client_name)
         event_data = {
             "event_type": "stream_disconnected",
@@ -116,52 +503,112 @@ class RequestHandler:
 
         await self.AD.events.process_event("admin", event_data)
 
-    async def _event(self, data):
-        response = {"data": data}
-        if data["event_type"] == "state_changed":
-            for handle, sub in self.subscriptions["state"].items():
-                if sub["namespace"].endswith("*"):
-                    if not data["namespace"].startswith(sub["namespace"][:-1]):
-                        continue
-                else:
-                    if not data["namespace"] == sub["namespace"]:
-                        continue
-
-                if sub["entity_id"].endswith("*"):
-                    if not data["data"]["entity_id"].startswith(sub["entity_id"][:-1]):
-                        continue
-                else:
-                    if not data["data"]["entity_id"] == sub["entity_id"]:
-                        continue
+    def _queue(self, frame, coalesce_key=None, full_frame=None):
+        if self.closing is True:
+            return
+
+        if coalesce_key is not None and coalesce_key in self.pending_states:
+            if full_frame is not None:
+                # The client won't see the change being replaced, so a delta against it would be wrong
+                frame = full_frame()
+            entry = self.pending_states[coalesce_key]
+            self.queued_bytes += len(frame) - len(entry[1])
+            entry[1] = frame
+            self.stats["coalesced"] += 1
+            return
+
+        entry = [coalesce_key, frame, time.monotonic()]
+        self.outbound.append(entry)
+        if coalesce_key is not None:
+            self.pending_states[coalesce_key] = entry
+        self.queued_bytes += len(frame)
+        self.stats["max_queued"] = max(self.stats["max_queued"], len(self.outbound))
+
+        reason = self._behind()
+        if reason is not None:
+            self._drop(reason)
+        elif self.sender is None:
+            self.sender = asyncio.ensure_future(self._send_queued())
+
+    def _lag(self):
+        if not self.outbound:
+            return 0
+        return time.monotonic() - self.outbound[0][2]
+
+    def _behind(self):
+        http = self.AD.http
+        if http.stream_queue_size and len(self.outbound) > http.stream_queue_size:
+            return "{} messages queued".format(len(self.outbound))
+        # A single large response is allowed through whatever its size
+        if http.stream_queue_bytes and self.queued_bytes > http.stream_queue_bytes and len(self.outbound) > 1:
+            return "{} bytes queued".format(self.queued_bytes)
+        if http.stream_max_lag and self._lag() > http.stream_max_lag:
+            return "{:.1f}s behind".format(self._lag())
+        return None
 
-                response["response_id"] = sub["response_id"]
-                response["response_type"] = "state_changed"
-                await self._respond(response)
-                break
-        else:
-            for handle, sub in self.subscriptions["event"].items():
-                if sub["namespace"].endswith("*"):
-                    if not data["namespace"].startswith(sub["namespace"][:-1]):
-                        continue
-                else:
-                    if not data["namespace"] == sub["namespace"]:
-                        continue
+    def _drop(self, reason):
+        self.logger.warning("Client %s is too far behind (%s) - disconnecting", self.client_name, reason)
+        self.access.info("Client %s disconnected for falling behind", self.client_name)
+        self.closing = True
+        self.outbound.clear()
+        self.pending_states = {}
+        self.queued_bytes = 0
+        asyncio.ensure_future(self.stream.disconnect())
 
-                if sub["event"].endswith("*"):
-                    if not data["event_type"].startswith(sub["event"][:-1]):
-                        continue
-                else:
-                    if not data["event_type"] == sub["event"]:
-                        continue
+    async def _send_queued(self):
+        try:
+            while self.outbound:
+                coalesce_key, frame, queued = self.outbound.popleft()
+                if coalesce_key is not None:
+                    del self.pending_states[coalesce_key]
+                self.queued_bytes -= len(frame)
+                self.logger.debug("--> %s", frame)
+                await self.stream.sendframe(frame)
+                self.stats["sent"] += 1
+        finally:
+            self.sender = None
+
+    async def _update_admin_stats(self):
+        if self.closing is True or self.client_name is None:
+            return
+
+        if self.outbound:
+            reason = self._behind()
+            if reason is not None:
+                # Nothing new has been queued for a client that has stopped reading, so check here as well
+                self._drop(reason)
+                return
 
-                response["response_id"] = sub["response_id"]
-                response["response_type"] = "event"
-                await self._respond(response)
-                break
+        stats = dict(
+            self.stats,
+            client_name=self.client_name,
+            queued=len(self.outbound),
+            queued_bytes=self.queued_bytes,
+            lag=round(self._lag() * 1000, 1),
+        )
+        if self.flushed_stats is None:
+            await self.AD.state.add_entity("admin", "stream_client.{}".format(self.handle), "connected", stats)
+        elif stats != self.flushed_stats:
+            await self.AD.state.set_state("_stream", "admin", "stream_client.{}".format(self.handle), **stats)
+        self.flushed_stats = stats
 
     async def _respond(self, data):
         self.logger.debug("--> %s", data)
-        await self.stream.sendclient(data)
+        try:
+            if data["response_type"] == "hello":
+                # The client doesn't know which encoding it will get until it sees this
+                frame = encode(data, "json")
+            else:
+                frame = encode(data, self.encoding)
+        except TypeError as e:
+            self.logger.debug("-" * 60)
+            self.logger.warning("Unexpected error in JSON conversion when writing to stream from %s", self.client_name)
+            self.logger.debug("Data is: %s", data)
+            self.logger.debug("Error is: %s", e)
+            self.logger.debug("-" * 60)
+            return
+
+        self._queue(frame)
 
     async def _response_success(self, msg, data=None):
         response = {"response_type": msg["request_type"]}
@@ -246,10 +693,37 @@ class RequestHandler:
         if not self.authed:
             raise RequestHandlerException("authorization failed")
 
+        encoding = data.get("encoding", "json")
+        if encoding not in ENCODINGS:
+            raise RequestHandlerException("unknown encoding")
+        if encoding == "msgpack":
+            if msgpack is None:
+                raise RequestHandlerException("msgpack encoding is not available, install msgpack to use it")
+            if self.AD.http.transport != "ws":
+                raise RequestHandlerException("msgpack encoding is only available with the ws transport")
+        self.encoding = encoding
+        self.delta = data.get("delta", False) is True
+
+        since = data.get("since", {})
+        if not isinstance(since, dict) or not all(isinstance(seq, int) for seq in since.values()):
+            raise RequestHandlerException("since must map namespaces to sequence numbers")
+
         self.stream.set_client_name(self.client_name)
 
         self.access.info("New client %s connected", data["client_name"])
-        response_data = {"version": utils.__version__}
+        response_data = {"version": utils.__version__, "encoding": self.encoding, "delta": self.delta}
+
+        # The current sequence of every namespace, and what has changed since the sequences the client gave for the
+        # namespaces it already has, so a client reconnecting doesn't have to fetch everything again
+        response_data["versions"] = {
+            namespace: self.AD.state.get_version(namespace) for namespace in self.AD.state.state
+        }
+        changes = {}
+        for namespace, seq in since.items():
+            if namespace in response_data["versions"]:
+                changes[namespace] = self.AD.state.get_changes(namespace, seq)
+        if changes:
+            response_data["changes"] = changes
 
         event_data = {
             "event_type": "stream_connected",
@@ -360,11 +834,7 @@ class RequestHandler:
         if handle in self.subscriptions["state"]:
             raise RequestHandlerException("handle already exists")
 
-        self.subscriptions["state"][handle] = {
-            "response_id": request_id,
-            "namespace": data["namespace"],
-            "entity_id": data["entity_id"],
-        }
+        self.adstream.subscribe(self, "state", handle, data["namespace"], data["entity_id"], request_id)
 
         return handle
 
@@ -378,7 +848,9 @@ class RequestHandler:
         if data["handle"] not in self.subscriptions["state"]:
             raise RequestHandlerException("invalid handle")
 
-        del self.subscriptions["state"][data["handle"]]
+        self.adstream.unsubscribe(self, "state", data["handle"])
+        # Changes could be missed before the entity is subscribed to again
+        self.delta_keys.clear()
 
         return True
 
@@ -397,11 +869,7 @@ class RequestHandler:
         if handle in self.subscriptions["event"]:
             raise RequestHandlerException("handle already exists")
 
-        self.subscriptions["event"][handle] = {
-            "response_id": request_id,
-            "namespace": data["namespace"],
-            "event": data["event"],
-        }
+        self.adstream.subscribe(self, "event", handle, data["namespace"], data["event"], request_id)
 
         return handle
 
@@ -415,6 +883,6 @@ class RequestHandler:
         if data["handle"] not in self.subscriptions["event"]:
             raise RequestHandlerException("invalid handle")
 
-        del self.subscriptions["event"][data["handle"]]
+        self.adstream.unsubscribe(self, "event", data["handle"])
 
         return True
@@ -86,13 +86,26 @@ class SocketIOStream:
         data["client_id"] = self.client_id
         try:
             msg = utils.convert_json(data)
-            await self.ns.emit("up", msg, room=self.client_id)
         except TypeError as e:
             self.logger.debug("-" * 60)
             self.logger.warning("Unexpected error in JSON conversion when writing to stream from %s", self.client_name)
             self.logger.debug("Data is: %s", data)
             self.logger.debug("Error is: %s", e)
             self.logger.debug("-" * 60)
+            return
+
+        await self.emit(msg)
+
+    async def disconnect(self):
+        await self.ns.disconnect(self.client_id)
+
+    async def sendframe(self, msg):
+        # Frames are shared between clients, so add our id to the end of the object
+        await self.emit(msg[:-1] + ', "client_id": ' + utils.convert_json(self.client_id) + "}")
+
+    async def emit(self, msg):
+        try:
+            await self.ns.emit("up", msg, room=self.client_id)
         except Exception:
             self.logger.debug("-" * 60)
             self.logger.debug("Client disconnected unexpectedly from %s", self.client_name)
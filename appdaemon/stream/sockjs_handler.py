@@ -70,14 +70,22 @@ class SockJSStream:
     async def sendclient(self, data):
         try:
             msg = utils.convert_json(data)
-            await utils.run_in_executor(self, self.session.send, msg)
         except TypeError as e:
             self.logger.debug("-" * 60)
             self.logger.warning("Unexpected error in JSON conversion when writing to stream from %s", self.client_name)
             self.logger.debug("Data is: %s", data)
             self.logger.debug("Error is: %s", e)
             self.logger.debug("-" * 60)
+            return
+
+        await self.sendframe(msg)
+
+    async def disconnect(self):
+        self.session.close()
 
+    async def sendframe(self, msg):
+        try:
+            await utils.run_in_executor(self, self.session.send, msg)
         except Exception:
             self.logger.debug("-" * 60)
             self.logger.debug("Client disconnected unexpectedly from %s", self.client_name)
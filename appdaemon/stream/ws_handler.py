@@ -7,6 +7,11 @@ import asyncio
 
 from appdaemon import utils as utils
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 
 class WSHandler:
     def __init__(self, ADStream, app, path, ad):
@@ -63,8 +68,18 @@ class WSStream:
                         self.logger.debug("-" * 60)
                         self.logger.debug(traceback.format_exc())
                         self.logger.debug("-" * 60)
+                elif msg.type == aiohttp.WSMsgType.BINARY and msgpack is not None:
+                    try:
+                        msg = msgpack.unpackb(msg.data)
+                    except ValueError:
+                        self.logger.warning("Unexpected error in msgpack conversion when receiving from stream")
+                        continue
+                    await self.on_message(msg)
                 elif msg.type == aiohttp.WSMsgType.ERROR:
                     self.access.info("WebSocket connection closed with exception {}", self.ws.exception())
+                elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED):
+                    # Closed by the client, or by us
+                    break
         except Exception:
             self.logger.debug("-" * 60)
             self.logger.debug("Unexpected client disconnection from client %s", self.client_name)
@@ -79,15 +94,31 @@ class WSStream:
 
     async def sendclient(self, data):
         try:
-            async with self.lock:
-                await self.ws.send_json(data, dumps=utils.convert_json)
-
+            msg = utils.convert_json(data)
         except TypeError as e:
             self.logger.debug("-" * 60)
             self.logger.warning("Unexpected error in JSON conversion when writing to stream from %s", self.client_name)
             self.logger.debug("Data is: %s", data)
             self.logger.debug("Error is: %s", e)
             self.logger.debug("-" * 60)
+            return
+
+        await self.sendframe(msg)
+
+    async def disconnect(self):
+        try:
+            await asyncio.wait_for(self.ws.close(), 5)
+        except asyncio.TimeoutError:
+            # The client has stopped reading so it will never see the close
+            self.request.transport.abort()
+
+    async def sendframe(self, msg):
+        try:
+            async with self.lock:
+                if isinstance(msg, bytes):
+                    await self.ws.send_bytes(msg)
+                else:
+                    await self.ws.send_str(msg)
 
         except Exception:
             self.logger.debug("-" * 60)
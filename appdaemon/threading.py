@@ -5,16 +5,155 @@ import logging
 import re
 import sys
 import threading
+import time
 import traceback
+from collections import Counter, OrderedDict, deque
 from datetime import timedelta
-from queue import Queue
+from queue import Empty, Queue
 from random import randint
 
-import iso8601
 
 from appdaemon import utils as utils
 from appdaemon.appdaemon import AppDaemon
 
+# Callback priority classes, highest first
+PRIORITIES = ("high", "normal", "low")
+
+# What to do with a callback when the thread queues it could go on are full
+OVERLOAD_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+
+class CallbackQueue(Queue):
+    """Worker queue with a FIFO for each priority class.
+
+    Callbacks are taken from the highest priority class that has any waiting, except that once a class has been passed
+    over ``starvation_limit`` times in a row it gets the next turn, so lower priority callbacks always make progress.
+    Queue wait times are recorded per class and per app as callbacks are taken.
+    """
+
+    def __init__(self, starvation_limit=10):
+        self.starvation_limit = starvation_limit
+        super().__init__(maxsize=0)
+
+    def _init(self, maxsize):
+        self.queues = {priority: deque() for priority in PRIORITIES}
+        self.skipped = {priority: 0 for priority in PRIORITIES}
+        self.waits = {}
+        self.app_waits = {}
+        self.closed = False
+
+    def _qsize(self):
+        return sum(len(q) for q in self.queues.values()) + (1 if self.closed else 0)
+
+    def _put(self, item):
+        if item is None:
+            # The thread is being removed, this goes after everything else whatever its priority
+            self.closed = True
+        else:
+            self.queues[item["priority"]].append(item)
+
+    def _get(self):
+        choice = None
+        for priority in PRIORITIES:
+            if self.queues[priority]:
+                if choice is None:
+                    choice = priority
+                else:
+                    self.skipped[priority] += 1
+                    if self.skipped[priority] > self.starvation_limit:
+                        # Been waiting long enough, let it through
+                        choice = priority
+
+        if choice is None:
+            self.closed = False
+            return None
+
+        self.skipped[choice] = 0
+        return self.record_wait(self.queues[choice].popleft())
+
+    def record_wait(self, item):
+        wait = time.monotonic() - item["queued"]
+        stats = self.waits.setdefault(item["priority"], {"count": 0, "total": 0, "max": 0})
+        stats["count"] += 1
+        stats["total"] += wait
+        stats["max"] = max(stats["max"], wait)
+        stats = self.app_waits.setdefault(item["name"], {"count": 0, "total": 0})
+        stats["count"] += 1
+        stats["total"] += wait
+        return item
+
+    def oldest(self):
+        """Return the time the oldest waiting callback was queued, or ``None`` if nothing is waiting"""
+        with self.mutex:
+            heads = [q[0]["queued"] for q in self.queues.values() if q]
+        return min(heads) if heads else None
+
+    def take(self, match):
+        """Remove and return the first waiting callback that ``match()`` accepts, highest priority first"""
+        with self.mutex:
+            for q in self.queues.values():
+                for i, item in enumerate(q):
+                    if match(item):
+                        del q[i]
+                        # Whoever takes it is responsible for it, so it is done as far as this queue is concerned
+                        self.unfinished_tasks -= 1
+                        if self.unfinished_tasks == 0:
+                            self.all_tasks_done.notify_all()
+                        return self.record_wait(item)
+        return None
+
+    def remove_oldest(self, match):
+        """Remove and return the longest waiting callback that ``match()`` accepts, to be discarded"""
+        with self.mutex:
+            oldest = None
+            for q in self.queues.values():
+                for i, item in enumerate(q):
+                    if match(item):
+                        if oldest is None or item["queued"] < oldest[2]["queued"]:
+                            oldest = (q, i, item)
+                        # Each class is in order, so the first match is the oldest in it
+                        break
+            if oldest is None:
+                return None
+            q, i, item = oldest
+            del q[i]
+            self.unfinished_tasks -= 1
+            if self.unfinished_tasks == 0:
+                self.all_tasks_done.notify_all()
+        return item
+
+    def waiting_by_app(self):
+        """Return the number of callbacks waiting for each app"""
+        with self.mutex:
+            return Counter(item["name"] for q in self.queues.values() for item in q)
+
+    def drain(self, match=None):
+        """Remove and return every waiting callback, or every one that ``match()`` accepts"""
+        with self.mutex:
+            items = []
+            for priority, q in self.queues.items():
+                if match is None:
+                    items.extend(q)
+                    q.clear()
+                else:
+                    keep = deque()
+                    for item in q:
+                        (items if match(item) else keep).append(item)
+                    self.queues[priority] = keep
+            self.unfinished_tasks -= len(items)
+            if self.unfinished_tasks == 0:
+                self.all_tasks_done.notify_all()
+        return items
+
+    def get_wait_stats(self):
+        """Return the wait times recorded since the last call, by priority and by app"""
+        with self.mutex:
+            waits = self.waits
+            app_waits = self.app_waits
+            self.waits = {}
+            self.app_waits = {}
+        return waits, app_waits
+
 
 class Threading:
     def __init__(self, ad: AppDaemon, kwargs):
@@ -48,8 +187,109 @@ class Threading:
         self.last_stats_time = datetime.datetime(1970, 1, 1, 0, 0, 0, 0)
         self.callback_list = []
 
+        #
+        # Admin stats are accumulated here as callbacks run, and written to the admin namespace in one go by
+        # update_admin_stats(). Everything is only ever touched from the event loop so no locking is needed.
+        #
+        self.thread_info = {}
+        self.dirty_threads = set()
+        self.callback_stats = {}
+        self.app_stats = {}
+        self.stats = {
+            "fired": 0,
+            "executed": 0,
+            "current_busy": 0,
+            "max_busy": 0,
+            "max_busy_time": None,
+            "last_action_time": None,
+        }
+        self.flushed_stats = {}
+
+        #
+        # Worker threads don't wait on the loop to record what they are doing, they append to this queue and the loop
+        # drains it. thread_info_pending is set while a drain is scheduled so a busy worker doesn't wake the loop for
+        # every entry.
+        #
+        self.thread_info_q = deque()
+        self.thread_info_pending = False
+
+        # Compiled constraints, keyed on (app name, callback handle) or (app name, None) for app level constraints
+        self.constraint_cache = OrderedDict()
+        self.constraint_cache_size = 10000
+
+        #
+        # Autoscaling of the unpinned threads
+        #
+        self.autoscale_threads = False
+        utils.process_arg(self, "autoscale_threads", kwargs)
+        self.autoscale_min_threads = None
+        utils.process_arg(self, "autoscale_min_threads", kwargs, int=True)
+        self.autoscale_max_threads = None
+        utils.process_arg(self, "autoscale_max_threads", kwargs, int=True)
+        self.autoscale_queue_size = 10
+        utils.process_arg(self, "autoscale_queue_size", kwargs, int=True)
+        self.autoscale_queue_wait = 1
+        utils.process_arg(self, "autoscale_queue_wait", kwargs, float=True)
+        self.autoscale_cooldown = 60
+        utils.process_arg(self, "autoscale_cooldown", kwargs, float=True)
+
+        #
+        # Work stealing between the unpinned threads. Idle unpinned workers wait on work_available rather than their own
+        # queue, and take callbacks from busy peers if there is nothing on their own. work_available is notified
+        # whenever anything goes on an unpinned queue, pinned or not, and when an unpinned worker gets busy with more
+        # waiting behind it. unpinned_threads is only ever replaced, never changed, so workers can look through it
+        # without locking.
+        #
+        self.work_stealing = False
+        utils.process_arg(self, "work_stealing", kwargs)
+        self.work_available = threading.Condition()
+        self.unpinned_threads = []
+        self.stolen_removed = 0
+        self.flushed_stolen = 0
+
+        #
+        # Callback priority classes. A class passed over priority_starvation_limit times in a row gets the next turn.
+        # Queue wait times for each class are accumulated in wait_stats for the admin namespace.
+        #
+        self.priority_starvation_limit = 10
+        utils.process_arg(self, "priority_starvation_limit", kwargs, int=True)
+        self.wait_stats = {priority: {"count": 0, "total": 0, "max": 0} for priority in PRIORITIES}
+
+        #
+        # Bounded thread queues, a thread_queue_limit of 0 leaves them unbounded. Callbacks for an app using the block
+        # policy that find the queues full are held in order in blocked, by app, until there is room for them.
+        # queue_room is set each time a worker starts on a callback, to wake the apps waiting. Per app queue stats are
+        # kept in app_queue_stats and written out for the apps in dirty_apps.
+        #
+        self.thread_queue_limit = 0
+        utils.process_arg(self, "thread_queue_limit", kwargs, int=True)
+        self.queue_overload_policy = "drop_oldest"
+        utils.process_arg(self, "queue_overload_policy", kwargs)
+        if self.queue_overload_policy not in OVERLOAD_POLICIES:
+            raise ValueError(
+                "queue_overload_policy must be one of {}, not {}".format(
+                    ", ".join(OVERLOAD_POLICIES), self.queue_overload_policy
+                )
+            )
+        self.queue_block_timeout = 10
+        utils.process_arg(self, "queue_block_timeout", kwargs, float=True)
+        self.queue_room = asyncio.Event()
+        self.blocked = {}
+        self.app_queue_stats = {}
+        self.dirty_apps = set()
+        self.flushed_app_queued = {}
+        self.flushed_app_dropped = {}
+
+        #
+        # Coalescing state callbacks, keyed on handle then entity. Each entry has the callback last queued, when it was
+        # queued, and any change being held back by min_interval. A queued callback is marked coalesced until a worker
+        # picks it up, and can have its new state replaced until then. coalesce_lock covers that hand over.
+        #
+        self.coalesced = {}
+        self.coalesce_lock = threading.Lock()
+
     async def get_q_update(self):
-        for thread in self.threads:
+        for thread in list(self.threads):
             qsize = self.get_q(thread).qsize()
             await self.set_state("_threading", "admin", "thread.{}".format(thread), q=qsize)
 
@@ -98,6 +338,11 @@ class Threading:
         await self.add_entity("admin", "sensor.callbacks_average_fired", 0)
         await self.add_entity("admin", "sensor.callbacks_total_executed", 0)
         await self.add_entity("admin", "sensor.callbacks_average_executed", 0)
+        await self.add_entity("admin", "sensor.callbacks_total_stolen", 0)
+        for priority in PRIORITIES:
+            await self.add_entity(
+                "admin", "sensor.callbacks_wait_{}".format(priority), 0, {"max": 0, "last": 0, "count": 0}
+            )
         await self.add_entity("admin", "sensor.threads_current_busy", 0)
         await self.add_entity("admin", "sensor.threads_max_busy", 0)
         await self.add_entity(
@@ -157,7 +402,23 @@ class Threading:
         for i in range(self.total_threads):
             await self.add_thread(True)
 
+        if self.autoscale_threads is True:
+            if self.auto_pin is True:
+                self.logger.warning("autoscale_threads has no effect unless total_threads is set or pin_apps is false")
+                self.autoscale_threads = False
+            else:
+                if self.autoscale_min_threads is None:
+                    self.autoscale_min_threads = self.total_threads - self.pin_threads
+                if self.autoscale_max_threads is None:
+                    self.autoscale_max_threads = max(self.autoscale_min_threads * 4, 1)
+                self.logger.info(
+                    "Autoscaling unpinned workers between %s and %s threads",
+                    self.autoscale_min_threads,
+                    self.autoscale_max_threads,
+                )
+
         # Add thread object to track async
+        self.thread_info["async"] = {"callback": "idle", "time_called": None}
         await self.add_entity(
             "admin",
             "thread.async",
@@ -209,12 +470,17 @@ class Threading:
         for thread in sorted(self.threads, key=self.natural_keys):
             if thread not in info["threads"]:
                 info["threads"][thread] = {}
-            t = await self.get_state("_threading", "admin", "thread.{}".format(thread), attribute="all")
-            info["threads"][thread]["time_called"] = t["attributes"]["time_called"]
-            info["threads"][thread]["callback"] = t["state"]
-            info["threads"][thread]["is_alive"] = t["attributes"]["is_alive"]
+            info["threads"][thread]["time_called"] = self.thread_time_called(thread)
+            info["threads"][thread]["callback"] = self.thread_info[thread]["callback"]
+            info["threads"][thread]["is_alive"] = self.threads[thread]["thread"].is_alive()
         return info
 
+    def thread_time_called(self, thread_id):
+        time_called = self.thread_info[thread_id]["time_called"]
+        if time_called is None:
+            return utils.dt_to_str(datetime.datetime(1970, 1, 1, 0, 0, 0, 0))
+        return utils.dt_to_str(time_called, self.AD.tz)
+
     async def dump_threads(self):
         self.diag.info("--------------------------------------------------")
         self.diag.info("Threads")
@@ -229,15 +495,13 @@ class Threading:
         self.diag.info("Total Q Entries: %s", self.total_q_size())
         self.diag.info("--------------------------------------------------")
         for thread in sorted(self.threads, key=self.natural_keys):
-            t = await self.get_state("_threading", "admin", "thread.{}".format(thread), attribute="all")
-            # print("thread.{}".format(thread), t)
             self.diag.info(
                 "%s - qsize: %s | current callback: %s | since %s, | alive: %s, | pinned apps: %s",
                 thread,
-                t["attributes"]["q"],
-                t["state"],
-                t["attributes"]["time_called"],
-                t["attributes"]["is_alive"],
+                self.threads[thread]["queue"].qsize(),
+                self.thread_info[thread]["callback"],
+                self.thread_time_called(thread),
+                self.threads[thread]["thread"].is_alive(),
                 await self.get_pinned_apps(thread),
             )
         self.diag.info("--------------------------------------------------")
@@ -286,39 +550,262 @@ class Threading:
         id = "thread-{}".format(thread)
         q = self.threads[id]["queue"]
 
+        if self.thread_queue_limit > 0 and q.qsize() >= self.thread_queue_limit:
+            id = self.find_room(args, id)
+            if id is None:
+                return False
+            q = self.threads[id]["queue"]
+
+        args["priority"] = self.get_callback_priority(args)
+        args["queued"] = time.monotonic()
         q.put_nowait(args)
 
+        # The worker for an unpinned thread is waiting on work_available, whatever is put on its queue
+        if int(id.split("-")[1]) >= self.pin_threads:
+            self.notify_work_available()
+
+        return True
+
+    def notify_work_available(self):
+        if self.work_stealing is True:
+            with self.work_available:
+                self.work_available.notify_all()
+
+    def find_room(self, args, thread_id):
+        # The chosen queue is full - use the least loaded unpinned queue if there is room on it, otherwise it is down to
+        # the app's overload policy. Returns the thread to queue on, or None if the callback has been dropped.
+        if args["pin_app"] is False:
+            unpinned = ["thread-{}".format(i) for i in range(self.pin_threads, self.thread_count)]
+            least = min(unpinned, key=lambda t: self.threads[t]["queue"].qsize())
+            if self.threads[least]["queue"].qsize() < self.thread_queue_limit:
+                return least
+
+        if self.get_overload_policy(args["name"]) == "drop_oldest":
+            # An app flooding the queue only loses its own callbacks
+            oldest = self.threads[thread_id]["queue"].remove_oldest(lambda waiting: waiting["name"] == args["name"])
+            if oldest is not None:
+                self.record_drop(oldest, thread_id)
+                return thread_id
+
+        self.record_drop(args, thread_id)
+        return None
+
+    def record_drop(self, args, thread_id):
+        if args.get("coalesced") is True:
+            # Nothing newer can be folded into a callback that isn't going to run
+            with self.coalesce_lock:
+                args["coalesced"] = False
+
+        self.threads[thread_id]["dropped"] += 1
+        self.dirty_threads.add(thread_id)
+        self.app_queue_stats.setdefault(args["name"], {"dropped": 0, "count": 0, "total": 0})["dropped"] += 1
+        self.dirty_apps.add(args["name"])
+        self.count_callback("{}_callback.{}".format(args["type"], args["id"]), "dropped")
+
+    def queue_full(self, args):
+        if args["pin_app"] is True:
+            thread_id = "thread-{}".format(args["pin_thread"] if args["pin_thread"] != -1 else 0)
+            if thread_id not in self.threads:
+                # select_q() will complain about this
+                return False
+            return self.threads[thread_id]["queue"].qsize() >= self.thread_queue_limit
+
+        unpinned = ["thread-{}".format(i) for i in range(self.pin_threads, self.thread_count)]
+        return unpinned != [] and all(
+            self.threads[thread_id]["queue"].qsize() >= self.thread_queue_limit for thread_id in unpinned
+        )
+
+    def queue_or_hold(self, args):
+        # Returns False if there was no room for the callback and it was dropped
+        if (
+            self.thread_queue_limit > 0
+            and self.get_overload_policy(args["name"]) == "block"
+            and (args["name"] in self.blocked or self.queue_full(args))
+        ):
+            # It will be queued when there is room, or dropped if there isn't any in time. A oneshot isn't used up
+            # until then, release_held_for_room() sees to it
+            self.hold_for_room(args)
+            return not self.is_oneshot(args)
+        return self.select_q(args)
+
+    def hold_for_room(self, args):
+        # Back pressure - the callback waits for room along with any others for the same app, in the order they came,
+        # without holding up dispatch for other apps
+        args["held"] = time.monotonic()
+        if args["name"] not in self.blocked:
+            self.blocked[args["name"]] = deque()
+            asyncio.ensure_future(self.release_held_for_room(args["name"]))
+        self.blocked[args["name"]].append(args)
+
+    async def release_held_for_room(self, name):
+        held = self.blocked[name]
+        try:
+            while held:
+                args = held[0]
+                await self.wait_for_room(args, args["held"] + self.queue_block_timeout)
+                held.popleft()
+                try:
+                    if self.is_oneshot(args) and not self.oneshot_registered(args):
+                        # Another change while it was held has already used it up
+                        if args.get("coalesced") is True:
+                            with self.coalesce_lock:
+                                args["coalesced"] = False
+                        continue
+                    # Dropped if there is still no room
+                    if self.select_q(args) and self.is_oneshot(args):
+                        await self.use_oneshot(args)
+                except Exception:
+                    self.logger.warning("-" * 60)
+                    self.logger.warning("Unexpected error queueing callback for %s", name)
+                    self.logger.warning("-" * 60)
+                    self.logger.warning(traceback.format_exc())
+                    self.logger.warning("-" * 60)
+        finally:
+            del self.blocked[name]
+
+    @staticmethod
+    def is_oneshot(args):
+        return args["type"] in ("state", "event", "log") and args["kwargs"].get("oneshot", False) is True
+
+    def oneshot_registered(self, args):
+        handle = args["kwargs"].get("__handle", args["id"])
+        return handle in self.AD.callbacks.callbacks.get(args["name"], {})
+
+    async def use_oneshot(self, args):
+        # What the dispatcher would have done if the callback had been queued straight away
+        name = args["name"]
+        if args["type"] == "state":
+            # A state callback with a duration is dispatched from its timer, __handle is the callback's own handle
+            await self.AD.state.cancel_state_callback(args["kwargs"].get("__handle", args["id"]), name)
+        elif args["type"] == "event":
+            await self.AD.events.cancel_event_callback(name, args["id"])
+        else:
+            await self.AD.logging.cancel_log_callback(name, args["id"])
+
+        timeout = args["kwargs"].get("__timeout")
+        if timeout is not None and self.AD.sched.timer_running(name, timeout):
+            await self.AD.sched.cancel_timer(name, timeout, False)
+
+    async def wait_for_room(self, args, deadline):
+        # Wait until there is room for the callback, or the deadline has passed
+        while self.queue_full(args):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self.queue_room.clear()
+            try:
+                await asyncio.wait_for(self.queue_room.wait(), min(remaining, 0.1))
+            except asyncio.TimeoutError:
+                pass
+
+    def get_overload_policy(self, name):
+        policy = self.AD.app_management.app_config.get(name, {}).get(
+            "queue_overload_policy", self.queue_overload_policy
+        )
+        if policy not in OVERLOAD_POLICIES:
+            self.logger.warning(
+                "Invalid queue_overload_policy '%s' in app %s, should be one of %s - using %s",
+                policy,
+                name,
+                ", ".join(OVERLOAD_POLICIES),
+                self.queue_overload_policy,
+            )
+            policy = self.queue_overload_policy
+        return policy
+
+    @staticmethod
+    def should_coalesce(args):
+        return args["type"] == "state" and (args["kwargs"].get("coalesce") is True or "min_interval" in args["kwargs"])
+
+    def coalesce(self, args):
+        # Latest wins - a newer change replaces one that is still waiting to run rather than queueing behind it.
+        # Returns False if the callback was dropped
+        entries = self.coalesced.setdefault(args["id"], {})
+        entry = entries.get(args["entity"])
+        if entry is None:
+            entry = entries[args["entity"]] = {"args": None, "last": None, "held": None, "timer": None}
+
+        if entry["held"] is not None:
+            entry["held"] = args
+            self.count_callback("state_callback.{}".format(args["id"]), "superseded")
+            return True
+
+        if entry["args"] is not None:
+            with self.coalesce_lock:
+                waiting = entry["args"]["coalesced"]
+                if waiting is True:
+                    # The callback still gets the old state it was queued with, along with the latest new state
+                    entry["args"]["new_state"] = args["new_state"]
+            if waiting is True:
+                self.count_callback("state_callback.{}".format(args["id"]), "superseded")
+                return True
+
+        wait = 0
+        if entry["last"] is not None:
+            wait = entry["last"] + float(args["kwargs"].get("min_interval", 0)) - time.monotonic()
+        if wait > 0:
+            entry["held"] = args
+            entry["timer"] = self.AD.loop.call_later(wait, self.release_held, args["id"], args["entity"])
+            return True
+        return self.queue_coalesced(entry, args)
+
+    def queue_coalesced(self, entry, args):
+        # Newer changes are folded into it while it waits, whether on a queue or held back for room
+        args["coalesced"] = True
+        entry["args"] = args
+        entry["last"] = time.monotonic()
+        return self.queue_or_hold(args)
+
+    def release_held(self, handle, entity):
+        entry = self.coalesced.get(handle, {}).get(entity)
+        if entry is None or entry["held"] is None:
+            return
+        args = entry["held"]
+        entry["held"] = None
+        entry["timer"] = None
+        self.queue_coalesced(entry, args)
+
+    def forget_coalesced(self, handle):
+        # The callback has been cancelled, anything held back for it is dropped
+        for entry in self.coalesced.pop(handle, {}).values():
+            if entry["timer"] is not None:
+                entry["timer"].cancel()
+
+    def get_callback_priority(self, args):
+        if "callback_priority" in args["kwargs"]:
+            priority = args["kwargs"]["callback_priority"]
+        else:
+            priority = self.AD.app_management.app_config.get(args["name"], {}).get("callback_priority", "normal")
+
+        if priority not in PRIORITIES:
+            self.logger.warning(
+                "Invalid callback_priority '%s' in app %s, should be one of %s - using normal",
+                priority,
+                args["name"],
+                ", ".join(PRIORITIES),
+            )
+            priority = "normal"
+        return priority
+
     async def check_overdue_and_dead_threads(self):
         if self.AD.sched.realtime is True and self.AD.thread_duration_warning_threshold != 0:
-            for thread_id in self.threads:
+            for thread_id in list(self.threads):
                 if self.threads[thread_id]["thread"].is_alive() is not True:
                     self.logger.critical("Thread %s has died", thread_id)
                     self.logger.critical("Pinned apps were: %s", await self.get_pinned_apps(thread_id))
                     self.logger.critical("Thread will be restarted")
                     id = thread_id.split("-")[1]
                     await self.add_thread(silent=False, pinthread=False, id=id)
-                if await self.get_state("_threading", "admin", "thread.{}".format(thread_id)) != "idle":
-                    start = utils.str_to_dt(
-                        await self.get_state(
-                            "_threading",
-                            "admin",
-                            "thread.{}".format(thread_id),
-                            attribute="time_called",
-                        )
-                    )
-                    dur = (await self.AD.sched.get_now() - start).total_seconds()
+                info = self.thread_info[thread_id]
+                if info["callback"] != "idle" and info["time_called"] is not None:
+                    dur = (await self.AD.sched.get_now() - info["time_called"]).total_seconds()
                     if (
                         dur >= self.AD.thread_duration_warning_threshold
                         and dur % self.AD.thread_duration_warning_threshold == 0
                     ):
                         self.logger.warning(
                             "Excessive time spent in callback: %s - %s",
-                            await self.get_state(
-                                "_threading",
-                                "admin",
-                                "thread.{}".format(thread_id),
-                                attribute="callback",
-                            ),
+                            info["callback"],
                             dur,
                         )
 
@@ -338,15 +825,8 @@ class Threading:
                             "Queue size for thread %s is %s, callback is '%s' called at %s - possible thread starvation",
                             thread,
                             qsize,
-                            await self.get_state("_threading", "admin", "thread.{}".format(thread)),
-                            iso8601.parse_date(
-                                await self.get_state(
-                                    "_threading",
-                                    "admin",
-                                    "thread.{}".format(thread),
-                                    attribute="time_called",
-                                )
-                            ),
+                            self.thread_info[thread]["callback"],
+                            self.thread_info[thread]["time_called"],
                         )
 
                 await self.dump_threads()
@@ -361,7 +841,115 @@ class Threading:
 
         return warning_step, warning_iterations
 
+    @staticmethod
+    def q_wait(q, now):
+        # How long the oldest entry on the queue has been waiting
+        oldest = q.oldest()
+        if oldest is None:
+            return 0
+        return now - oldest
+
+    async def autoscale(self):
+        """Add unpinned threads when their queues back up, and remove them again once they have been idle a while"""
+
+        if self.autoscale_threads is False:
+            return
+
+        now = time.monotonic()
+        unpinned = ["thread-{}".format(i) for i in range(self.pin_threads, self.thread_count)]
+
+        depth = 0
+        wait = 0
+        for thread_id in unpinned:
+            q = self.threads[thread_id]["queue"]
+            depth += q.qsize()
+            wait = max(wait, self.q_wait(q, now))
+            if q.qsize() > 0 or self.thread_info[thread_id]["callback"] != "idle":
+                self.threads[thread_id]["idle_since"] = now
+
+        if depth > self.autoscale_queue_size or wait > self.autoscale_queue_wait:
+            add = min(self.autoscale_max_threads - len(unpinned), max(depth // max(self.autoscale_queue_size, 1), 1))
+            if add > 0:
+                self.logger.info(
+                    "Thread queues backing up (%s waiting, longest %.1fs) - adding %s threads", depth, wait, add
+                )
+                for i in range(add):
+                    await self.add_thread()
+                self.rebalance_unpinned()
+        elif len(unpinned) > self.autoscale_min_threads:
+            # Only the last thread can go, so the rest keep their ids
+            thread_id = unpinned[-1]
+            if (
+                now - self.threads[thread_id]["idle_since"] >= self.autoscale_cooldown
+                and await self.get_pinned_apps(thread_id) == []
+                and self.has_pinned_callbacks(thread_id) is False
+            ):
+                await self.remove_thread(thread_id)
+
+    def has_pinned_callbacks(self, thread_id):
+        # Callbacks can be pinned to any thread with pin_thread, whatever their app is pinned to
+        id = int(thread_id.split("-")[1])
+        registered = [self.AD.callbacks.callbacks, self.AD.sched.schedule]
+        for callbacks in registered:
+            for name in list(callbacks):
+                for callback in list(callbacks[name].values()):
+                    if callback["pin_app"] is True and callback["pin_thread"] == id:
+                        return True
+        for held in self.blocked.values():
+            for args in held:
+                if args["pin_app"] is True and args["pin_thread"] == id:
+                    return True
+        return False
+
+    def rebalance_unpinned(self):
+        # Spread whatever is waiting on the unpinned queues evenly across them, oldest first.
+        # Pinned callbacks stay where they are
+        queues = [self.threads["thread-{}".format(i)]["queue"] for i in range(self.pin_threads, self.thread_count)]
+        waiting = []
+        for q in queues:
+            waiting.extend(q.drain(lambda args: args["pin_app"] is False))
+
+        waiting.sort(key=lambda args: args["queued"])
+        for i, args in enumerate(waiting):
+            queues[i % len(queues)].put_nowait(args)
+        self.notify_work_available()
+
     async def update_thread_info(self, thread_id, callback, app, type, uuid, silent):
+        self.record_thread_info(
+            thread_id, callback, app, type, uuid, silent, (await self.AD.sched.get_now()).replace(microsecond=0)
+        )
+
+    def post_thread_info(self, thread_id, callback, app, type, uuid, silent):
+        # Called from worker threads - queue the update for the loop rather than waiting for it
+        if silent is True:
+            return
+
+        self.thread_info_q.append(
+            (thread_id, callback, app, type, uuid, silent, self.AD.sched.get_now_sync().replace(microsecond=0))
+        )
+        if self.thread_info_pending is False:
+            self.thread_info_pending = True
+            try:
+                self.AD.loop.call_soon_threadsafe(self.drain_thread_info)
+            except RuntimeError:
+                # Loop has been closed during shutdown
+                pass
+
+    def drain_thread_info(self):
+        self.thread_info_pending = False
+        # Workers have taken callbacks off their queues, so there may be room for anything being held back
+        self.queue_room.set()
+        while self.thread_info_q:
+            try:
+                self.record_thread_info(*self.thread_info_q.popleft())
+            except Exception:
+                self.logger.warning("-" * 60)
+                self.logger.warning("Unexpected error recording thread info")
+                self.logger.warning("-" * 60)
+                self.logger.warning(traceback.format_exc())
+                self.logger.warning("-" * 60)
+
+    def record_thread_info(self, thread_id, callback, app, type, uuid, silent, now):
         self.logger.debug("Update thread info: %s", thread_id)
         if silent is True:
             return
@@ -378,86 +966,212 @@ class Threading:
             return
 
         appentity = "{}.{}".format(appinfo["type"], app)
+        if appentity not in self.app_stats:
+            self.app_stats[appentity] = {"callbacks": 0, "state": None}
 
-        now = await self.AD.sched.get_now()
-        if callback == "idle":
-            start = utils.str_to_dt(
-                await self.get_state(
-                    "_threading",
-                    "admin",
-                    "thread.{}".format(thread_id),
-                    attribute="time_called",
-                )
-            )
-            duration = (now - start).total_seconds()
-            if self.AD.sched.realtime is True and duration >= self.AD.thread_duration_warning_threshold:
-                thread_name = f"thread.{thread_id}"
-                callback = await self.get_state("_threading", "admin", thread_name)
-                self.logger.warning(
-                    f"Excessive time spent in callback '{callback}', Thread '{thread_name}' - "
-                    f"now complete after {duration} seconds (limit={self.AD.thread_duration_warning_threshold})"
-                )
-            await self.add_to_state("_threading", "admin", "sensor.threads_current_busy", -1)
-
-            await self.add_to_attr("_threading", "admin", appentity, "totalcallbacks", 1)
-            await self.add_to_attr("_threading", "admin", appentity, "instancecallbacks", 1)
+        info = self.thread_info.get(thread_id)
+        if info is None:  # thread has been removed
+            return
 
-            await self.add_to_attr(
-                "_threading",
-                "admin",
-                "{}_callback.{}".format(type, uuid),
-                "executed",
-                1,
-            )
-            await self.add_to_state("_threading", "admin", "sensor.callbacks_total_executed", 1)
+        if callback == "idle":
+            if info["time_called"] is not None:
+                duration = (now - info["time_called"]).total_seconds()
+                if self.AD.sched.realtime is True and duration >= self.AD.thread_duration_warning_threshold:
+                    thread_name = f"thread.{thread_id}"
+                    self.logger.warning(
+                        f"Excessive time spent in callback '{info['callback']}', Thread '{thread_name}' - "
+                        f"now complete after {duration} seconds (limit={self.AD.thread_duration_warning_threshold})"
+                    )
+            self.stats["current_busy"] -= 1
+            self.stats["executed"] += 1
+            self.app_stats[appentity]["callbacks"] += 1
+            self.count_callback("{}_callback.{}".format(type, uuid), "executed")
             self.current_callbacks_executed += 1
         else:
-            await self.add_to_state("_threading", "admin", "sensor.threads_current_busy", 1)
+            self.stats["current_busy"] += 1
             self.current_callbacks_fired += 1
 
-        current_busy = await self.get_state("_threading", "admin", "sensor.threads_current_busy")
-        max_busy = await self.get_state("_threading", "admin", "sensor.threads_max_busy")
-        if current_busy > max_busy:
-            await self.set_state("_threading", "admin", "sensor.threads_max_busy", state=current_busy)
-            await self.set_state(
-                "_threading",
-                "admin",
-                "sensor.threads_max_busy_time",
-                state=utils.dt_to_str((await self.AD.sched.get_now()).replace(microsecond=0), self.AD.tz),
-            )
+        if self.stats["current_busy"] > self.stats["max_busy"]:
+            self.stats["max_busy"] = self.stats["current_busy"]
+            self.stats["max_busy_time"] = now
+            self.stats["last_action_time"] = now
+
+        info["callback"] = callback
+        info["time_called"] = now
+        self.dirty_threads.add(thread_id)
+        self.app_stats[appentity]["state"] = callback
 
+    @staticmethod
+    def average_wait(stats):
+        # Average queue wait in ms
+        if stats["count"] == 0:
+            return 0
+        return round(stats["total"] / stats["count"] * 1000, 1)
+
+    def count_callback(self, entity_id, counter):
+        if entity_id not in self.callback_stats:
+            self.callback_stats[entity_id] = {"fired": 0, "executed": 0, "superseded": 0, "dropped": 0}
+        self.callback_stats[entity_id][counter] += 1
+
+    async def update_admin_stats(self):
+        """Write the stats accumulated since the last call to the admin namespace, once per changed entity"""
+
+        stats = self.stats
+        for counter, entity_id in (
+            ("fired", "sensor.callbacks_total_fired"),
+            ("executed", "sensor.callbacks_total_executed"),
+        ):
+            if stats[counter] != 0:
+                await self.add_to_state("_threading", "admin", entity_id, stats[counter])
+                stats[counter] = 0
+
+        for key, entity_id in (
+            ("current_busy", "sensor.threads_current_busy"),
+            ("max_busy", "sensor.threads_max_busy"),
+            ("max_busy_time", "sensor.threads_max_busy_time"),
+            ("last_action_time", "sensor.threads_last_action_time"),
+        ):
+            if stats[key] is not None and stats[key] != self.flushed_stats.get(key):
+                value = stats[key]
+                if isinstance(value, datetime.datetime):
+                    value = utils.dt_to_str(value, self.AD.tz)
+                await self.set_state("_threading", "admin", entity_id, state=value)
+                self.flushed_stats[key] = stats[key]
+
+        # Queue wait for each priority in ms - average and longest overall, and the average since the last update
+        waits = {}
+        for thread_id, thread in list(self.threads.items()):
+            priority_waits, app_waits = thread["queue"].get_wait_stats()
+            for name, stats in app_waits.items():
+                app = self.app_queue_stats.setdefault(name, {"dropped": 0, "count": 0, "total": 0})
+                app["count"] += stats["count"]
+                app["total"] += stats["total"]
+                self.dirty_apps.add(name)
+                thread["waits"]["count"] += stats["count"]
+                thread["waits"]["total"] += stats["total"]
+                self.dirty_threads.add(thread_id)
+            for priority, stats in priority_waits.items():
+                recent = waits.setdefault(priority, {"count": 0, "total": 0})
+                recent["count"] += stats["count"]
+                recent["total"] += stats["total"]
+                overall = self.wait_stats[priority]
+                overall["count"] += stats["count"]
+                overall["total"] += stats["total"]
+                overall["max"] = max(overall["max"], stats["max"])
+        for priority, recent in waits.items():
+            overall = self.wait_stats[priority]
             await self.set_state(
                 "_threading",
                 "admin",
-                "sensor.threads_last_action_time",
-                state=utils.dt_to_str((await self.AD.sched.get_now()).replace(microsecond=0), self.AD.tz),
+                "sensor.callbacks_wait_{}".format(priority),
+                state=round(overall["total"] / overall["count"] * 1000, 1),
+                max=round(overall["max"] * 1000, 1),
+                last=round(recent["total"] / recent["count"] * 1000, 1),
+                count=overall["count"],
             )
 
-        # Update thread info
+        stolen = self.stolen_removed + sum(thread["stolen"] for thread in list(self.threads.values()))
+        if stolen != self.flushed_stolen:
+            await self.set_state("_threading", "admin", "sensor.callbacks_total_stolen", state=stolen)
+            self.flushed_stolen = stolen
+
+        dirty_threads = self.dirty_threads
+        self.dirty_threads = set()
+        for thread_id in dirty_threads:
+            info = self.thread_info.get(thread_id)
+            if info is None:
+                continue
+            if thread_id == "async":
+                await self.set_state(
+                    "_threading",
+                    "admin",
+                    "thread.{}".format(thread_id),
+                    q=0,
+                    state=info["callback"],
+                    time_called=utils.dt_to_str(info["time_called"], self.AD.tz),
+                    is_alive=True,
+                    pinned_apps=[],
+                )
+            elif thread_id in self.threads:
+                await self.set_state(
+                    "_threading",
+                    "admin",
+                    "thread.{}".format(thread_id),
+                    q=self.threads[thread_id]["queue"].qsize(),
+                    state=info["callback"],
+                    time_called=utils.dt_to_str(info["time_called"], self.AD.tz),
+                    is_alive=self.threads[thread_id]["thread"].is_alive(),
+                    pinned_apps=await self.get_pinned_apps(thread_id),
+                    stolen=self.threads[thread_id]["stolen"],
+                    dropped=self.threads[thread_id]["dropped"],
+                    wait=self.average_wait(self.threads[thread_id]["waits"]),
+                )
 
-        if thread_id == "async":
-            await self.set_state(
-                "_threading",
-                "admin",
-                "thread.{}".format(thread_id),
-                q=0,
-                state=callback,
-                time_called=utils.dt_to_str(now.replace(microsecond=0), self.AD.tz),
-                is_alive=True,
-                pinned_apps=[],
-            )
-        else:
-            await self.set_state(
-                "_threading",
-                "admin",
-                "thread.{}".format(thread_id),
-                q=self.threads[thread_id]["queue"].qsize(),
-                state=callback,
-                time_called=utils.dt_to_str(now.replace(microsecond=0), self.AD.tz),
-                is_alive=self.threads[thread_id]["thread"].is_alive(),
-                pinned_apps=await self.get_pinned_apps(thread_id),
-            )
-        await self.set_state("_threading", "admin", appentity, state=callback)
+        callback_stats = self.callback_stats
+        self.callback_stats = {}
+        for entity_id, counts in callback_stats.items():
+            # The callback may have been cancelled since it ran
+            state = await self.get_state("_threading", "admin", entity_id, attribute="all", copy=False)
+            if state is not None:
+                attributes = {
+                    "fired": state["attributes"].get("fired", 0) + counts["fired"],
+                    "executed": state["attributes"].get("executed", 0) + counts["executed"],
+                }
+                for counter in ("superseded", "dropped"):
+                    if counts[counter] != 0:
+                        attributes[counter] = state["attributes"].get(counter, 0) + counts[counter]
+                await self.set_state("_threading", "admin", entity_id, **attributes)
+
+        app_stats = self.app_stats
+        self.app_stats = {}
+        for entity_id, app in app_stats.items():
+            state = await self.get_state("_threading", "admin", entity_id, attribute="all", copy=False)
+            if state is not None:
+                await self.set_state(
+                    "_threading",
+                    "admin",
+                    entity_id,
+                    state=app["state"],
+                    totalcallbacks=state["attributes"].get("totalcallbacks", 0) + app["callbacks"],
+                    instancecallbacks=state["attributes"].get("instancecallbacks", 0) + app["callbacks"],
+                )
+
+        # Callbacks each app has waiting on the thread queues, how long they wait, and how many have been dropped
+        queued = Counter()
+        for thread in list(self.threads.values()):
+            queued.update(thread["queue"].waiting_by_app())
+        for name in set(queued) | set(self.flushed_app_queued):
+            if queued[name] != self.flushed_app_queued.get(name, 0):
+                self.dirty_apps.add(name)
+        self.flushed_app_queued = {name: count for name, count in queued.items() if count != 0}
+
+        dirty_apps = self.dirty_apps
+        self.dirty_apps = set()
+        for name in dirty_apps:
+            appinfo = self.AD.app_management.get_app_info(name)
+            if appinfo is None:
+                # App has been removed
+                self.app_queue_stats.pop(name, None)
+                self.flushed_app_dropped.pop(name, None)
+                continue
+
+            stats = self.app_queue_stats.get(name, {"dropped": 0, "count": 0, "total": 0})
+            if stats["dropped"] != self.flushed_app_dropped.get(name, 0):
+                self.logger.warning(
+                    "Thread queues full - %s callbacks from app %s dropped so far", stats["dropped"], name
+                )
+                self.flushed_app_dropped[name] = stats["dropped"]
+
+            entity_id = "{}.{}".format(appinfo["type"], name)
+            if await self.get_state("_threading", "admin", entity_id, attribute="all", copy=False) is not None:
+                await self.set_state(
+                    "_threading",
+                    "admin",
+                    entity_id,
+                    queued=queued[name],
+                    dropped=stats["dropped"],
+                    wait=self.average_wait(stats),
+                )
 
     #
     # Pinning
@@ -479,15 +1193,29 @@ class Threading:
                 "admin",
                 "thread.{}".format(name),
                 "idle",
-                {"q": 0, "is_alive": True, "time_called": utils.dt_to_str(datetime.datetime(1970, 1, 1, 0, 0, 0, 0))},
+                {
+                    "q": 0,
+                    "is_alive": True,
+                    "time_called": utils.dt_to_str(datetime.datetime(1970, 1, 1, 0, 0, 0, 0)),
+                    "stolen": 0,
+                    "dropped": 0,
+                    "wait": 0,
+                },
             )
             self.threads[name] = {}
-            self.threads[name]["queue"] = Queue(maxsize=0)
+            self.threads[name]["queue"] = CallbackQueue(self.priority_starvation_limit)
+            self.threads[name]["idle_since"] = time.monotonic()
+            self.threads[name]["busy"] = False
+            self.threads[name]["stolen"] = 0
+            self.threads[name]["dropped"] = 0
+            self.threads[name]["waits"] = {"count": 0, "total": 0}
+            self.thread_info[name] = {"callback": "idle", "time_called": None}
             t.start()
             self.thread_count += 1
             if pinthread is True:
                 self.pin_threads += 1
         else:
+            self.thread_info[name] = {"callback": "idle", "time_called": None}
             await self.set_state(
                 "_threading",
                 "admin",
@@ -497,6 +1225,29 @@ class Threading:
             )
 
         self.threads[name]["thread"] = t
+        self.update_unpinned_threads()
+
+    def update_unpinned_threads(self):
+        self.unpinned_threads = [
+            self.threads["thread-{}".format(i)] for i in range(self.pin_threads, self.thread_count)
+        ]
+
+    async def remove_thread(self, name):
+        self.logger.info("Removing thread %s", name)
+        self.thread_count -= 1
+        if self.next_thread >= self.thread_count:
+            self.next_thread = self.pin_threads
+
+        thread = self.threads.pop(name)
+        del self.thread_info[name]
+        self.dirty_threads.discard(name)
+        self.stolen_removed += thread["stolen"]
+        self.update_unpinned_threads()
+
+        # Anything still on the queue gets run before the worker sees this and exits
+        thread["queue"].put_nowait(None)
+        self.notify_work_available()
+        await self.AD.state.remove_entity("admin", "thread.{}".format(name))
 
     async def calculate_pin_threads(self):
         if self.pin_threads == 0:
@@ -523,7 +1274,7 @@ class Threading:
                 await self.set_pin_thread(name, thread)
                 thread_pins[thread] += 1
 
-        for thread in self.threads:
+        for thread in list(self.threads):
             pinned_apps = await self.get_pinned_apps(thread)
             await self.set_state(
                 "_threading",
@@ -580,49 +1331,88 @@ class Threading:
     # Constraints
     #
 
-    async def check_constraint(self, key, value, app):
-        """Used to check Constraint"""
-
-        unconstrained = True
-        if key in app.list_constraints():
-            method = getattr(app, key)
-            unconstrained = await utils.run_async_sync_func(self, method, value)
+    @staticmethod
+    def compile_constraints(args, app, registered):
+        """Used to turn constraint arguments into a structure that can be checked without any parsing"""
 
-        return unconstrained
+        compiled = {"methods": [], "days": None, "window": None}
 
-    async def check_time_constraint(self, args, name):
-        """Used to check time Constraint"""
+        for key in args:
+            if key in registered:
+                compiled["methods"].append((getattr(app, key), args[key]))
 
-        unconstrained = True
         if "constrain_start_time" in args or "constrain_end_time" in args:
-            if "constrain_start_time" not in args:
-                start_time = "00:00:00"
-            else:
-                start_time = args["constrain_start_time"]
-            if "constrain_end_time" not in args:
-                end_time = "23:59:59"
-            else:
-                end_time = args["constrain_end_time"]
-            if await self.AD.sched.now_is_between(start_time, end_time, name) is False:
-                unconstrained = False
+            compiled["window"] = {
+                "start": args.get("constrain_start_time", "00:00:00"),
+                "end": args.get("constrain_end_time", "23:59:59"),
+                "date": None,
+                "bounds": None,
+            }
 
-        return unconstrained
+        if "constrain_days" in args:
+            days = 0
+            for day in args["constrain_days"].split(","):
+                days |= 1 << utils.day_of_week(day)
+            compiled["days"] = days
+
+        return compiled
+
+    def get_constraints(self, key, args, app, objectid):
+        """Used to get the compiled constraints for an app or callback, compiling them if anything changed"""
+
+        registered = app.list_constraints()
+        compiled = self.constraint_cache.get(key)
+        if (
+            compiled is None
+            or compiled["args"] is not args
+            or compiled["objectid"] != objectid
+            or compiled["registered"] != registered
+        ):
+            compiled = self.compile_constraints(args, app, registered)
+            compiled["args"] = args
+            compiled["objectid"] = objectid
+            compiled["registered"] = list(registered)
+            self.constraint_cache[key] = compiled
+            if len(self.constraint_cache) > self.constraint_cache_size:
+                self.constraint_cache.popitem(last=False)
+        else:
+            self.constraint_cache.move_to_end(key)
 
-    async def check_days_constraint(self, args, name):
-        """Used to check days Constraint"""
+        return compiled
 
-        unconstrained = True
-        if "constrain_days" in args:
-            days = args["constrain_days"]
+    def forget_constraints(self, name, handle=None):
+        """Used to drop the compiled constraints for a cancelled callback, or for everything of a terminated app"""
+
+        if handle is not None:
+            self.constraint_cache.pop((name, handle), None)
+        else:
+            for key in [key for key in self.constraint_cache if key[0] == name]:
+                del self.constraint_cache[key]
+
+    async def check_constraints(self, compiled, name):
+        """Used to check compiled constraints"""
+
+        if compiled["window"] is not None or compiled["days"] is not None:
             now = (await self.AD.sched.get_now()).astimezone(self.AD.tz)
-            daylist = []
-            for day in days.split(","):
-                daylist.append(await utils.run_in_executor(self, utils.day_of_week, day))
 
-            if now.weekday() not in daylist:
-                unconstrained = False
+            window = compiled["window"]
+            if window is not None:
+                # Time windows are parsed once a day, as that is when the sun times move
+                date = (now.date(), now.utcoffset())
+                if window["date"] != date:
+                    window["bounds"] = await self.AD.sched.get_time_window(window["start"], window["end"], name)
+                    window["date"] = date
+                if not self.AD.sched.in_time_window(window["bounds"], now):
+                    return False
 
-        return unconstrained
+            if compiled["days"] is not None and not compiled["days"] & (1 << now.weekday()):
+                return False
+
+        for method, value in compiled["methods"]:
+            if not await utils.run_async_sync_func(self, method, value):
+                return False
+
+        return True
 
     async def check_state_constraint(self, args, new_state, name):
         """Used to check state Constraint"""
@@ -785,48 +1575,29 @@ class Threading:
 
     async def dispatch_worker(self, name, args):
         unconstrained = True
+        app = self.AD.app_management.objects[name]["object"]
+        objectid = self.AD.app_management.objects[name]["id"]
         #
         # Argument Constraints
         # (plugins have no args so skip if necessary)
         #
         if name in self.AD.app_management.app_config:
-            for arg in self.AD.app_management.app_config[name].keys():
-                constrained = await self.check_constraint(
-                    arg,
-                    self.AD.app_management.app_config[name][arg],
-                    self.AD.app_management.objects[name]["object"],
-                )
-                if not constrained:
-                    unconstrained = False
-            if not await self.check_time_constraint(self.AD.app_management.app_config[name], name):
-                unconstrained = False
-            elif not await self.check_days_constraint(self.AD.app_management.app_config[name], name):
-                unconstrained = False
+            compiled = self.get_constraints((name, None), self.AD.app_management.app_config[name], app, objectid)
+            unconstrained = await self.check_constraints(compiled, name)
 
         #
         # Callback level constraints
         #
         myargs = utils.deepcopy(args)
-        if "kwargs" in myargs:
-            for arg in myargs["kwargs"].keys():
-                constrained = await self.check_constraint(
-                    arg,
-                    myargs["kwargs"][arg],
-                    self.AD.app_management.objects[name]["object"],
-                )
-                if not constrained:
-                    unconstrained = False
-            if not await self.check_time_constraint(myargs["kwargs"], name):
-                unconstrained = False
-            elif not await self.check_days_constraint(myargs["kwargs"], name):
-                unconstrained = False
+        if unconstrained and "kwargs" in args:
+            compiled = self.get_constraints((name, args["id"]), args["kwargs"], app, objectid)
+            unconstrained = await self.check_constraints(compiled, name)
 
             #
             # Lets determine the state constraint
             #
-            if myargs["type"] == "state":
-                state_unconstrained = await self.check_state_constraint(myargs["kwargs"], myargs["new_state"], name)
-                unconstrained = all((unconstrained, state_unconstrained))
+            if unconstrained and myargs["type"] == "state":
+                unconstrained = await self.check_state_constraint(myargs["kwargs"], myargs["new_state"], name)
 
         if unconstrained:
             #
@@ -835,22 +1606,18 @@ class Threading:
             if "__silent" in args["kwargs"] and args["kwargs"]["__silent"] is True:
                 pass
             else:
-                await self.add_to_state("_threading", "admin", "sensor.callbacks_total_fired", 1)
-                await self.add_to_attr(
-                    "_threading",
-                    "admin",
-                    "{}_callback.{}".format(myargs["type"], myargs["id"]),
-                    "fired",
-                    1,
-                )
+                self.stats["fired"] += 1
+                self.count_callback("{}_callback.{}".format(myargs["type"], myargs["id"]), "fired")
             #
             # And Q
             #
             if asyncio.iscoroutinefunction(myargs["function"]):
                 f = asyncio.ensure_future(self.async_worker(myargs))
                 self.AD.futures.add_future(name, f)
+            elif self.should_coalesce(myargs):
+                return self.coalesce(myargs)
             else:
-                self.select_q(myargs)
+                return self.queue_or_hold(myargs)
             return True
         else:
             return False
@@ -983,12 +1750,57 @@ class Threading:
             if not self.AD.stopping:
                 self.logger.warning("Found stale callback for %s - discarding", name)
 
+    def get_callback(self, thread):
+        # Returns the next callback for a worker, and whether it was stolen from another thread
+        q = thread["queue"]
+        if self.work_stealing is False or not any(t is thread for t in self.unpinned_threads):
+            return q.get(), False
+
+        with self.work_available:
+            while True:
+                try:
+                    return q.get_nowait(), False
+                except Empty:
+                    pass
+
+                args = self.steal(thread)
+                if args is not None:
+                    return args, True
+
+                self.work_available.wait()
+
+    def steal(self, thief):
+        # Take the next unpinned callback waiting behind a busy thread, pinned callbacks stay where they are
+        for victim in sorted(self.unpinned_threads, key=lambda t: t["queue"].qsize(), reverse=True):
+            if victim is thief or victim["busy"] is False:
+                continue
+
+            args = victim["queue"].take(lambda args: args["pin_app"] is False)
+            if args is not None:
+                thief["stolen"] += 1
+                return args
+
+        return None
+
     # noinspection PyBroadException
     def worker(self):  # noqa: C901
         thread_id = threading.current_thread().name
-        q = self.get_q(thread_id)
+        thread = self.threads[thread_id]
+        q = thread["queue"]
         while True:
-            args = q.get()
+            args, stolen = self.get_callback(thread)
+            if args is None:
+                # Thread has been removed
+                q.task_done()
+                return
+            if args.get("coalesced") is True:
+                # Anything newer gets queued separately from here on
+                with self.coalesce_lock:
+                    args["coalesced"] = False
+            thread["busy"] = True
+            if q.qsize() > 0 and any(t is thread for t in self.unpinned_threads):
+                # There is now something for an idle peer to steal
+                self.notify_work_available()
             _type = args["type"]
             funcref = args["function"]
             _id = args["id"]
@@ -1007,15 +1819,12 @@ class Threading:
             else:
                 use_dictionary_unpacking = self.AD.use_dictionary_unpacking
 
-            app = utils.run_coroutine_threadsafe(self, self.AD.app_management.get_app_instance(name, objectid))
+            app = self.AD.app_management.get_app_instance_sync(name, objectid)
             if app is not None:
                 try:
                     if _type == "scheduler":
                         try:
-                            utils.run_coroutine_threadsafe(
-                                self,
-                                self.update_thread_info(thread_id, callback, name, _type, _id, silent),
-                            )
+                            self.post_thread_info(thread_id, callback, name, _type, _id, silent)
                             if use_dictionary_unpacking is True:
                                 funcref(**self.AD.sched.sanitize_timer_kwargs(app, args["kwargs"]))
                             else:
@@ -1029,10 +1838,7 @@ class Threading:
                             attr = args["attribute"]
                             old_state = args["old_state"]
                             new_state = args["new_state"]
-                            utils.run_coroutine_threadsafe(
-                                self,
-                                self.update_thread_info(thread_id, callback, name, _type, _id, silent),
-                            )
+                            self.post_thread_info(thread_id, callback, name, _type, _id, silent)
                             if use_dictionary_unpacking is True:
                                 funcref(
                                     entity,
@@ -1055,10 +1861,7 @@ class Threading:
                     if _type == "log":
                         data = args["data"]
                         try:
-                            utils.run_coroutine_threadsafe(
-                                self,
-                                self.update_thread_info(thread_id, callback, name, _type, _id, silent),
-                            )
+                            self.post_thread_info(thread_id, callback, name, _type, _id, silent)
                             if use_dictionary_unpacking is True:
                                 funcref(
                                     data["app_name"],
@@ -1083,10 +1886,7 @@ class Threading:
                     elif _type == "event":
                         data = args["data"]
                         try:
-                            utils.run_coroutine_threadsafe(
-                                self,
-                                self.update_thread_info(thread_id, callback, name, _type, _id, silent),
-                            )
+                            self.post_thread_info(thread_id, callback, name, _type, _id, silent)
                             if use_dictionary_unpacking is True:
                                 funcref(
                                     args["event"], data, **self.AD.events.sanitize_event_kwargs(app, args["kwargs"])
@@ -1109,16 +1909,15 @@ class Threading:
                             self.AD.logging.get_filename("error_log"),
                         )
                 finally:
-                    utils.run_coroutine_threadsafe(
-                        self,
-                        self.update_thread_info(thread_id, "idle", name, _type, _id, silent),
-                    )
+                    self.post_thread_info(thread_id, "idle", name, _type, _id, silent)
 
             else:
                 if not self.AD.stopping:
                     self.logger.warning("Found stale callback for %s - discarding", name)
 
-            q.task_done()
+            thread["busy"] = False
+            if stolen is False:
+                q.task_done()
 
     def report_callback_sig(self, name, type, funcref, args):
         error_logger = logging.getLogger("Error.{}".format(name))
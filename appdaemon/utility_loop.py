@@ -161,13 +161,25 @@ class Utility:
                         warning_iterations,
                     ) = await self.AD.threading.check_q_size(warning_step, warning_iterations)
 
+                    # Grow or shrink the worker pool if autoscaling
+
+                    await self.AD.threading.autoscale()
+
                     # Check for any overdue threads
 
                     await self.AD.threading.check_overdue_and_dead_threads()
 
+                    # Flush admin stats if there is no admin loop to do it
+
+                    if self.AD.admin_loop is None:
+                        await self.AD.threading.update_admin_stats()
+
+                        if self.AD.http is not None:
+                            await self.AD.http.stream.update_admin_stats()
+
                     # Save any hybrid namespaces
 
-                    self.AD.state.save_hybrid_namespaces()
+                    await self.AD.state.save_hybrid_namespaces()
 
                     # Run utility for each plugin
 
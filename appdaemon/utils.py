@@ -8,6 +8,8 @@ import cProfile
 import io
 import pstats
 import shelve
+import sqlite3
+import pickle
 import threading
 import datetime
 import dateutil.parser
@@ -31,6 +33,8 @@ if platform.system() != "Windows":
     import pwd
 
 secrets = None
+# The yaml secrets file the secrets were read from - config files without one of their own fall back to it
+secrets_file = None
 
 
 class Formatter(object):
@@ -148,6 +152,124 @@ class PersistentDict(shelve.DbfilenameShelf):
                     self.sync()
 
 
+class SQLitePersistentDict(dict):
+    """
+    Dict-like object that persists its contents to an SQLite database.
+
+    The contents are held in memory and only keys that have changed since the last sync() are written, in a single
+    transaction. The database uses write-ahead logging so writes are appended to the journal rather than rewriting the
+    file. With safe set every change is written before returning, otherwise sync() is expected to be called
+    periodically, and may be called from another thread.
+    """
+
+    def __init__(self, filename, safe, *args, **kwargs):
+        super().__init__()
+        self.safe = safe
+        self.rlock = threading.RLock()  # protects the contents and dirty keys
+        self.db_lock = threading.Lock()  # serializes use of the connection
+        self.dirty = set()
+
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous={}".format("FULL" if safe else "NORMAL"))
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value BLOB)")
+        for key, value in self.db.execute("SELECT key, value FROM state"):
+            super().__setitem__(key, pickle.loads(value))
+
+        self.update(*args, **kwargs)
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo=memo)
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, dict(self))
+
+    def __setitem__(self, key, val):
+        with self.rlock:
+            super().__setitem__(key, val)
+            self.dirty.add(key)
+        if self.safe:
+            self.sync()
+
+    def __delitem__(self, key):
+        with self.rlock:
+            super().__delitem__(key)
+            self.dirty.add(key)
+        if self.safe:
+            self.sync()
+
+    def update(self, *args, **kwargs):
+        with self.rlock:
+            for key, value in dict(*args, **kwargs).items():
+                super().__setitem__(key, value)
+                self.dirty.add(key)
+        if self.safe:
+            self.sync()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *args):
+        with self.rlock:
+            if key in self:
+                self.dirty.add(key)
+            value = super().pop(key, *args)
+        if self.safe:
+            self.sync()
+        return value
+
+    def popitem(self):
+        with self.rlock:
+            key, value = super().popitem()
+            self.dirty.add(key)
+        if self.safe:
+            self.sync()
+        return key, value
+
+    def clear(self):
+        with self.rlock:
+            self.dirty.update(self.keys())
+            super().clear()
+        if self.safe:
+            self.sync()
+
+    def sync(self):
+        with self.db_lock:
+            with self.rlock:
+                if not self.dirty:
+                    return
+                dirty = self.dirty
+                self.dirty = set()
+                changes = [(key, key in self, self.get(key)) for key in dirty]
+
+            # Values are pickled outside the lock so the contents can keep changing while this runs
+            writes = [(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) for key, present, value in changes if present]
+            deletes = [(key,) for key, present, value in changes if not present]
+            try:
+                with self.db:
+                    self.db.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", writes)
+                    self.db.executemany("DELETE FROM state WHERE key = ?", deletes)
+            except Exception:
+                with self.rlock:
+                    self.dirty |= dirty
+                raise
+
+    def close(self):
+        self.sync()
+        with self.db_lock:
+            self.db.close()
+
+
+def is_persistent_dict(obj):
+    return isinstance(obj, (PersistentDict, SQLitePersistentDict))
+
+
 class AttrDict(dict):
     """Dictionary subclass whose entries can be accessed by attributes
     (as well as normally).
@@ -166,6 +288,77 @@ class AttrDict(dict):
             return AttrDict({key: AttrDict.from_nested_dict(data[key]) for key in data})
 
 
+class FrozenDict(dict):
+    """Read only dictionary used to hold entity state.
+
+    Entity state is never changed in place - a change builds a new FrozenDict sharing any unchanged values with the
+    old one - so it can be handed to callbacks and the stream without taking a copy. ``copy()`` returns an ordinary
+    (shallow) dict.
+    """
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Entity state is read only - use get_state() or copy() to get a copy that can be changed")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+class FrozenList(list):
+    """Read only list, the FrozenDict equivalent for lists found in entity state"""
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Entity state is read only - use get_state() or copy() to get a copy that can be changed")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return FrozenList, (list(self),)
+
+
+def freeze(data):
+    """Return a read only version of data, reusing anything that is already frozen"""
+    if isinstance(data, (FrozenDict, FrozenList)):
+        return data
+    elif isinstance(data, dict):
+        return FrozenDict({key: freeze(value) for key, value in data.items()})
+    elif isinstance(data, list):
+        return FrozenList([freeze(item) for item in data])
+    else:
+        return data
+
+
+def thaw(data):
+    """Return a copy of data that can be changed, the opposite of freeze()"""
+    if isinstance(data, dict):
+        return {key: thaw(value) for key, value in data.items()}
+    elif isinstance(data, list):
+        return [thaw(item) for item in data]
+    elif data is None or isinstance(data, (str, int, float, datetime.datetime)):
+        return data
+    else:
+        return copy.deepcopy(data)
+
+
 class StateAttrs(dict):
     def __init__(self, dict):
         device_dict = {}
@@ -338,7 +531,11 @@ async def run_async_sync_func(self, method, *args, **kwargs):
 def deepcopy(data):
     result = None
 
-    if isinstance(data, dict):
+    if isinstance(data, (FrozenDict, FrozenList)):
+        # Read only so there is nothing to copy
+        result = data
+
+    elif isinstance(data, dict):
         result = {}
         for key, value in data.items():
             result[key] = deepcopy(value)
@@ -695,6 +892,17 @@ def _include_yaml(loader, node):
         return yaml.load(f, Loader=yaml.SafeLoader)
 
 
+def get_yaml_secrets_file(config_file_yaml, config):
+    if isinstance(config, dict) and "secrets" in config:
+        return config["secrets"]
+
+    file = os.path.join(os.path.dirname(config_file_yaml), "secrets.yaml")
+    if not os.path.isfile(file) and secrets_file is not None:
+        # Re-read the global secrets file each time, so changes to it are picked up
+        return secrets_file
+    return file
+
+
 def read_yaml_config(config_file_yaml):
     #
     # First locate secrets file
@@ -721,20 +929,18 @@ def read_yaml_config(config_file_yaml):
 
     config = yaml.load(config_file_contents, Loader=yaml.SafeLoader)
 
-    if "secrets" in config:
-        secrets_file = config["secrets"]
-    else:
-        secrets_file = os.path.join(os.path.dirname(config_file_yaml), "secrets.yaml")
+    global secrets, secrets_file
+    file = get_yaml_secrets_file(config_file_yaml, config)
 
     #
     # Read Secrets
     #
-    if os.path.isfile(secrets_file):
-        with open(secrets_file, "r") as yamlfd:
+    if os.path.isfile(file):
+        with open(file, "r") as yamlfd:
             secrets_file_contents = yamlfd.read()
 
-        global secrets
         secrets = yaml.load(secrets_file_contents, Loader=yaml.SafeLoader)
+        secrets_file = file
 
     else:
         if "secrets" in config:
@@ -0,0 +1,79 @@
+"""Cost of keeping a persistent namespace of 10k entities on disk under a steady write rate.
+
+Each tick updates a batch of entities, as a busy set of apps or a plugin would, and then saves the namespace as the
+utility loop does for hybrid namespaces. Safe namespaces save on every write so are timed per write instead.
+
+Run with ``python benchmarks/persistent_namespace.py``.
+"""
+import os
+import random
+import tempfile
+import time
+
+from appdaemon.utils import PersistentDict, SQLitePersistentDict, freeze
+
+ENTITIES = 10000
+WRITES_PER_TICK = 100
+TICKS = 20
+SAFE_WRITES = 200
+
+
+def entity(i, value):
+    return freeze(
+        {
+            "entity_id": "sensor.entity_{}".format(i),
+            "state": value,
+            "last_changed": "2023-01-01T00:00:00+00:00",
+            "attributes": {"friendly_name": "Entity {}".format(i), "unit_of_measurement": "W"},
+        }
+    )
+
+
+def populate(store):
+    for i in range(ENTITIES):
+        store["sensor.entity_{}".format(i)] = entity(i, 0)
+    store.sync()
+
+
+def hybrid(store_class, path):
+    store = store_class(path, False)
+    populate(store)
+    start = time.perf_counter()
+    for tick in range(TICKS):
+        for _ in range(WRITES_PER_TICK):
+            i = random.randrange(ENTITIES)
+            store["sensor.entity_{}".format(i)] = entity(i, tick)
+        store.sync()
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed / TICKS
+
+
+def safe(store_class, path):
+    store = store_class(path, False)
+    populate(store)
+    store.safe = True
+    start = time.perf_counter()
+    for n in range(SAFE_WRITES):
+        i = random.randrange(ENTITIES)
+        store["sensor.entity_{}".format(i)] = entity(i, n)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed / SAFE_WRITES
+
+
+def main():
+    print("{} entities, {} writes per hybrid save".format(ENTITIES, WRITES_PER_TICK))
+    print("{:>8} {:>22} {:>22}".format("backend", "hybrid (ms/save)", "safe (ms/write)"))
+    for name, store_class, filename in (
+        ("shelve", PersistentDict, "bench.db"),
+        ("sqlite", SQLitePersistentDict, "bench.sqlite"),
+    ):
+        with tempfile.TemporaryDirectory() as tmp:
+            hybrid_time = hybrid(store_class, os.path.join(tmp, "hybrid_" + filename))
+            safe_time = safe(store_class, os.path.join(tmp, "safe_" + filename))
+        print("{:>8} {:>22.2f} {:>22.2f}".format(name, hybrid_time * 1000, safe_time * 1000))
+
+
+if __name__ == "__main__":
+    main()
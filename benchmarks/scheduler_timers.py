@@ -0,0 +1,63 @@
+"""Scheduler wakeup cost as the number of timers grows.
+
+Each wakeup fires the single due timer, re-queues it as a repeating timer would and works out how long to
+sleep for. The old full scan of the schedule is timed alongside the timer queue for comparison.
+
+Run with ``python benchmarks/scheduler_timers.py``.
+"""
+import datetime
+import random
+import timeit
+
+import pytz
+
+from appdaemon.scheduler import TimerQueue
+
+WAKEUPS = 1000
+
+
+def build(count):
+    base = pytz.utc.localize(datetime.datetime(2023, 1, 1))
+    schedule = {"app": {}}
+    timers = TimerQueue()
+    for i in range(count):
+        handle = "handle_{}".format(i)
+        ts = base + datetime.timedelta(seconds=random.randint(1, 86400), microseconds=i)
+        schedule["app"][handle] = {"timestamp": ts}
+        timers.push("app", handle, ts)
+    return schedule, timers
+
+
+def scan_wakeup(schedule):
+    next_exec = None
+    for name in schedule:
+        for entry in schedule[name].values():
+            if next_exec is None or entry["timestamp"] < next_exec:
+                next_exec = entry["timestamp"]
+    for name in schedule:
+        for handle, entry in schedule[name].items():
+            if entry["timestamp"] == next_exec:
+                entry["timestamp"] += datetime.timedelta(days=1)
+
+
+def heap_wakeup(schedule, timers):
+    now = timers.next_timestamp()
+    for entry in timers.pop_due(now):
+        args = schedule[entry["name"]][entry["uuid"]]
+        args["timestamp"] += datetime.timedelta(days=1)
+        timers.push(entry["name"], entry["uuid"], args["timestamp"])
+    timers.next_timestamp()
+
+
+def main():
+    print("{:>8} {:>16} {:>16}".format("timers", "scan (us/wake)", "heap (us/wake)"))
+    for count in (100, 1000, 10000, 100000):
+        schedule, timers = build(count)
+        heap = timeit.timeit(lambda: heap_wakeup(schedule, timers), number=WAKEUPS) / WAKEUPS
+        scan_runs = max(1, WAKEUPS * 100 // count)
+        scan = timeit.timeit(lambda: scan_wakeup(schedule), number=scan_runs) / scan_runs
+        print("{:>8} {:>16.2f} {:>16.2f}".format(count, scan * 1e6, heap * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Sync callback throughput against the number of worker threads.
+
+Each worker takes callbacks off its own queue and runs them, recording what it is doing before and after every
+callback. In "blocking" mode it resolves the app and records its bookkeeping with a round trip to the event loop and
+waits on each one, as the workers used to. In "posted" mode the app is looked up directly and the bookkeeping is
+appended to a queue that the loop drains. The loop is kept moderately busy with other work, as it would be with
+plugins and the admin interface running.
+
+Run with ``python benchmarks/worker_throughput.py``.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from queue import Queue
+
+CALLBACKS = 4000
+CALLBACK_TIME = 0.0005  # Simulated I/O in the callback, releases the GIL like a real request would
+LOOP_BUSY = 0.0002  # Time the loop spends on each piece of unrelated work
+
+
+class Bench:
+    def __init__(self, loop, mode):
+        self.loop = loop
+        self.mode = mode
+        self.objects = {"app": {"id": 1, "object": object()}}
+        self.records = 0
+        self.info_q = deque()
+        self.info_pending = False
+
+    async def get_app_instance(self, name):
+        return self.objects[name]["object"]
+
+    async def update_thread_info(self, *args):
+        self.records += 1
+
+    def call_loop(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def post_thread_info(self, *args):
+        self.info_q.append(args)
+        if self.info_pending is False:
+            self.info_pending = True
+            self.loop.call_soon_threadsafe(self.drain)
+
+    def drain(self):
+        self.info_pending = False
+        while self.info_q:
+            self.info_q.popleft()
+            self.records += 1
+
+    def worker(self, q, done):
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            if self.mode == "blocking":
+                self.call_loop(self.get_app_instance("app"))
+                self.call_loop(self.update_thread_info("busy"))
+                time.sleep(CALLBACK_TIME)
+                self.call_loop(self.update_thread_info("idle"))
+            else:
+                self.objects.get("app")
+                self.post_thread_info("busy")
+                time.sleep(CALLBACK_TIME)
+                self.post_thread_info("idle")
+            done()
+
+
+async def loop_load(stop):
+    while not stop.is_set():
+        end = time.perf_counter() + LOOP_BUSY
+        while time.perf_counter() < end:
+            pass
+        await asyncio.sleep(0)
+
+
+def run(mode, thread_count):
+    loop = asyncio.new_event_loop()
+    stop = threading.Event()
+    loop_thread = threading.Thread(target=lambda: loop.run_until_complete(loop_load(stop)))
+    loop_thread.start()
+
+    bench = Bench(loop, mode)
+    finished = threading.Semaphore(0)
+    queues = [Queue() for _ in range(thread_count)]
+    workers = [threading.Thread(target=bench.worker, args=(q, finished.release)) for q in queues]
+    for w in workers:
+        w.start()
+
+    start = time.perf_counter()
+    for i in range(CALLBACKS):
+        queues[i % thread_count].put(i)
+    for _ in range(CALLBACKS):
+        finished.acquire()
+    elapsed = time.perf_counter() - start
+
+    for q in queues:
+        q.put(None)
+    for w in workers:
+        w.join()
+    stop.set()
+    loop_thread.join()
+    loop.close()
+
+    return CALLBACKS / elapsed
+
+
+def main():
+    print("{:>8} {:>20} {:>20}".format("threads", "blocking (cb/sec)", "posted (cb/sec)"))
+    for thread_count in (1, 2, 4, 8, 16, 32):
+        blocking = run("blocking", thread_count)
+        posted = run("posted", thread_count)
+        print("{:>8} {:>20.0f} {:>20.0f}".format(thread_count, blocking, posted))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+import asyncio
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from appdaemon.stream.adstream import (
+    ADStream,
+    PatternIndex,
+    RequestHandler,
+    SubscriptionIndex,
+    encode,
+    make_batch,
+    make_frame,
+    state_delta,
+)
+
+
+def test_pattern_index_exact_and_wildcards():
+    index = PatternIndex()
+    index.set("light.kitchen", "exact")
+    index.set("light.*", "lights")
+    index.set("*", "all")
+    index.set("light.k*", "k")
+
+    assert sorted(index.match("light.kitchen")) == ["all", "exact", "k", "lights"]
+    assert sorted(index.match("light.hall")) == ["all", "lights"]
+    assert list(index.match("sensor.temp")) == ["all"]
+    assert index.get("light.*") == "lights"
+    assert index.get("light.*x") is None
+    assert index.get("switch.*") is None
+
+
+def test_pattern_index_remove_prunes():
+    index = PatternIndex()
+    index.set("light.*", "lights")
+    index.set("light.kitchen*", "kitchen")
+    index.set("light.kitchen", "exact")
+
+    index.remove("light.kitchen*")
+    assert sorted(index.match("light.kitchen")) == ["exact", "lights"]
+    # Only the branch the removed pattern used has gone
+    assert index.get("light.*") == "lights"
+    assert list(index.root[0]["l"][0]) == ["i"]
+
+    index.remove("light.*")
+    index.remove("light.kitchen")
+    assert index.exact == {} and index.root == [{}, None]
+
+    # Removing what isn't there is harmless
+    index.remove("missing*")
+    index.remove("missing")
+
+
+def test_subscription_index():
+    subs = SubscriptionIndex()
+    subs.add("default", "light.kitchen", 1, "kitchen")
+    subs.add("default", "light.*", 2, "lights")
+    subs.add("*", "*", 3, "everything")
+    subs.add("other", "light.kitchen", 4, "other")
+
+    assert sorted(subs.match("default", "light.kitchen")) == ["everything", "kitchen", "lights"]
+    assert sorted(subs.match("other", "light.kitchen")) == ["everything", "other"]
+    assert subs.match("admin", "sensor.x") == ["everything"]
+
+    subs.remove("default", "light.kitchen", 1)
+    subs.remove("default", "light.*", 2)
+    subs.remove("*", "*", 3)
+    assert subs.match("default", "light.kitchen") == []
+    assert subs.namespaces.get("default") is None
+    assert sorted(subs.match("other", "light.kitchen")) == ["other"]
+
+    # Removing a subscription that has already gone is harmless
+    subs.remove("default", "light.*", 2)
+
+
+class FakeStream:
+    """Client connection that only reads when told to"""
+
+    def __init__(self):
+        self.sent = []
+        self.reading = asyncio.Event()
+        self.disconnected = False
+
+    async def sendframe(self, frame):
+        await self.reading.wait()
+        self.sent.append(frame)
+
+    async def disconnect(self):
+        self.disconnected = True
+
+
+class FakeAD:
+    def __init__(self, **limits):
+        self.logging = self
+        self.http = SimpleNamespace(
+            password=None,
+            stream_queue_size=limits.get("size", 0),
+            stream_queue_bytes=limits.get("bytes", 0),
+            stream_max_lag=limits.get("lag", 0),
+        )
+
+    def get_child(self, name):
+        return logging.getLogger(name)
+
+    def get_access(self):
+        return logging.getLogger("access")
+
+
+def make_handler(**limits):
+    stream = FakeStream()
+    adstream = SimpleNamespace(stream_handler=SimpleNamespace(makeStream=lambda *args, **kwargs: stream))
+    handler = RequestHandler(FakeAD(**limits), adstream, "handle", None)
+    handler.client_name = "test"
+    return handler, stream
+
+
+def test_client_queue_coalesces_state_changes():
+    async def scenario():
+        handler, stream = make_handler()
+        handler._queue("first", ("default", "light.kitchen", 1))
+        handler._queue("other", ("default", "light.hall", 1))
+        handler._queue("second", ("default", "light.kitchen", 1), full_frame=lambda: "second in full")
+        handler._queue("event")
+
+        assert [entry[1] for entry in handler.outbound] == ["second in full", "other", "event"]
+        assert handler.queued_bytes == len("second in full") + len("other") + len("event")
+        assert handler.stats["coalesced"] == 1
+
+        stream.reading.set()
+        await asyncio.sleep(0.01)
+        assert stream.sent == ["second in full", "other", "event"]
+        assert handler.pending_states == {} and handler.queued_bytes == 0
+
+        # Once sent, the next change is queued afresh
+        handler._queue("third", ("default", "light.kitchen", 1))
+        await asyncio.sleep(0.01)
+        assert stream.sent[-1] == "third"
+
+    asyncio.run(scenario())
+
+
+def test_client_disconnected_when_too_many_queued():
+    async def scenario():
+        handler, stream = make_handler(size=3)
+        for i in range(4):
+            handler._queue("frame{}".format(i))
+        await asyncio.sleep(0)
+
+        assert stream.disconnected is True
+        assert handler.closing is True and len(handler.outbound) == 0
+        handler._queue("ignored")
+        assert len(handler.outbound) == 0
+
+    asyncio.run(scenario())
+
+
+def test_client_disconnected_when_too_many_bytes_queued():
+    async def scenario():
+        handler, stream = make_handler(bytes=10)
+        # One large message on its own is let through
+        handler._queue("x" * 20)
+        assert handler.closing is False
+        handler._queue("y")
+        await asyncio.sleep(0)
+        assert stream.disconnected is True
+
+    asyncio.run(scenario())
+
+
+def test_client_disconnected_when_it_stops_reading():
+    async def scenario():
+        handler, stream = make_handler(lag=0.05)
+        # The first is stuck being sent, the second waits behind it
+        handler._queue("first")
+        handler._queue("second")
+        await asyncio.sleep(0.1)
+        assert handler.closing is False
+
+        # Nothing else is queued, the admin update notices instead
+        await handler._update_admin_stats()
+        await asyncio.sleep(0)
+        assert stream.disconnected is True
+
+    asyncio.run(scenario())
+
+
+STATE_CHANGED = {
+    "event_type": "state_changed",
+    "namespace": "default",
+    "data": {
+        "entity_id": "light.kitchen",
+        "old_state": {"state": "off", "last_changed": "a", "attributes": {"brightness": 10, "gone": 1, "same": 2}},
+        "new_state": {"state": "on", "last_changed": "b", "attributes": {"brightness": 20, "same": 2, "new": 3}},
+    },
+}
+
+
+def test_state_delta():
+    delta = state_delta(STATE_CHANGED)
+
+    assert delta == {
+        "event_type": "state_changed",
+        "namespace": "default",
+        "data": {
+            "entity_id": "light.kitchen",
+            "new_state": {"state": "on", "last_changed": "b", "attributes": {"brightness": 20, "new": 3}},
+            "removed_attributes": ["gone"],
+        },
+    }
+    # The event itself is left alone
+    assert "old_state" in STATE_CHANGED["data"]
+
+
+def test_state_delta_nothing_changed():
+    data = {"entity_id": "light.kitchen", "old_state": {"state": "on"}, "new_state": {"state": "on"}}
+    assert state_delta({"data": data})["data"] == {
+        "entity_id": "light.kitchen",
+        "new_state": {},
+        "removed_attributes": [],
+    }
+
+
+def test_frames_match_encoding_the_whole_message():
+    msgpack = pytest.importorskip("msgpack")
+    for delta in (False, True):
+        expected = {"data": STATE_CHANGED, "response_id": "abc", "response_type": "state_changed"}
+        if delta:
+            expected["delta"] = True
+
+        frame = make_frame(encode(STATE_CHANGED, "json"), "abc", "state_changed", delta, "json")
+        assert json.loads(frame) == expected
+
+        frame = make_frame(encode(STATE_CHANGED, "msgpack"), "abc", "state_changed", delta, "msgpack")
+        assert msgpack.unpackb(frame) == expected
+
+
+def test_batches_match_encoding_the_whole_message():
+    msgpack = pytest.importorskip("msgpack")
+    entries = [{"entity_id": "sensor.a", "new_state": {"state": 1}}, {"entity_id": "sensor.b", "delta": True}]
+    expected = {"namespace": "admin", "states": entries}
+
+    assert json.loads(make_batch("admin", [encode(e, "json") for e in entries], "json")) == expected
+    assert msgpack.unpackb(make_batch("admin", [encode(e, "msgpack") for e in entries], "msgpack")) == expected
+    assert msgpack.unpackb(make_batch("admin", [], "msgpack")) == {"namespace": "admin", "states": []}
+
+
+class FakeClient:
+    """The parts of a RequestHandler that flush_admin_batch uses, with the frames queued for it recorded"""
+
+    def __init__(self, handle, authed=True):
+        self.handle = handle
+        self.authed = authed
+        self.delta = False
+        self.delta_keys = set()
+        self.encoding = "json"
+        self.subscriptions = {"state": {}, "event": {}}
+        self.frames = []
+
+    def _queue(self, frame, coalesce_key=None, full_frame=None):
+        self.frames.append(json.loads(frame))
+
+    def batches(self):
+        return [
+            (frame["response_id"], [(s["entity_id"], s["new_state"]) for s in frame["data"]["states"]])
+            for frame in self.frames
+        ]
+
+
+def make_adstream(*clients):
+    adstream = ADStream(FakeAD(), None, None)
+    for client in clients:
+        adstream.handlers[client.handle] = client
+    return adstream
+
+
+def admin_change(entity_id, old, new):
+    return {"event_type": "state_changed", "data": {"entity_id": entity_id, "old_state": old, "new_state": new}}
+
+
+def test_admin_batch_sends_latest_and_omits_reverted():
+    async def scenario():
+        client = FakeClient("c1")
+        adstream = make_adstream(client)
+        adstream.subscribe(client, "state", "s1", "admin", "*", "all")
+
+        adstream.batch_admin_update(admin_change("sensor.a", {"state": 1}, {"state": 2}))
+        adstream.batch_admin_update(admin_change("sensor.a", {"state": 2}, {"state": 3}))
+        # Changed and changed back within the interval
+        adstream.batch_admin_update(admin_change("sensor.b", {"state": "x"}, {"state": "y"}))
+        adstream.batch_admin_update(admin_change("sensor.b", {"state": "y"}, {"state": "x"}))
+        # Changed, then removed
+        adstream.batch_admin_update(admin_change("sensor.c", {"state": 1}, {"state": 2}))
+        adstream.discard_admin_update("sensor.c")
+        await adstream.flush_admin_batch()
+
+        assert client.batches() == [("all", [("sensor.a", {"state": 3})])]
+
+        # Nothing has changed since, so nothing is sent
+        await adstream.flush_admin_batch()
+        assert len(client.frames) == 1
+
+    asyncio.run(scenario())
+
+
+def test_admin_batch_one_per_subscription():
+    async def scenario():
+        first, second, unauthed = FakeClient("c1"), FakeClient("c2"), FakeClient("c3", authed=False)
+        adstream = make_adstream(first, second, unauthed)
+        # The first matching subscription gets the change, as for single changes
+        adstream.subscribe(first, "state", "s1", "admin", "sensor.*", "sensors")
+        adstream.subscribe(first, "state", "s2", "admin", "*", "all")
+        adstream.subscribe(second, "state", "s3", "admin", "thread.*", "threads")
+        adstream.subscribe(unauthed, "state", "s4", "admin", "*", "all")
+
+        adstream.batch_admin_update(admin_change("sensor.a", {"state": 1}, {"state": 2}))
+        adstream.batch_admin_update(admin_change("thread.thread-0", {"state": "idle"}, {"state": "busy"}))
+        adstream.batch_admin_update(admin_change("sensor.b", {}, {"state": 5}))
+        await adstream.flush_admin_batch()
+
+        assert sorted(first.batches()) == [
+            ("all", [("thread.thread-0", {"state": "busy"})]),
+            ("sensors", [("sensor.a", {"state": 2}), ("sensor.b", {"state": 5})]),
+        ]
+        assert second.batches() == [("threads", [("thread.thread-0", {"state": "busy"})])]
+        assert unauthed.frames == []
+
+    asyncio.run(scenario())
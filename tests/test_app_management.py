@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import os
+
+from appdaemon import utils
+from appdaemon.app_management import AppManagement
+
+
+class FakeAD:
+    """Just enough of AppDaemon for AppManagement, with the app states it sets recorded"""
+
+    def __init__(self, concurrency):
+        self.logging = self
+        self.services = self
+        self.state = self
+        self.events = self
+        self.app_dir = "."
+        self.use_inotify = False
+        self.app_init_concurrency = concurrency
+        self.states = {}
+
+    def get_child(self, name):
+        return logging.getLogger(name)
+
+    def get_error(self):
+        return logging.getLogger("error")
+
+    def get_diag(self):
+        return logging.getLogger("diag")
+
+    def separate_error_log(self):
+        return False
+
+    def register_service(self, *args, **kwargs):
+        pass
+
+    async def set_state(self, name, namespace, entity_id, _silent=False, **kwargs):
+        if "state" in kwargs:
+            self.states[entity_id] = kwargs["state"]
+
+    async def process_event(self, namespace, data):
+        pass
+
+
+def make_app_management(concurrency, config):
+    app_management = AppManagement(FakeAD(concurrency), False)
+    app_management.app_config = config
+    return app_management
+
+
+def test_parallel_init_groups_by_level_then_priority():
+    async def scenario():
+        app_management = make_app_management(
+            4,
+            {
+                "a": {"priority": 10},
+                "b": {"dependencies": "a"},
+                "c": {},
+                "d": {"priority": 10},
+                "e": {"dependencies": ["b"], "priority": 1},
+            },
+        )
+        calls = []
+
+        async def initialize_app(name):
+            calls.append(("start", name))
+            await asyncio.sleep(0)
+            calls.append(("end", name))
+
+        app_management.initialize_app = initialize_app
+        await app_management.initialize_apps_parallel(["a", "b", "c", "d", "e"])
+
+        # a and d share level 0 priority 10 so run together, e waits for b even though its priority is lower
+        assert calls == [
+            ("start", "a"),
+            ("start", "d"),
+            ("end", "a"),
+            ("end", "d"),
+            ("start", "c"),
+            ("end", "c"),
+            ("start", "b"),
+            ("end", "b"),
+            ("start", "e"),
+            ("end", "e"),
+        ]
+
+    asyncio.run(scenario())
+
+
+def test_parallel_init_bounded_by_concurrency():
+    async def scenario():
+        apps = ["app{}".format(i) for i in range(5)]
+        app_management = make_app_management(2, {app: {} for app in apps})
+        running = set()
+        most = 0
+        done = []
+
+        async def initialize_app(name):
+            nonlocal most
+            running.add(name)
+            most = max(most, len(running))
+            await asyncio.sleep(0.01)
+            running.discard(name)
+            done.append(name)
+
+        app_management.initialize_app = initialize_app
+        await app_management.initialize_apps_parallel(apps)
+
+        assert most == 2
+        assert sorted(done) == apps
+
+    asyncio.run(scenario())
+
+
+class FakeApp:
+    def __init__(self, initialized, fail=False):
+        self.initialized = initialized
+        self.fail = fail
+
+    async def initialize(self):
+        await asyncio.sleep(0)
+        if self.fail is True:
+            raise ValueError("broken")
+        self.initialized.append(self)
+
+
+def test_parallel_init_failure_does_not_stop_others():
+    async def scenario():
+        app_management = make_app_management(4, {"bad": {}, "good": {}, "later": {"dependencies": "bad"}})
+        initialized = []
+        apps = {
+            "bad": FakeApp(initialized, fail=True),
+            "good": FakeApp(initialized),
+            "later": FakeApp(initialized),
+        }
+        for name, app in apps.items():
+            app_management.objects[name] = {"object": app, "running": True}
+
+        await app_management.initialize_apps_parallel(list(apps))
+
+        assert initialized == [apps["good"], apps["later"]]
+        states = app_management.AD.states
+        assert (states["app.bad"], states["app.good"], states["app.later"]) == ("initialize_error", "idle", "idle")
+        assert app_management.inactive_apps == ["bad"]
+
+    asyncio.run(scenario())
+
+
+def write(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+
+
+def test_config_cache_hit_on_mtime_and_size(tmp_path, monkeypatch):
+    app_management = make_app_management(1, {})
+    path = tmp_path / "apps.yaml"
+    write(path, "hello:\n  module: hello\n", 1000)
+    reads = []
+    read_config_file = app_management.read_config_file
+    monkeypatch.setattr(app_management, "read_config_file", lambda file: reads.append(file) or read_config_file(file))
+
+    assert app_management.read_cached_config_file(str(path)) == ({"hello": {"module": "hello"}}, True)
+    config, changed = app_management.read_cached_config_file(str(path))
+    assert (config, changed, len(reads)) == ({"hello": {"module": "hello"}}, False, 1)
+
+    # The cached config is copied, so changing what was returned doesn't change the cache
+    config["hello"]["module"] = "other"
+    assert app_management.read_cached_config_file(str(path))[0] == {"hello": {"module": "hello"}}
+
+
+def test_config_cache_hit_on_hash(tmp_path):
+    app_management = make_app_management(1, {})
+    path = tmp_path / "apps.yaml"
+    write(path, "hello:\n  module: hello\n", 1000)
+    app_management.read_cached_config_file(str(path))
+
+    # Touched, but the contents are the same
+    write(path, "hello:\n  module: hello\n", 2000)
+    assert app_management.read_cached_config_file(str(path)) == ({"hello": {"module": "hello"}}, False)
+    assert app_management.config_file_cache[str(path)]["mtime"] == 2000
+
+    # Same size, different contents
+    write(path, "hello:\n  module: hallo\n", 3000)
+    assert app_management.read_cached_config_file(str(path)) == ({"hello": {"module": "hallo"}}, True)
+
+
+def test_config_cache_always_reads_includes(tmp_path):
+    app_management = make_app_management(1, {})
+    path = tmp_path / "apps.yaml"
+    write(tmp_path / "args.yaml", "a: 1\n", 1000)
+    write(path, "hello:\n  args: !include {}\n".format(tmp_path / "args.yaml"), 1000)
+
+    assert app_management.read_cached_config_file(str(path)) == ({"hello": {"args": {"a": 1}}}, True)
+    write(tmp_path / "args.yaml", "a: 2\n", 1000)
+    assert app_management.read_cached_config_file(str(path)) == ({"hello": {"args": {"a": 2}}}, True)
+
+
+def test_config_cache_reads_again_when_secrets_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "secrets", None)
+    monkeypatch.setattr(utils, "secrets_file", None)
+    app_management = make_app_management(1, {})
+    path = tmp_path / "apps.yaml"
+    write(path, "hello:\n  password: !secret password\n", 1000)
+    write(tmp_path / "secrets.yaml", "password: one\n", 1000)
+
+    assert app_management.read_cached_config_file(str(path)) == ({"hello": {"password": "one"}}, True)
+    write(tmp_path / "secrets.yaml", "password: two\n", 2000)
+    assert app_management.read_cached_config_file(str(path)) == ({"hello": {"password": "two"}}, True)
+
+
+def test_config_cache_tracks_global_secrets(tmp_path, monkeypatch):
+    # Apps without a secrets.yaml of their own use the one read with appdaemon.yaml
+    (tmp_path / "apps").mkdir()
+    global_secrets = tmp_path / "secrets.yaml"
+    write(global_secrets, "password: one\n", 1000)
+    write(tmp_path / "appdaemon.yaml", "appdaemon:\n  latitude: 0\n", 1000)
+    monkeypatch.setattr(utils, "secrets", None)
+    monkeypatch.setattr(utils, "secrets_file", None)
+    utils.read_config_file(str(tmp_path / "appdaemon.yaml"))
+    assert utils.secrets_file == str(global_secrets)
+
+    app_management = make_app_management(1, {})
+    path = tmp_path / "apps" / "apps.yaml"
+    write(path, "hello:\n  password: !secret password\n", 1000)
+
+    assert app_management.read_cached_config_file(str(path)) == ({"hello": {"password": "one"}}, True)
+    assert app_management.read_cached_config_file(str(path))[1] is False
+    write(global_secrets, "password: two\n", 2000)
+    assert app_management.read_cached_config_file(str(path)) == ({"hello": {"password": "two"}}, True)
@@ -0,0 +1,115 @@
+import logging
+
+from appdaemon.callbacks import Callbacks
+
+
+class FakeAD:
+    def __init__(self):
+        self.logging = self
+
+    def get_child(self, name):
+        return logging.getLogger(name)
+
+    def get_diag(self):
+        return logging.getLogger("diag")
+
+
+def state_callback(namespace, entity):
+    return {"name": "app", "type": "state", "namespace": namespace, "entity": entity}
+
+
+def make_callbacks(**entries):
+    callbacks = Callbacks(FakeAD())
+    for handle, callback in entries.items():
+        callbacks.index_state_callback(handle, callback)
+    return callbacks
+
+
+def matching(callbacks, namespace, entity_id):
+    return sorted(handle for handle, _ in callbacks.get_state_callbacks(namespace, entity_id))
+
+
+def test_state_lookup_by_entity_domain_and_all():
+    callbacks = make_callbacks(
+        kitchen=state_callback("default", "light.kitchen"),
+        lights=state_callback("default", "light"),
+        everything=state_callback("default", None),
+        sensors=state_callback("default", "sensor"),
+        elsewhere=state_callback("other", "light.kitchen"),
+    )
+
+    assert matching(callbacks, "default", "light.kitchen") == ["everything", "kitchen", "lights"]
+    assert matching(callbacks, "default", "light.hall") == ["everything", "lights"]
+    assert matching(callbacks, "other", "light.kitchen") == ["elsewhere"]
+    assert matching(callbacks, "missing", "light.kitchen") == []
+
+
+def test_state_lookup_global_namespace():
+    callbacks = make_callbacks(
+        anywhere=state_callback("global", "light.kitchen"),
+        default=state_callback("default", "light.kitchen"),
+        other=state_callback("other", "light"),
+    )
+
+    # Global listeners see changes in every namespace, and every listener sees changes in global
+    assert matching(callbacks, "default", "light.kitchen") == ["anywhere", "default"]
+    assert matching(callbacks, "global", "light.kitchen") == ["anywhere", "default", "other"]
+
+
+def test_state_unindex_removes_empty_buckets():
+    kitchen = state_callback("default", "light.kitchen")
+    lights = state_callback("default", "light")
+    callbacks = make_callbacks(kitchen=kitchen, lights=lights)
+
+    callbacks.unindex_state_callback("kitchen", kitchen)
+    assert matching(callbacks, "default", "light.kitchen") == ["lights"]
+    assert "light.kitchen" not in callbacks.state_index["default"]["entities"]
+
+    callbacks.unindex_state_callback("lights", lights)
+    assert callbacks.state_index == {}
+
+    # Unindexing twice is harmless
+    callbacks.unindex_state_callback("lights", lights)
+
+
+def event_callback(name, event):
+    return {"name": name, "type": "event", "namespace": "default", "event": event}
+
+
+def test_event_lookup_by_type():
+    callbacks = Callbacks(FakeAD())
+    callbacks.index_event_callback("clicked", event_callback("app", "click"))
+    callbacks.index_event_callback("any", event_callback("app", None))
+    callbacks.index_event_callback("system", event_callback("app", "__AD_APP_STARTED"))
+
+    assert sorted(handle for handle, _ in callbacks.get_event_callbacks("click")) == ["any", "clicked"]
+    assert [handle for handle, _ in callbacks.get_event_callbacks("other")] == ["any"]
+    # Listeners for all events don't see system events
+    assert [handle for handle, _ in callbacks.get_event_callbacks("__AD_APP_STARTED")] == ["system"]
+
+    callbacks.unindex_event_callback("clicked", event_callback("app", "click"))
+    assert [handle for handle, _ in callbacks.get_event_callbacks("click")] == ["any"]
+    assert "click" not in callbacks.event_index
+
+
+def test_has_log_callback_counts_both_kinds():
+    callbacks = Callbacks(FakeAD())
+    log_event = event_callback("listener", "__AD_LOG_EVENT")
+    log = {"name": "logger", "type": "log", "namespace": "default"}
+
+    callbacks.index_event_callback("event", log_event)
+    callbacks.index_log_callback("info", log)
+    callbacks.index_log_callback("warning", log)
+    assert callbacks.has_log_callback("listener") is True
+    assert callbacks.has_log_callback("logger") is True
+    assert callbacks.has_log_callback("other") is False
+    assert sorted(handle for handle, _ in callbacks.get_log_callbacks()) == ["info", "warning"]
+
+    callbacks.unindex_event_callback("event", log_event)
+    callbacks.unindex_log_callback("info", log)
+    assert callbacks.has_log_callback("listener") is False
+    # Still has one left
+    assert callbacks.has_log_callback("logger") is True
+    callbacks.unindex_log_callback("warning", log)
+    callbacks.unindex_log_callback("warning", log)
+    assert callbacks.has_log_callback("logger") is False
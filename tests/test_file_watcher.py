@@ -0,0 +1,29 @@
+import logging
+import os
+
+from appdaemon.file_watcher import FileWatcher
+
+
+class FakeAD:
+    def __init__(self):
+        self.logging = self
+        self.use_inotify = False
+        self.exclude_dirs = ["excluded"]
+
+    def get_child(self, name):
+        return logging.getLogger(name)
+
+
+def test_sweep_skips_symlinked_dirs(tmp_path):
+    (tmp_path / "apps").mkdir()
+    (tmp_path / "apps" / "hello.py").write_text("")
+    (tmp_path / "excluded").mkdir()
+    (tmp_path / "excluded" / "ignored.py").write_text("")
+    (tmp_path / ".hidden.py").write_text("")
+    # A link back to the top would loop forever if it was followed
+    os.symlink(tmp_path, tmp_path / "apps" / "loop")
+
+    snapshot = FileWatcher(FakeAD(), str(tmp_path)).sweep()
+
+    assert snapshot["dirs"] == [str(tmp_path), str(tmp_path / "apps")]
+    assert list(snapshot["files"]) == [str(tmp_path / "apps" / "hello.py")]
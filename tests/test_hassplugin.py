@@ -0,0 +1,381 @@
+import asyncio
+import datetime
+import json
+import logging
+import ssl
+
+import pytz
+from aiohttp import web
+
+from appdaemon.plugins.hass.hassplugin import HassPlugin
+
+TOKEN = "secret"
+
+
+class FakeHass:
+    """Just enough of the Home Assistant websocket and REST APIs to bring the plugin up"""
+
+    def __init__(self):
+        self.states = [{"entity_id": "light.kitchen", "state": "on", "attributes": {}}]
+        self.connections = 0
+        self.sockets = []
+        self.subscribed = asyncio.Event()
+        self.commands = []
+        self.rest_calls = []
+        self.runner = None
+        self.url = None
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        self.sockets.append(ws)
+
+        await ws.send_json({"type": "auth_required", "ha_version": "2023.11.0"})
+        msg = await ws.receive_json()
+        if msg.get("access_token") != TOKEN:
+            await ws.send_json({"type": "auth_invalid", "message": "Invalid access token"})
+            await ws.close()
+            return ws
+        await ws.send_json({"type": "auth_ok", "ha_version": "2023.11.0"})
+
+        async for msg in ws:
+            data = json.loads(msg.data)
+            if data["type"] == "subscribe_events":
+                self.subscription = data["id"]
+                await ws.send_json({"id": data["id"], "type": "result", "success": True, "result": None})
+                self.subscribed.set()
+            else:
+                self.commands.append(data)
+                asyncio.create_task(self.command(ws, data))
+        return ws
+
+    async def command(self, ws, data):
+        # Answer out of order so results have to be matched up by id
+        await asyncio.sleep(0.01 * (data["id"] % 3))
+        if data["type"] == "call_service":
+            if data["domain"] == "missing":
+                await ws.send_json(
+                    {
+                        "id": data["id"],
+                        "type": "result",
+                        "success": False,
+                        "error": {"code": "not_found", "message": "Service not found."},
+                    }
+                )
+                return
+            result = {"context": {"id": data["id"]}, "service_data": data["service_data"]}
+        elif data["type"] == "fire_event":
+            result = {"context": {"id": data["id"]}}
+        elif data["type"] == "get_states":
+            result = self.states
+        elif data["type"] == "history/history_during_period":
+            result = {entity: [{"s": "on", "a": {}, "lu": 1698796800.0}] for entity in data["entity_ids"]}
+        await ws.send_json({"id": data["id"], "type": "result", "success": True, "result": result})
+
+    async def send_event(self, event_type, data):
+        await self.sockets[-1].send_json(
+            {
+                "id": self.subscription,
+                "type": "event",
+                "event": {
+                    "event_type": event_type,
+                    "data": data,
+                    "origin": "LOCAL",
+                    "time_fired": "2023-11-01T00:00:00+00:00",
+                    "context": {},
+                },
+            }
+        )
+
+    async def drop_connection(self):
+        self.subscribed.clear()
+        await self.sockets[-1].close()
+
+    async def config(self, request):
+        return web.json_response(
+            {"state": "RUNNING", "latitude": 51.5, "longitude": 0.0, "elevation": 10, "time_zone": "Europe/London"}
+        )
+
+    async def services(self, request):
+        return web.json_response([{"domain": "light", "services": {"turn_on": {}}}])
+
+    async def get_states(self, request):
+        self.rest_calls.append(request.path)
+        return web.json_response(self.states)
+
+    async def call_service(self, request):
+        self.rest_calls.append(request.path)
+        return web.json_response([])
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/websocket", self.websocket)
+        app.router.add_get("/api/config", self.config)
+        app.router.add_get("/api/services", self.services)
+        app.router.add_get("/api/states", self.get_states)
+        app.router.add_post("/api/services/{domain}/{service}", self.call_service)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = "http://127.0.0.1:{}".format(port)
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+class FakeAD:
+    """Records what the plugin tells AppDaemon"""
+
+    def __init__(self, loop, use_stream):
+        self.loop = loop
+        self.use_stream = use_stream
+        self.logging = self
+        self.plugins = self
+        self.events = self
+        self.services = self
+        self.callbacks = self
+        self.sched = self
+        self.tz = pytz.timezone("Europe/London")
+        self.started = asyncio.Event()
+        self.stopped = asyncio.Event()
+        self.received = asyncio.Queue()
+
+    def get_child(self, name):
+        return logging.getLogger(name)
+
+    async def notify_plugin_started(self, name, namespace, meta, state, first_time):
+        self.state = state
+        self.stopped.clear()
+        self.started.set()
+
+    async def notify_plugin_stopped(self, name, namespace):
+        self.started.clear()
+        self.stopped.set()
+
+    async def process_event(self, namespace, data):
+        await self.received.put(data)
+
+    def register_service(self, namespace, domain, service, callback, **kwargs):
+        pass
+
+    async def clear_callbacks(self, name):
+        pass
+
+    async def get_now(self):
+        return datetime.datetime.now(pytz.utc)
+
+
+async def start_plugin(hass, token=TOKEN, use_stream=False):
+    ad = FakeAD(asyncio.get_running_loop(), use_stream)
+    plugin = HassPlugin(ad, "hass", {"ha_url": hass.url, "token": token, "retry_secs": 0.1, "namespace": "default"})
+    task = asyncio.create_task(plugin.get_updates())
+    return ad, plugin, task
+
+
+async def stop_plugin(plugin, task):
+    plugin.stop()
+    await asyncio.wait_for(task, 5)
+    await plugin.session.close()
+
+
+def run(coro):
+    asyncio.run(asyncio.wait_for(coro, 10))
+
+
+def test_connect_and_receive_events():
+    async def scenario():
+        hass = FakeHass()
+        await hass.start()
+        ad, plugin, task = await start_plugin(hass)
+
+        await ad.started.wait()
+        assert plugin.reading_messages is True
+        assert "light.kitchen" in ad.state
+
+        await hass.send_event("state_changed", {"entity_id": "light.kitchen"})
+        event = await ad.received.get()
+        assert event["event_type"] == "state_changed"
+        assert event["data"]["entity_id"] == "light.kitchen"
+        assert event["data"]["metadata"]["origin"] == "LOCAL"
+
+        await stop_plugin(plugin, task)
+        await hass.stop()
+
+    run(scenario())
+
+
+def test_reconnects_after_disconnect():
+    async def scenario():
+        hass = FakeHass()
+        await hass.start()
+        ad, plugin, task = await start_plugin(hass)
+
+        await ad.started.wait()
+        await hass.drop_connection()
+        await ad.stopped.wait()
+        assert plugin.reading_messages is False
+
+        await ad.started.wait()
+        assert hass.connections == 2
+        await hass.subscribed.wait()
+        await hass.send_event("custom_event", {"value": 1})
+        event = await ad.received.get()
+        assert event["event_type"] == "custom_event"
+
+        await stop_plugin(plugin, task)
+        await hass.stop()
+
+    run(scenario())
+
+
+def test_bad_token_does_not_start():
+    async def scenario():
+        hass = FakeHass()
+        await hass.start()
+        ad, plugin, task = await start_plugin(hass, token="wrong")
+
+        while hass.connections < 2:
+            await asyncio.sleep(0.05)
+        assert not ad.started.is_set()
+        assert plugin.reading_messages is False
+
+        await stop_plugin(plugin, task)
+        await hass.stop()
+
+    run(scenario())
+
+
+def test_rest_when_stream_disabled():
+    async def scenario():
+        hass = FakeHass()
+        await hass.start()
+        ad, plugin, task = await start_plugin(hass)
+
+        await ad.started.wait()
+        await plugin.call_plugin_service("default", "light", "turn_on", {"entity_id": "light.kitchen"})
+        assert hass.commands == []
+        assert "/api/services/light/turn_on" in hass.rest_calls
+
+        await stop_plugin(plugin, task)
+        await hass.stop()
+
+    run(scenario())
+
+
+def test_stream_commands():
+    async def scenario():
+        hass = FakeHass()
+        await hass.start()
+        ad, plugin, task = await start_plugin(hass, use_stream=True)
+
+        await ad.started.wait()
+        assert hass.rest_calls == []
+        assert "light.kitchen" in ad.state
+
+        # Several calls in flight at once each get their own result back
+        results = await asyncio.gather(
+            *[
+                plugin.call_plugin_service("default", "light", "turn_on", {"entity_id": "light.{}".format(i)})
+                for i in range(10)
+            ]
+        )
+        assert [r["service_data"]["entity_id"] for r in results] == ["light.{}".format(i) for i in range(10)]
+        assert await plugin.call_plugin_service("default", "missing", "service", {}) is None
+
+        result = await plugin.fire_plugin_event("custom_event", "default", value=1)
+        assert "context" in result
+        assert hass.commands[-1]["event_data"] == {"value": 1}
+
+        history = await plugin.get_history(entity_id="light.kitchen", days=1)
+        assert history[0][0]["entity_id"] == "light.kitchen"
+        assert history[0][0]["last_changed"] == history[0][0]["last_updated"]
+
+        # Events still arrive while commands are being answered
+        await hass.send_event("custom_event", {"value": 2})
+        event = await ad.received.get()
+        assert event["data"]["value"] == 2
+
+        assert hass.rest_calls == []
+
+        await stop_plugin(plugin, task)
+        await hass.stop()
+
+    run(scenario())
+
+
+def test_stream_commands_fail_on_disconnect():
+    async def scenario():
+        hass = FakeHass()
+        await hass.start()
+        ad, plugin, task = await start_plugin(hass, use_stream=True)
+
+        await ad.started.wait()
+        hass.command = lambda ws, data: asyncio.sleep(0)  # never answer
+        call = asyncio.create_task(plugin.call_plugin_service("default", "light", "turn_on", {}))
+        while not hass.commands:
+            await asyncio.sleep(0.01)
+        del hass.command
+        await hass.drop_connection()
+        assert await call is None
+
+        await stop_plugin(plugin, task)
+        await hass.stop()
+
+    run(scenario())
+
+
+def test_tls_verification_options(tmp_path):
+    async def scenario():
+        def connector_ssl(**args):
+            plugin = HassPlugin(FakeAD(asyncio.get_running_loop(), False), "hass", {"ha_url": "https://hass", **args})
+            return plugin.session, plugin.session.connector._ssl
+
+        sessions = []
+        # Certs are checked unless verification is explicitly turned off
+        for args, expected in (({}, None), ({"cert_verify": True}, None), ({"cert_verify": False}, False)):
+            session, ssl_context = connector_ssl(**args)
+            sessions.append(session)
+            assert ssl_context is expected
+
+        session, ssl_context = connector_ssl(cert_path=str(tmp_path))
+        sessions.append(session)
+        assert ssl_context.verify_mode == ssl.CERT_REQUIRED
+
+        for session in sessions:
+            await session.close()
+
+    run(scenario())
+
+
+def test_stream_commands_time_out():
+    async def scenario():
+        hass = FakeHass()
+        await hass.start()
+        ad, plugin, task = await start_plugin(hass, use_stream=True)
+
+        await ad.started.wait()
+        plugin.timeout = 0.1
+        answer = hass.command
+
+        async def late(ws, data):
+            await asyncio.sleep(0.3)
+            await answer(ws, data)
+
+        hass.command = late
+        assert await plugin.call_plugin_service("default", "light", "turn_on", {}) is None
+        assert plugin.ws_futures == {}
+
+        # The late reply is dropped and the connection carries on
+        await asyncio.sleep(0.3)
+        del hass.command
+        result = await plugin.call_plugin_service("default", "light", "turn_on", {"entity_id": "light.kitchen"})
+        assert result["service_data"] == {"entity_id": "light.kitchen"}
+        assert hass.connections == 1
+
+        await stop_plugin(plugin, task)
+        await hass.stop()
+
+    run(scenario())
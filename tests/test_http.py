@@ -0,0 +1,118 @@
+import asyncio
+import datetime
+import logging
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from appdaemon.http import HTTP
+from appdaemon.services import Services
+from appdaemon.state import State
+
+
+class FakeAD:
+    """Just enough of AppDaemon to serve the REST API from a real State and Services"""
+
+    def __init__(self, config_dir):
+        self.config_dir = config_dir
+        self.namespaces = {}
+        self.state_change_log = 1000
+        self.tz = datetime.timezone.utc
+        self.logging = self
+        self.plugins = self
+        self.state = State(self)
+        self.services = Services(self)
+
+    def get_child(self, name):
+        return logging.getLogger(name)
+
+    def get_access(self):
+        return logging.getLogger("access")
+
+    async def get_plugin_object(self, namespace):
+        return None
+
+
+def make_http(tmp_path, **http):
+    ad = FakeAD(str(tmp_path))
+    ad.state.state["default"]["light.kitchen"] = {
+        "entity_id": "light.kitchen",
+        "state": "on",
+        "attributes": {"brightness": 100, "friendly_name": "Kitchen"},
+    }
+    ad.state.state["default"]["light.hall"] = {"entity_id": "light.hall", "state": "off", "attributes": {}}
+
+    async def turn_on(namespace, domain, service, data):
+        return "{} on".format(data["entity_id"])
+
+    async def fail(namespace, domain, service, data):
+        raise ValueError("no such light")
+
+    ad.services.register_service("default", "light", "turn_on", turn_on, __silent=True)
+    ad.services.register_service("default", "light", "fail", fail, __silent=True)
+
+    return HTTP(ad, None, None, {}, None, None, None, {}, {"url": "http://127.0.0.1:5050", **http})
+
+
+def request(tmp_path, path, body, **http):
+    async def scenario():
+        client = TestClient(TestServer(make_http(tmp_path, **http).app))
+        await client.start_server()
+        try:
+            response = await client.post(path, json=body)
+            if response.status == 200:
+                return response.status, await response.json()
+            return response.status, None
+        finally:
+            await client.close()
+
+    return asyncio.run(scenario())
+
+
+def test_state_batch_in_order_with_chosen_attributes(tmp_path):
+    status, body = request(
+        tmp_path,
+        "/api/appdaemon/state/default/batch",
+        {"entities": ["light.hall", "light.missing", "light.kitchen"], "attributes": ["brightness"]},
+    )
+
+    assert status == 200
+    assert list(body["state"]) == ["light.hall", "light.missing", "light.kitchen"]
+    assert body["state"]["light.missing"] is None
+    assert body["state"]["light.kitchen"]["attributes"] == {"brightness": 100}
+
+
+def test_state_batch_bad_requests(tmp_path):
+    path = "/api/appdaemon/state/default/batch"
+    assert request(tmp_path, path, {"entities": "light.hall"})[0] == 400
+    assert request(tmp_path, path, {"entities": [["light.hall"]]})[0] == 400
+    assert request(tmp_path, path, {"entities": ["light.hall"], "attributes": [{"a": 1}]})[0] == 400
+    assert request(tmp_path, path, {"entities": ["light.hall"] * 3}, api_batch_limit=2)[0] == 413
+    assert request(tmp_path, "/api/appdaemon/state/nowhere/batch", {"entities": []})[0] == 404
+
+
+def test_service_batch_results_in_order(tmp_path):
+    status, body = request(
+        tmp_path,
+        "/api/appdaemon/service/batch",
+        {
+            "calls": [
+                {"namespace": "default", "domain": "light", "service": "turn_on", "data": {"entity_id": "light.a"}},
+                {"namespace": "default", "domain": "light", "service": "fail"},
+                {"namespace": "default", "domain": "light"},
+                {"namespace": "default", "domain": "light", "service": "turn_on", "data": {"entity_id": "light.b"}},
+            ]
+        },
+    )
+
+    assert status == 200
+    assert body["results"] == [
+        {"success": True, "response": "light.a on"},
+        {"success": False, "error": "no such light"},
+        {"success": False, "error": "namespace, domain and service are required"},
+        {"success": True, "response": "light.b on"},
+    ]
+
+
+def test_service_batch_limit(tmp_path):
+    calls = [{"namespace": "default", "domain": "light", "service": "turn_on", "data": {"entity_id": "light.a"}}] * 3
+    assert request(tmp_path, "/api/appdaemon/service/batch", {"calls": calls}, api_batch_limit=2)[0] == 413
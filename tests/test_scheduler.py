@@ -0,0 +1,63 @@
+from appdaemon.scheduler import TimerQueue
+
+
+def handles(entries):
+    return [entry["uuid"] for entry in entries]
+
+
+def test_timers_come_out_in_timestamp_order():
+    timers = TimerQueue()
+    timers.push("app", "c", 30)
+    timers.push("app", "a", 10)
+    timers.push("other", "b", 20)
+
+    assert len(timers) == 3
+    assert timers.next_timestamp() == 10
+    assert handles(timers.pop_due(25)) == ["a", "b"]
+    assert len(timers) == 1
+    assert handles(timers.pop_due(25)) == []
+    assert handles(timers.pop_due(30)) == ["c"]
+    assert timers.next_timestamp() is None
+
+
+def test_next_entries_share_the_earliest_timestamp():
+    timers = TimerQueue()
+    timers.push("app", "a", 10)
+    timers.push("app", "b", 10)
+    timers.push("app", "c", 20)
+
+    assert sorted(handles(timers.next_entries())) == ["a", "b"]
+    # Looking doesn't take them off the queue
+    assert len(timers) == 3
+    assert sorted(handles(timers.next_entries())) == ["a", "b"]
+
+
+def test_removed_and_moved_timers_are_invalidated():
+    timers = TimerQueue()
+    timers.push("app", "a", 10)
+    timers.push("app", "b", 20)
+    timers.push("app", "c", 30)
+
+    timers.remove("a")
+    timers.push("app", "b", 40)
+
+    assert len(timers) == 2
+    assert timers.next_timestamp() == 30
+    assert handles(timers.pop_due(35)) == ["c"]
+    assert handles(timers.pop_due(45)) == ["b"]
+
+    # Removing something that isn't queued is harmless
+    timers.remove("missing")
+    assert len(timers) == 0
+
+
+def test_stale_entries_are_compacted():
+    timers = TimerQueue()
+    for i in range(100):
+        timers.push("app", i, i)
+    for i in range(90):
+        timers.remove(i)
+
+    # Compacted once more than half was stale, small heaps are left alone
+    assert len(timers.heap) < 64
+    assert handles(timers.pop_due(1000)) == list(range(90, 100))
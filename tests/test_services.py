@@ -0,0 +1,55 @@
+import asyncio
+import logging
+
+import pytest
+
+from appdaemon.services import Services
+
+
+class FakeAD:
+    """Just enough of AppDaemon to register and call services"""
+
+    def __init__(self):
+        self.logging = self
+
+    def get_child(self, name):
+        return logging.getLogger(name)
+
+
+def make_services():
+    services = Services(FakeAD())
+
+    async def fail(namespace, domain, service, data):
+        raise ValueError("no such light")
+
+    async def lock_free(namespace, domain, service, data):
+        # Try from another thread, the lock is reentrant for the loop's own thread
+        def try_lock():
+            if services.services_lock.acquire(blocking=False):
+                services.services_lock.release()
+                return True
+            return False
+
+        return await asyncio.get_running_loop().run_in_executor(None, try_lock)
+
+    services.register_service("default", "light", "fail", fail, __silent=True)
+    services.register_service("default", "light", "lock_free", lock_free, __silent=True)
+    return services
+
+
+def test_failures_give_none_unless_raised():
+    async def scenario():
+        services = make_services()
+        assert await services.call_service("default", "light", "fail", {"return_result": True}) is None
+        with pytest.raises(ValueError):
+            await services.call_service("default", "light", "fail", {"return_result": True}, raise_errors=True)
+
+    asyncio.run(scenario())
+
+
+def test_lock_released_while_service_runs():
+    async def scenario():
+        services = make_services()
+        assert await services.call_service("default", "light", "lock_free", {"return_result": True}) is True
+
+    asyncio.run(scenario())
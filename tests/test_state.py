@@ -0,0 +1,156 @@
+import asyncio
+import copy
+import datetime
+import logging
+
+import pytest
+
+from appdaemon import utils
+from appdaemon.state import State
+
+
+class FakeAD:
+    """Just enough of AppDaemon for State, with the events it would process recorded"""
+
+    def __init__(self, config_dir):
+        self.config_dir = config_dir
+        self.namespaces = {}
+        self.state_change_log = 1000
+        self.logging = self
+        self.events = self
+        self.plugins = self
+        self.sched = self
+        self.tz = datetime.timezone.utc
+        self.loop = None
+        self.state = None
+        self.processed = []
+
+    def get_child(self, name):
+        return logging.getLogger(name)
+
+    async def get_plugin_object(self, namespace):
+        return None
+
+    async def get_now(self):
+        return datetime.datetime(2023, 11, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+    async def process_event(self, namespace, data):
+        self.processed.append((namespace, data))
+        if data["event_type"] == "state_changed":
+            self.state.set_state_simple(namespace, data["data"]["entity_id"], data["data"]["new_state"])
+
+
+def make_state(tmp_path):
+    ad = FakeAD(str(tmp_path))
+    ad.state = State(ad)
+    return ad, ad.state
+
+
+def test_refresh_adds_new_entities(tmp_path):
+    ad, state = make_state(tmp_path)
+    state.state["default"]["light.kitchen"] = {"entity_id": "light.kitchen", "state": "off", "attributes": {}}
+
+    snapshot = {
+        "light.kitchen": {"entity_id": "light.kitchen", "state": "on", "attributes": {}},
+        "light.hall": {"entity_id": "light.hall", "state": "off", "attributes": {}},
+    }
+    counts = asyncio.run(state.refresh_namespace_state("default", snapshot))
+
+    assert counts == {"entities": 2, "changed": 1, "added": 1}
+    assert state.state["default"]["light.kitchen"]["state"] == "on"
+    assert state.state["default"]["light.hall"]["state"] == "off"
+    assert [data["data"]["entity_id"] for _, data in ad.processed] == ["light.kitchen", "light.hall"]
+    assert ad.processed[1][1]["data"]["old_state"] is None
+
+
+def test_state_shared_not_copied(tmp_path):
+    async def scenario():
+        ad, state = make_state(tmp_path)
+        ad.loop = asyncio.get_running_loop()
+
+        old = await state.set_state("app", "default", "light.kitchen", state="off", attributes={"rgb": [1, 2, 3]})
+        new = await state.set_state("app", "default", "light.kitchen", state="on")
+
+        # The new state shares what didn't change, and the old one is left as it was
+        assert state.state["default"]["light.kitchen"] is new
+        assert new["attributes"]["rgb"] is old["attributes"]["rgb"]
+        assert old["state"] == "off"
+        with pytest.raises(TypeError):
+            new["attributes"]["rgb"].append(4)
+        with pytest.raises(TypeError):
+            new["state"] = "off"
+
+        # Callers get their own copy unless they ask not to
+        mine = await state.get_state("app", "default", "light.kitchen", attribute="all")
+        mine["attributes"]["rgb"].append(4)
+        assert new["attributes"]["rgb"] == [1, 2, 3]
+        assert await state.get_state("app", "default", "light.kitchen", attribute="all", copy=False) is new
+
+    asyncio.run(scenario())
+
+
+def test_freeze_and_thaw():
+    data = {"state": "on", "attributes": {"rgb": [1, 2, 3], "nested": {"a": [{"b": 1}]}}}
+    frozen = utils.freeze(data)
+
+    assert frozen == data
+    assert isinstance(frozen["attributes"]["nested"]["a"][0], utils.FrozenDict)
+    assert utils.freeze(frozen) is frozen
+    assert copy.deepcopy(frozen) is frozen
+
+    thawed = utils.thaw(frozen)
+    assert thawed == data
+    assert isinstance(thawed, dict) and not isinstance(thawed, utils.FrozenDict)
+    assert isinstance(thawed["attributes"]["rgb"], list) and not isinstance(
+        thawed["attributes"]["rgb"], utils.FrozenList
+    )
+    thawed["attributes"]["nested"]["a"][0]["b"] = 2
+    assert frozen["attributes"]["nested"]["a"][0]["b"] == 1
+
+
+def test_changes_since_a_version(tmp_path):
+    async def scenario():
+        ad, state = make_state(tmp_path)
+        ad.loop = asyncio.get_running_loop()
+        start = state.get_version("default")
+
+        await state.set_state("app", "default", "light.kitchen", state="on")
+        await state.set_state("app", "default", "light.hall", state="on")
+        await state.set_state("app", "default", "light.kitchen", state="off")
+        middle = state.get_version("default")
+        await state.remove_entity_simple("default", "light.hall")
+
+        changes = state.get_changes("default", start)
+        assert changes["version"] == start + 4
+        assert changes["full"] is False
+        assert changes["state"]["light.kitchen"]["state"] == "off"
+        assert changes["state"]["light.hall"] is None
+
+        assert state.get_changes("default", middle)["state"] == {"light.hall": None}
+        assert state.get_changes("default", start + 4) == {"version": start + 4, "full": False, "state": {}}
+        assert state.get_changes("missing", start) is None
+
+    asyncio.run(scenario())
+
+
+def test_changes_fall_back_to_full(tmp_path):
+    ad, state = make_state(tmp_path)
+    ad.state_change_log = 3
+    state.state["default"] = {"sensor.{}".format(i): {"state": i} for i in range(5)}
+    start = state.get_version("default")
+    for i in range(5):
+        state._changed("default", "sensor.{}".format(i))
+
+    # The log only goes back three changes
+    assert state.get_changes("default", start + 2)["full"] is False
+    assert sorted(state.get_changes("default", start + 2)["state"]) == ["sensor.2", "sensor.3", "sensor.4"]
+    full = state.get_changes("default", start + 1)
+    assert full["full"] is True and len(full["state"]) == 5
+
+    # A version from somewhere else
+    assert state.get_changes("default", start + 100)["full"] is True
+
+    # Replacing the whole namespace can't be caught up on from the log
+    state.set_namespace_state("default", {"sensor.0": {"state": 1}})
+    assert state.get_changes("default", start + 5)["full"] is True
+    assert state.get_changes("default", start + 6)["state"] == {}
@@ -0,0 +1,588 @@
+import asyncio
+import datetime
+import logging
+import time
+from threading import Thread, get_ident
+from types import SimpleNamespace
+
+from appdaemon.threading import CallbackQueue, Threading
+
+
+class FakeAD:
+    """Just enough of AppDaemon to build Threading without starting any workers"""
+
+    def __init__(self):
+        self.logging = self
+        self.state = self
+        self.callbacks = SimpleNamespace(callbacks={})
+        self.sched = SimpleNamespace(schedule={})
+        self.app_management = SimpleNamespace(app_config={}, objects={})
+        self.load_distribution = "roundrobin"
+        self.cancelled = []
+
+    def get_child(self, name):
+        return logging.getLogger(name)
+
+    def get_diag(self):
+        return logging.getLogger("diag")
+
+    async def add_entity(self, *args, **kwargs):
+        pass
+
+    async def get_state(self, *args, **kwargs):
+        pass
+
+    async def set_state(self, *args, **kwargs):
+        pass
+
+    async def add_to_state(self, *args, **kwargs):
+        pass
+
+    async def add_to_attr(self, *args, **kwargs):
+        pass
+
+    async def cancel_state_callback(self, handle, name):
+        self.callbacks.callbacks[name].pop(handle)
+        self.cancelled.append(handle)
+
+
+def make_threading(threads, pin_threads=0, **kwargs):
+    threading = Threading(FakeAD(), kwargs)
+    threading.pin_threads = pin_threads
+    threading.thread_count = threads
+    for i in range(threads):
+        threading.threads["thread-{}".format(i)] = {"queue": CallbackQueue(), "dropped": 0, "busy": False, "stolen": 0}
+    threading.update_unpinned_threads()
+    return threading
+
+
+def callback(name, pin_app=False, pin_thread=-1, priority="normal"):
+    return {
+        "name": name,
+        "id": name,
+        "type": "state",
+        "kwargs": {},
+        "pin_app": pin_app,
+        "pin_thread": pin_thread,
+        "priority": priority,
+        "queued": time.monotonic(),
+    }
+
+
+def test_rebalance_leaves_pinned_callbacks():
+    threading = make_threading(2)
+    first = threading.threads["thread-0"]["queue"]
+    second = threading.threads["thread-1"]["queue"]
+    first.put_nowait(callback("a"))
+    first.put_nowait(callback("pinned", pin_app=True, pin_thread=0))
+    first.put_nowait(callback("b"))
+
+    threading.rebalance_unpinned()
+
+    assert sorted(first.waiting_by_app()) == ["a", "pinned"]
+    assert list(second.waiting_by_app()) == ["b"]
+
+
+def test_callback_pins_keep_thread():
+    threading = make_threading(3)
+    assert threading.has_pinned_callbacks("thread-1") is False
+
+    threading.AD.callbacks.callbacks["app"] = {"h1": callback("app", pin_app=True, pin_thread=1)}
+    assert threading.has_pinned_callbacks("thread-1") is True
+    assert threading.has_pinned_callbacks("thread-2") is False
+
+    # A pin_thread left over on an unpinned callback doesn't count
+    threading.AD.sched.schedule["other"] = {"h2": callback("other", pin_thread=2)}
+    assert threading.has_pinned_callbacks("thread-2") is False
+    threading.AD.sched.schedule["other"]["h2"]["pin_app"] = True
+    assert threading.has_pinned_callbacks("thread-2") is True
+
+
+class FakeApp:
+    def __init__(self):
+        self.constraints = ["constrain_mode"]
+        self.mode = "home"
+
+    def list_constraints(self):
+        return self.constraints
+
+    async def constrain_mode(self, value):
+        return value == self.mode
+
+
+def test_constraints_compiled_once():
+    threading = make_threading(1)
+    app = FakeApp()
+    args = {"constrain_mode": "home", "other": 1}
+
+    compiled = threading.get_constraints(("app", "h1"), args, app, 1)
+    assert [value for _, value in compiled["methods"]] == ["home"]
+    assert threading.get_constraints(("app", "h1"), args, app, 1) is compiled
+
+    # New args, a reloaded app or a change to the registered constraints all compile again
+    assert threading.get_constraints(("app", "h1"), dict(args), app, 1) is not compiled
+    compiled = threading.get_constraints(("app", "h1"), args, app, 1)
+    assert threading.get_constraints(("app", "h1"), args, app, 2) is not compiled
+    compiled = threading.get_constraints(("app", "h1"), args, app, 2)
+    app.constraints = []
+    assert threading.get_constraints(("app", "h1"), args, app, 2)["methods"] == []
+
+
+def test_constraint_cache_is_bounded():
+    threading = make_threading(1)
+    threading.constraint_cache_size = 2
+    app = FakeApp()
+    args = {}
+
+    first = threading.get_constraints(("app", 1), args, app, 1)
+    threading.get_constraints(("app", 2), args, app, 1)
+    # Using the first keeps it, so the second is the one to go
+    threading.get_constraints(("app", 1), args, app, 1)
+    threading.get_constraints(("app", 3), args, app, 1)
+
+    assert list(threading.constraint_cache) == [("app", 1), ("app", 3)]
+    assert threading.get_constraints(("app", 1), args, app, 1) is first
+
+
+def test_constraints_forgotten_on_cancel_and_terminate():
+    threading = make_threading(1)
+    app = FakeApp()
+    for key in (("app", None), ("app", "h1"), ("app", "h2"), ("other", "h1")):
+        threading.get_constraints(key, {}, app, 1)
+
+    threading.forget_constraints("app", "h1")
+    assert list(threading.constraint_cache) == [("app", None), ("app", "h2"), ("other", "h1")]
+
+    threading.forget_constraints("app")
+    assert list(threading.constraint_cache) == [("other", "h1")]
+
+
+def test_compiled_constraints_checked():
+    threading = make_threading(1)
+    app = FakeApp()
+    # 2023-11-01 was a Wednesday
+    now = datetime.datetime(2023, 11, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+    async def get_now():
+        return now
+
+    threading.AD.tz = datetime.timezone.utc
+    threading.AD.sched.get_now = get_now
+
+    def check(args):
+        compiled = threading.get_constraints(("app", None), args, app, 1)
+        return asyncio.run(threading.check_constraints(compiled, "app"))
+
+    assert check({"constrain_mode": "home"}) is True
+    assert check({"constrain_mode": "away"}) is False
+    assert check({"constrain_days": "mon,wed"}) is True
+    assert check({"constrain_days": "sat,sun"}) is False
+    assert check({"constrain_days": "wed", "constrain_mode": "away"}) is False
+
+
+def test_callback_queue_takes_highest_priority_first():
+    q = CallbackQueue()
+    q.put_nowait(callback("low", priority="low"))
+    q.put_nowait(callback("normal1"))
+    q.put_nowait(callback("high", priority="high"))
+    q.put_nowait(callback("normal2"))
+
+    assert [q.get_nowait()["name"] for _ in range(4)] == ["high", "normal1", "normal2", "low"]
+    waits, app_waits = q.get_wait_stats()
+    assert {priority: stats["count"] for priority, stats in waits.items()} == {"high": 1, "normal": 2, "low": 1}
+    assert app_waits["low"]["count"] == 1
+    assert q.get_wait_stats() == ({}, {})
+
+
+def test_callback_queue_starvation_limit():
+    q = CallbackQueue(starvation_limit=2)
+    q.put_nowait(callback("low", priority="low"))
+    for i in range(5):
+        q.put_nowait(callback("high{}".format(i), priority="high"))
+
+    # Passed over twice, so it gets the third turn
+    assert [q.get_nowait()["name"] for _ in range(6)] == ["high0", "high1", "low", "high2", "high3", "high4"]
+
+
+def test_callback_queue_close_goes_last():
+    q = CallbackQueue()
+    q.put_nowait(callback("normal"))
+    q.put_nowait(None)
+    q.put_nowait(callback("low", priority="low"))
+
+    assert q.qsize() == 3
+    assert [item and item["name"] for item in (q.get_nowait(), q.get_nowait(), q.get_nowait())] == [
+        "normal",
+        "low",
+        None,
+    ]
+    assert q.qsize() == 0
+
+
+def make_bounded(policy, limit=2, **kwargs):
+    # One thread everything is pinned to, so there is nowhere else for callbacks to go
+    threading = make_threading(1, pin_threads=1, thread_queue_limit=limit, **kwargs)
+    threading.AD.app_management.app_config["app"] = {"queue_overload_policy": policy}
+    return threading
+
+
+def pinned(name, seq):
+    args = callback(name, pin_app=True, pin_thread=0)
+    args["seq"] = seq
+    return args
+
+
+def queued(threading):
+    q = threading.threads["thread-0"]["queue"]
+    return [(args["name"], args["seq"]) for args in q.queues["normal"]]
+
+
+def test_drop_oldest_only_drops_the_apps_own():
+    threading = make_bounded("drop_oldest")
+    assert threading.select_q(pinned("app", 1)) is True
+    assert threading.select_q(pinned("other", 1)) is True
+    assert threading.select_q(pinned("app", 2)) is True
+    assert queued(threading) == [("other", 1), ("app", 2)]
+    assert threading.app_queue_stats["app"]["dropped"] == 1
+
+    # Nothing of its own to make room with, so the new one goes
+    threading = make_bounded("drop_oldest")
+    assert threading.select_q(pinned("other", 1)) is True
+    assert threading.select_q(pinned("other", 2)) is True
+    assert threading.select_q(pinned("app", 1)) is False
+    assert queued(threading) == [("other", 1), ("other", 2)]
+    assert threading.app_queue_stats["app"]["dropped"] == 1
+    assert threading.threads["thread-0"]["dropped"] == 1
+
+
+def test_drop_newest():
+    threading = make_bounded("drop_newest")
+    assert threading.select_q(pinned("app", 1)) is True
+    assert threading.select_q(pinned("app", 2)) is True
+    assert threading.select_q(pinned("app", 3)) is False
+    assert queued(threading) == [("app", 1), ("app", 2)]
+    assert threading.app_queue_stats["app"]["dropped"] == 1
+    assert threading.callback_stats["state_callback.app"]["dropped"] == 1
+
+
+def test_block_holds_in_order_until_there_is_room():
+    async def scenario():
+        threading = make_bounded("block", queue_block_timeout=5)
+        q = threading.threads["thread-0"]["queue"]
+        threading.select_q(pinned("app", 1))
+        threading.select_q(pinned("app", 2))
+        assert threading.queue_full(pinned("app", 3)) is True
+
+        threading.hold_for_room(pinned("app", 3))
+        threading.hold_for_room(pinned("app", 4))
+        await asyncio.sleep(0.05)
+        assert [args["seq"] for args in threading.blocked["app"]] == [3, 4]
+
+        # A worker takes one, making room for the first held back
+        q.get_nowait()
+        threading.queue_room.set()
+        await asyncio.sleep(0.05)
+        assert queued(threading) == [("app", 2), ("app", 3)]
+
+        q.get_nowait()
+        threading.queue_room.set()
+        await asyncio.sleep(0.05)
+        assert queued(threading) == [("app", 3), ("app", 4)]
+        assert "app" not in threading.blocked
+        assert threading.app_queue_stats == {}
+
+    asyncio.run(scenario())
+
+
+def test_block_drops_after_timeout():
+    async def scenario():
+        threading = make_bounded("block", limit=1, queue_block_timeout=0.1)
+        threading.select_q(pinned("app", 1))
+        threading.hold_for_room(pinned("app", 2))
+
+        await asyncio.sleep(0.3)
+        assert "app" not in threading.blocked
+        assert queued(threading) == [("app", 1)]
+        assert threading.app_queue_stats["app"]["dropped"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_steal_from_busy_thread():
+    threading = make_threading(2, work_stealing=True)
+    victim = threading.threads["thread-0"]
+    thief = threading.threads["thread-1"]
+    victim["queue"].put_nowait(callback("pinned", pin_app=True, pin_thread=0))
+    victim["queue"].put_nowait(callback("unpinned"))
+
+    # Nothing is taken from a thread that will get to its own queue shortly
+    assert threading.steal(thief) is None
+
+    victim["busy"] = True
+    assert threading.steal(thief)["name"] == "unpinned"
+    assert thief["stolen"] == 1
+    # Pinned callbacks stay put
+    assert threading.steal(thief) is None
+    assert list(victim["queue"].waiting_by_app()) == ["pinned"]
+
+
+def test_get_callback_prefers_own_queue():
+    threading = make_threading(2, work_stealing=True)
+    victim = threading.threads["thread-0"]
+    thief = threading.threads["thread-1"]
+    victim["busy"] = True
+    victim["queue"].put_nowait(callback("theirs"))
+    thief["queue"].put_nowait(callback("mine"))
+
+    args, stolen = threading.get_callback(thief)
+    assert (args["name"], stolen) == ("mine", False)
+    args, stolen = threading.get_callback(thief)
+    assert (args["name"], stolen) == ("theirs", True)
+
+
+def test_stolen_total_written_when_it_changes():
+    async def scenario():
+        threading = make_threading(2, work_stealing=True)
+        written = []
+
+        async def set_state(name, namespace, entity_id, **kwargs):
+            written.append((entity_id, kwargs.get("state")))
+
+        threading.set_state = set_state
+        threading.threads["thread-0"]["stolen"] = 2
+        threading.stolen_removed = 1
+        await threading.update_admin_stats()
+        await threading.update_admin_stats()
+
+        assert [w for w in written if w[0] == "sensor.callbacks_total_stolen"] == [("sensor.callbacks_total_stolen", 3)]
+
+    asyncio.run(scenario())
+
+
+def test_admin_stats_written_once_per_flush():
+    async def scenario():
+        threading = make_threading(1)
+        ad = threading.AD
+        ad.log_thread_actions = False
+        ad.tz = datetime.timezone.utc
+        ad.sched.realtime = False
+        ad.app_management.objects["app"] = {"type": "app", "pin_thread": -1}
+        ad.app_management.get_app_info = ad.app_management.objects.get
+        threading.threads["thread-0"].update(
+            thread=SimpleNamespace(is_alive=lambda: True), waits={"count": 0, "total": 0}
+        )
+        threading.thread_info["thread-0"] = {"callback": "idle", "time_called": None}
+        added = []
+        written = []
+
+        async def add_to_state(name, namespace, entity_id, i):
+            added.append((entity_id, i))
+
+        async def get_state(name, namespace, entity_id, **kwargs):
+            return {"state": None, "attributes": {}}
+
+        async def set_state(name, namespace, entity_id, **kwargs):
+            written.append(entity_id)
+
+        threading.add_to_state = add_to_state
+        threading.get_state = get_state
+        threading.set_state = set_state
+
+        now = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        for _ in range(3):
+            threading.record_thread_info("thread-0", "cb", "app", "state", "u1", False, now)
+            threading.record_thread_info("thread-0", "idle", "app", "state", "u1", False, now)
+        await threading.update_admin_stats()
+
+        assert added == [("sensor.callbacks_total_executed", 3)]
+        for entity_id in ("thread.thread-0", "state_callback.u1", "app.app"):
+            assert written.count(entity_id) == 1
+
+        # Nothing has happened since, so nothing is written
+        added.clear()
+        written.clear()
+        await threading.update_admin_stats()
+        assert added == [] and written == []
+
+    asyncio.run(scenario())
+
+
+def test_thread_info_posted_from_worker_applied_on_loop_in_order():
+    async def scenario():
+        threading = make_threading(1)
+        loop = asyncio.get_running_loop()
+        threading.AD.loop = loop
+        threading.AD.sched.get_now_sync = lambda: datetime.datetime(2024, 1, 1, 0, 0, 0, 500)
+        recorded = []
+        threading.record_thread_info = lambda *args: recorded.append((args[1], get_ident(), args[6]))
+
+        def worker():
+            for callback in ("cb1", "idle", "cb2", "idle"):
+                threading.post_thread_info("thread-0", callback, "app", "state", "u1", False)
+            threading.post_thread_info("thread-0", "hidden", "app", "state", "u1", True)
+
+        t = Thread(target=worker)
+        t.start()
+        t.join()
+        # Only the first post schedules a drain, the rest wait for it
+        assert threading.thread_info_pending is True
+        assert recorded == []
+
+        await asyncio.sleep(0)
+        when = datetime.datetime(2024, 1, 1)
+        assert recorded == [(callback, get_ident(), when) for callback in ("cb1", "idle", "cb2", "idle")]
+        assert threading.thread_info_pending is False and len(threading.thread_info_q) == 0
+
+    asyncio.run(scenario())
+
+
+def test_pinned_callback_on_unpinned_thread_wakes_worker():
+    # pin_thread can pin an app to a thread outside the pinned range, its worker must still see the callback at once
+    threading = make_threading(2, work_stealing=True)
+    got = []
+    worker = Thread(target=lambda: got.append(threading.get_callback(threading.threads["thread-1"])), daemon=True)
+    worker.start()
+    time.sleep(0.05)
+
+    start = time.monotonic()
+    assert threading.select_q(callback("pinned", pin_app=True, pin_thread=1)) is True
+    worker.join(0.5)
+
+    assert got and got[0][0]["name"] == "pinned"
+    assert time.monotonic() - start < 0.5
+
+
+def test_block_uses_oneshot_when_queued():
+    async def scenario():
+        threading = make_bounded("block", limit=1, queue_block_timeout=5)
+        threading.AD.callbacks.callbacks["app"] = {"listener": {}}
+        threading.AD.sched.timer_running = lambda name, handle: False
+        q = threading.threads["thread-0"]["queue"]
+        threading.select_q(pinned("app", 1))
+
+        for seq in (2, 3):
+            args = pinned("app", seq)
+            args["kwargs"] = {"oneshot": True, "__handle": "listener"}
+            threading.hold_for_room(args)
+
+        q.get_nowait()
+        threading.queue_room.set()
+        await asyncio.sleep(0.05)
+        q.get_nowait()
+        threading.queue_room.set()
+        await asyncio.sleep(0.05)
+
+        # Only the first runs, and it is what uses the oneshot up
+        assert threading.AD.cancelled == ["listener"]
+        assert "app" not in threading.blocked
+        assert queued(threading) == []
+
+    asyncio.run(scenario())
+
+
+def test_block_keeps_oneshot_when_dropped():
+    async def scenario():
+        threading = make_bounded("block", limit=1, queue_block_timeout=0.1)
+        threading.AD.callbacks.callbacks["app"] = {"listener": {}}
+        threading.select_q(pinned("app", 1))
+        args = pinned("app", 2)
+        args["kwargs"] = {"oneshot": True, "__handle": "listener"}
+        threading.hold_for_room(args)
+
+        await asyncio.sleep(0.3)
+        assert threading.AD.cancelled == []
+        assert "listener" in threading.AD.callbacks.callbacks["app"]
+
+    asyncio.run(scenario())
+
+
+def change(seq, old, new, **kwargs):
+    args = pinned("app", seq)
+    args.update(
+        {"entity": "light.kitchen", "old_state": old, "new_state": new, "kwargs": dict(coalesce=True, **kwargs)}
+    )
+    return args
+
+
+def test_coalesce_latest_wins():
+    threading = make_threading(1, pin_threads=1)
+    assert threading.coalesce(change(1, "a", "b")) is True
+    assert threading.coalesce(change(2, "b", "c")) is True
+    assert threading.coalesce(change(3, "c", "d")) is True
+
+    q = threading.threads["thread-0"]["queue"]
+    args = q.get_nowait()
+    # Still the change it was queued for, but with the latest state, and nothing else queued
+    assert (args["seq"], args["old_state"], args["new_state"]) == (1, "a", "d")
+    assert q.qsize() == 0
+    assert threading.callback_stats["state_callback.app"]["superseded"] == 2
+
+    # Once a worker has it, the next change is queued separately
+    args["coalesced"] = False
+    threading.coalesce(change(4, "d", "e"))
+    assert q.get_nowait()["seq"] == 4
+
+
+def test_min_interval_holds_then_releases():
+    async def scenario():
+        threading = make_threading(1, pin_threads=1)
+        threading.AD.loop = asyncio.get_running_loop()
+        q = threading.threads["thread-0"]["queue"]
+
+        threading.coalesce(change(1, "a", "b", min_interval=0.1))
+        q.get_nowait()["coalesced"] = False
+        threading.coalesce(change(2, "b", "c", min_interval=0.1))
+        threading.coalesce(change(3, "c", "d", min_interval=0.1))
+        assert q.qsize() == 0
+        assert threading.callback_stats["state_callback.app"]["superseded"] == 1
+
+        await asyncio.sleep(0.15)
+        args = q.get_nowait()
+        assert (args["seq"], args["new_state"]) == (3, "d")
+        assert threading.coalesced["app"]["light.kitchen"]["timer"] is None
+
+    asyncio.run(scenario())
+
+
+def test_cancel_clears_held_timers():
+    async def scenario():
+        threading = make_threading(1, pin_threads=1)
+        threading.AD.loop = asyncio.get_running_loop()
+        q = threading.threads["thread-0"]["queue"]
+
+        threading.coalesce(change(1, "a", "b", min_interval=0.05))
+        q.get_nowait()["coalesced"] = False
+        threading.coalesce(change(2, "b", "c", min_interval=0.05))
+        timer = threading.coalesced["app"]["light.kitchen"]["timer"]
+
+        threading.forget_coalesced("app")
+        assert timer.cancelled()
+        assert threading.coalesced == {}
+        await asyncio.sleep(0.1)
+        assert q.qsize() == 0
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_follows_overload_policy():
+    async def scenario():
+        threading = make_bounded("block", limit=1, queue_block_timeout=5)
+        threading.select_q(pinned("app", 0))
+
+        # No room, so it is held back rather than dropped, and newer changes still fold into it
+        assert threading.coalesce(change(1, "a", "b")) is True
+        assert threading.coalesce(change(2, "b", "c")) is True
+        assert [args["seq"] for args in threading.blocked["app"]] == [1]
+        assert threading.blocked["app"][0]["new_state"] == "c"
+
+        threading.threads["thread-0"]["queue"].get_nowait()
+        threading.queue_room.set()
+        await asyncio.sleep(0.05)
+        assert queued(threading) == [("app", 1)]
+
+        # Dropping is reported back
+        threading = make_bounded("drop_newest", limit=1)
+        threading.select_q(pinned("app", 0))
+        assert threading.coalesce(change(1, "a", "b")) is False
+
+    asyncio.run(scenario())
@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+from appdaemon import utils
+
+
+def stored(path):
+    with sqlite3.connect(path) as db:
+        return sorted(key for key, in db.execute("SELECT key FROM state"))
+
+
+def test_sqlite_dict_writes_only_changes(tmp_path):
+    path = str(tmp_path / "ns.db")
+    data = utils.SQLitePersistentDict(path, False)
+    data["light.kitchen"] = {"state": "on"}
+    data["light.hall"] = {"state": "off"}
+    assert data.dirty == {"light.kitchen", "light.hall"}
+    assert stored(path) == []
+
+    data.sync()
+    assert data.dirty == set()
+    assert stored(path) == ["light.hall", "light.kitchen"]
+
+    data.pop("light.hall")
+    data.setdefault("light.porch", {"state": "on"})
+    assert data.dirty == {"light.hall", "light.porch"}
+    data.close()
+
+    reloaded = utils.SQLitePersistentDict(path, False)
+    assert reloaded == {"light.kitchen": {"state": "on"}, "light.porch": {"state": "on"}}
+    assert reloaded.dirty == set()
+    reloaded.close()
+
+
+def test_sqlite_dict_safe_writes_straight_away(tmp_path):
+    path = str(tmp_path / "ns.db")
+    data = utils.SQLitePersistentDict(path, True)
+    data["light.kitchen"] = {"state": "on"}
+    assert stored(path) == ["light.kitchen"]
+    del data["light.kitchen"]
+    assert stored(path) == []
+    data.close()
+
+
+def test_sqlite_dict_keeps_changes_if_sync_fails(tmp_path):
+    path = str(tmp_path / "ns.db")
+    data = utils.SQLitePersistentDict(path, False)
+    data["light.kitchen"] = {"state": "on"}
+    data.db.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        data.sync()
+    data.db = sqlite3.connect(path, check_same_thread=False)
+
+    assert data.dirty == {"light.kitchen"}
+    data.close()
+    assert stored(path) == ["light.kitchen"]